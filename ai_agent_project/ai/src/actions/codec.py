@@ -1,8 +1,13 @@
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Union
+import json, math, struct
 
 ALLOWED = {"noop","move_forward","move_back","turn_left","turn_right","jump","attack"}
 
+# v0 action limits: |dYaw|, |dPitch| in degrees; |forward|, |strafe|
+LOOK_LIMIT = 45.0
+MOVE_LIMIT = 1.0
+
 # Ensure the action is valid and within allowed parameters
 def ClampAction(msg: Dict[str, Any]) -> Dict[str, Any]:
 
@@ -17,10 +22,10 @@ def ClampAction(msg: Dict[str, Any]) -> Dict[str, Any]:
     strafe  = float(move.get("strafe", 0.0))
 
     # Clamp to v0 schema limits
-    d_yaw   = max(-45.0, min(45.0, d_yaw))
-    d_pitch = max(-45.0, min(45.0, d_pitch))
-    fwd     = max(-1.0,  min(1.0,  fwd))
-    strafe  = max(-1.0,  min(1.0,  strafe))
+    d_yaw   = max(-LOOK_LIMIT, min(LOOK_LIMIT, d_yaw))
+    d_pitch = max(-LOOK_LIMIT, min(LOOK_LIMIT, d_pitch))
+    fwd     = max(-MOVE_LIMIT, min(MOVE_LIMIT, fwd))
+    strafe  = max(-MOVE_LIMIT, min(MOVE_LIMIT, strafe))
 
     msg["payload"] = {
         "look": {"dYaw": d_yaw, "dPitch": d_pitch},
@@ -28,4 +33,179 @@ def ClampAction(msg: Dict[str, Any]) -> Dict[str, Any]:
         "jump": jump
     }
 
-    return msg
\ No newline at end of file
+    return msg
+
+# --- v1 binary wire format ---------------------------------------------------
+# Negotiated per connection: the server lists WIRE_VERSIONS in its `connected`
+# event and a client opts in with `hello {"wire": "v1"}`. v1 observations and
+# actions travel as binary frames; events (and every v0 client) stay JSON text.
+#
+#   header      <BBqd   magic, type tag, seq, timestamp (s)
+#   observation <3d2fB5f  x y z, yaw pitch, nrays, rays[5] (unused rays = 0)
+#               then 9 hotbar slots: u8 length (0xFF = empty) + utf-8 item id
+#   action      <4fB    dYaw dPitch forward strafe, flags (bit0 = jump)
+#               then <q obs_seq (the observation it answers) when the action has one
+#   observation + voxel grid: an observation frame with its own tag, followed by a
+#               delta-encoded block-id grid (actions.voxels); clients send it in place
+#               of a plain observation when the bridge's `connected` event offers voxels
+
+WIRE_VERSIONS = ["v0", "v1"]
+V1_MAGIC = 0xB1
+TAG_OBSERVATION = 1
+TAG_ACTION = 2
+TAG_OBSERVATION_GRID = 3
+
+_HEADER = struct.Struct("<BBqd")
+_OBS_V1 = struct.Struct("<3d2fB5f")
+_ACT_V1 = struct.Struct("<4fB")
+_OBS_SEQ = struct.Struct("<q")
+_SLOT_LEN = struct.Struct("<B")
+HOTBAR_SLOTS = 9
+NO_ITEM = 0xFF
+
+# Header and observation fields in one unpack
+_OBS_FRAME = struct.Struct("<BBqd3d2fB5f")
+assert _OBS_FRAME.size == _HEADER.size + _OBS_V1.size
+
+# Message keys that only exist inside this process (numpy views); stripped before a
+# message is serialised for a remote worker or a recording
+LOCAL_FIELDS = ("features", "voxels", "voxel_origin", "trace")
+
+def WithoutLocal(msg: Dict[str, Any]) -> Dict[str, Any]:
+    if any(k in msg for k in LOCAL_FIELDS):
+        return {k: v for k, v in msg.items() if k not in LOCAL_FIELDS}
+    return msg
+
+def FrameTag(frame: bytes) -> int:
+    if len(frame) < _HEADER.size or frame[0] != V1_MAGIC:
+        raise ValueError("not a v1 frame")
+    return frame[1]
+
+def EncodeObservationV1(msg: Dict[str, Any], tag: int = TAG_OBSERVATION) -> bytes:
+    p = msg["payload"]
+    pose = p["pose"]
+    pos = pose["pos"]
+    rays = list(p["rays"])
+    parts = [
+        _HEADER.pack(V1_MAGIC, tag, int(msg["seq"]), float(msg["timestamp"])),
+        _OBS_V1.pack(pos["x"], pos["y"], pos["z"], pose["yaw"], pose["pitch"],
+                     len(rays), *(rays + [0.0] * (5 - len(rays)))),
+    ]
+    for item in p["hotbar"]:
+        if item is None:
+            parts.append(_SLOT_LEN.pack(NO_ITEM))
+        else:
+            raw = item.encode("utf-8")[:NO_ITEM - 1]
+            parts.append(_SLOT_LEN.pack(len(raw)) + raw)
+    return b"".join(parts)
+
+# Decode a v1 observation frame straight into its v0 dict form (one unpack for the
+# fixed fields). Raises ValueError for anything the v0 schema would reject.
+def DecodeObservationV1(frame: bytes) -> Dict[str, Any]:
+    msg, end = DecodeObservationPart(frame, TAG_OBSERVATION)
+    if end != len(frame):
+        raise ValueError("trailing bytes in observation frame")
+    return msg
+
+# The observation part of a frame tagged `tag`; also returns the offset just past it
+def DecodeObservationPart(frame: bytes, tag: int = TAG_OBSERVATION) -> Tuple[Dict[str, Any], int]:
+    if len(frame) < _OBS_FRAME.size:
+        raise ValueError("truncated observation frame")
+    magic, got, seq, ts, x, y, z, yaw, pitch, n, *rays = _OBS_FRAME.unpack_from(frame, 0)
+    if magic != V1_MAGIC or got != tag:
+        raise ValueError("not a v1 observation frame")
+    if seq < 0 or not 3 <= n <= 5:
+        raise ValueError("observation out of v0 range")
+    rays = rays[:n]
+    if min(rays) < 0:
+        raise ValueError("observation out of v0 range")
+    if not (math.isfinite(ts) and math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+        raise ValueError("non-finite observation field")
+
+    hotbar: List[Any] = []
+    off = _OBS_FRAME.size
+    size = len(frame)
+    for _ in range(HOTBAR_SLOTS):
+        if off >= size:
+            raise ValueError("truncated hotbar")
+        ln = frame[off]
+        off += 1
+        if ln == NO_ITEM:
+            hotbar.append(None)
+        else:
+            hotbar.append(str(frame[off:off + ln], "utf-8"))
+            off += ln
+    msg = {
+        "type": "observation",
+        "schema_version": "v0",
+        "timestamp": ts,
+        "seq": seq,
+        "payload": {
+            "pose": {"pos": {"x": x, "y": y, "z": z}, "yaw": yaw, "pitch": pitch},
+            "rays": rays,
+            "hotbar": hotbar,
+        },
+    }
+    return msg, off
+
+def EncodeActionV1(msg: Dict[str, Any]) -> bytes:
+    p = msg["payload"]
+    frame = _HEADER.pack(V1_MAGIC, TAG_ACTION, int(msg["seq"]), float(msg["timestamp"])) + _ACT_V1.pack(
+        p["look"]["dYaw"], p["look"]["dPitch"], p["move"]["forward"], p["move"]["strafe"],
+        1 if p["jump"] else 0
+    )
+    obs_seq = msg.get("obs_seq")
+    return frame if obs_seq is None else frame + _OBS_SEQ.pack(int(obs_seq))
+
+def DecodeActionV1(frame: bytes) -> Dict[str, Any]:
+    base = _HEADER.size + _ACT_V1.size
+    if len(frame) not in (base, base + _OBS_SEQ.size):
+        raise ValueError("bad action frame length")
+    magic, tag, seq, ts = _HEADER.unpack_from(frame, 0)
+    if magic != V1_MAGIC or tag != TAG_ACTION:
+        raise ValueError("not a v1 action frame")
+    dYaw, dPitch, fwd, strafe, flags = _ACT_V1.unpack_from(frame, _HEADER.size)
+    msg = {
+        "type": "action",
+        "schema_version": "v0",
+        "timestamp": ts,
+        "seq": seq,
+        "payload": {
+            "look": {"dYaw": dYaw, "dPitch": dPitch},
+            "move": {"forward": fwd, "strafe": strafe},
+            "jump": bool(flags & 1),
+        },
+    }
+    if len(frame) > base:
+        msg["obs_seq"] = _OBS_SEQ.unpack_from(frame, base)[0]
+    return msg
+
+# Encode an outgoing observation/action for a connection's negotiated wire version
+def EncodeMessage(msg: Dict[str, Any], wire: str = "v0") -> Union[str, bytes]:
+    if wire == "v1":
+        t = msg.get("type")
+        if t == "observation":
+            return EncodeObservationV1(msg)
+        if t == "action":
+            return EncodeActionV1(msg)
+    return json.dumps(msg)
+
+# Decode any incoming frame into its v0 dict form (binary v1 or JSON text). Voxel-grid
+# observations need the connection's actions.voxels.VoxelDecoder; the grid lands in
+# msg["voxels"] (a view into the decoder's ring) and its corner in msg["voxel_origin"].
+def DecodeMessage(frame: Union[str, bytes], voxels=None) -> Dict[str, Any]:
+    if isinstance(frame, str):
+        return json.loads(frame)
+    tag = FrameTag(frame)
+    if tag == TAG_OBSERVATION:
+        return DecodeObservationV1(frame)
+    if tag == TAG_OBSERVATION_GRID:
+        if voxels is None:
+            raise ValueError("voxel grid frame on a connection without voxels")
+        msg, grid, origin = voxels.Decode(frame)
+        msg["voxels"] = grid
+        msg["voxel_origin"] = origin
+        return msg
+    if tag == TAG_ACTION:
+        return DecodeActionV1(frame)
+    raise ValueError(f"unknown v1 type tag {tag}")
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import struct, zlib
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+from actions.codec import (
+    TAG_OBSERVATION_GRID, EncodeObservationV1, DecodeObservationPart,
+)
+
+# --- voxel-grid observations -------------------------------------------------
+# A v1 observation frame (tag TAG_OBSERVATION_GRID) followed by an edge^3 block-id
+# neighbourhood around the player, indexed [x, y, z] from `origin` (world block coords
+# of the grid's lowest corner):
+#
+#   grid        <BBB3iqI  edge, kind, flags, origin x y z, ref seq, body length
+#   key body    edge^3 <u2 block ids, x-major
+#   delta body  packbits(changed mask, edge^3 bits) + <u2 ids of the changed blocks
+#
+# A delta is taken against the frame whose seq is `ref`, moved by the origin change
+# (blocks that scrolled in count as AIR before the delta). Bodies are zlib-compressed
+# when that makes them smaller (FLAG_ZLIB). Each connection keeps one encoder and one
+# decoder; a decoder that lost the reference frame raises VoxelResync and the client
+# answers the `voxel_resync` event with a keyframe.
+
+_GRID = struct.Struct("<BBB3iqI")
+KIND_KEY = 0
+KIND_DELTA = 1
+FLAG_ZLIB = 0x01
+MAX_EDGE = 64
+AIR = 0
+
+_IDS = np.dtype("<u2")
+
+class VoxelResync(ValueError):
+    """A delta frame whose reference the decoder doesn't have; the client must send a keyframe."""
+
+# dst = src moved so that world block p stays put when the origin moves by d; cells that
+# scrolled in from outside become AIR
+def ShiftInto(dst: np.ndarray, src: np.ndarray, d) -> None:
+    n = src.shape[0]
+    if any(abs(int(k)) >= n for k in d):
+        dst.fill(AIR)
+        return
+    s_dst, s_src = [], []
+    for k in d:
+        k = int(k)
+        s_dst.append(slice(max(0, -k), n - max(0, k)))
+        s_src.append(slice(max(0, k), n - max(0, -k)))
+    if any(k != 0 for k in d):
+        dst.fill(AIR)
+    dst[tuple(s_dst)] = src[tuple(s_src)]
+
+# Max size of a grid frame of this edge (an uncompressed keyframe is the worst case)
+def MaxFrameBytes(edge: int) -> int:
+    return 64 + 9 * 256 + _GRID.size + 2 * edge ** 3
+
+# Largest edge whose worst-case frame fits in max_bytes
+def EdgeFor(max_bytes: int, want: int = MAX_EDGE) -> int:
+    edge = min(int(want), MAX_EDGE)
+    while edge > 1 and MaxFrameBytes(edge) > max_bytes:
+        edge -= 1
+    return edge
+
+class VoxelEncoder:
+    """
+    Client side of one connection: turns (observation, grid, origin) into grid frames,
+    a keyframe every `keyframe_every` frames (or when a delta wouldn't be smaller) and
+    deltas against the previous frame otherwise.
+    """
+    def __init__(self, edge: int, keyframe_every: int = 100, max_bytes: int = 1 << 20, compress: bool = True):
+        if not 1 <= edge <= MAX_EDGE:
+            raise ValueError(f"voxel edge must be 1..{MAX_EDGE}")
+        self.edge = edge
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.prev = np.zeros((edge,) * 3, dtype=np.uint16)
+        self.pred = np.empty_like(self.prev)
+        self.prev_origin: Optional[np.ndarray] = None
+        self.prev_seq = -1
+        self.since_key = 0
+
+    # Next frame is a keyframe (the bridge sent voxel_resync)
+    def Resync(self) -> None:
+        self.prev_origin = None
+
+    def Encode(self, msg: Dict[str, Any], grid: np.ndarray, origin) -> bytes:
+        e = self.edge
+        if grid.shape != (e, e, e):
+            raise ValueError(f"voxel grid must be {e}x{e}x{e}")
+        origin = np.asarray(origin, dtype=np.int64)
+        kind, body = KIND_KEY, None
+        if self.prev_origin is not None and self.since_key < self.keyframe_every:
+            ShiftInto(self.pred, self.prev, origin - self.prev_origin)
+            mask = grid != self.pred
+            delta = np.packbits(mask).tobytes() + grid[mask].astype(_IDS, copy=False).tobytes()
+            if len(delta) < 2 * grid.size:
+                kind, body = KIND_DELTA, delta
+        if body is None:
+            body = grid.astype(_IDS, copy=False).tobytes()
+
+        flags = 0
+        if self.compress:
+            packed = zlib.compress(body, 1)
+            if len(packed) < len(body):
+                body, flags = packed, FLAG_ZLIB
+        ref = self.prev_seq if kind == KIND_DELTA else -1
+        frame = b"".join((
+            EncodeObservationV1(msg, TAG_OBSERVATION_GRID),
+            _GRID.pack(e, kind, flags, int(origin[0]), int(origin[1]), int(origin[2]), ref, len(body)),
+            body,
+        ))
+        if len(frame) > self.max_bytes:
+            raise ValueError(f"voxel frame of {len(frame)} bytes exceeds max_msg_bytes")
+
+        np.copyto(self.prev, grid, casting="unsafe")
+        self.prev_origin = origin
+        self.prev_seq = int(msg["seq"])
+        self.since_key = self.since_key + 1 if kind == KIND_DELTA else 1
+        return frame
+
+class VoxelDecoder:
+    """
+    Bridge side of one connection. Grids are decoded into a ring of `slots` preallocated
+    uint16 arrays, so the view handed out with an observation stays intact while up to
+    slots-1 newer frames arrive (size the ring to the observation queue). The ring is
+    allocated on the first keyframe; edges above max_edge are rejected.
+    """
+    def __init__(self, max_edge: int = MAX_EDGE, slots: int = 4):
+        self.max_edge = min(int(max_edge), MAX_EDGE)
+        self.slots = max(2, int(slots))
+        self.ring: Optional[np.ndarray] = None
+        self.mask: Optional[np.ndarray] = None
+        self.cur = -1               # ring slot of the last decoded grid
+        self.seq = -1               # its seq (the next delta's ref)
+        self.origin: Optional[Tuple[int, int, int]] = None
+        self.lost = False           # waiting for a keyframe
+        self.notified = False
+
+    # Grow the ring (the observation queue got longer); the current grid is kept
+    def Reserve(self, slots: int) -> None:
+        slots = max(2, int(slots))
+        if slots <= self.slots:
+            return
+        if self.ring is not None:
+            ring = np.zeros((slots,) + self.ring.shape[1:], dtype=np.uint16)
+            if self.cur >= 0:
+                ring[0] = self.ring[self.cur]
+                self.cur = 0
+            self.ring = ring
+        self.slots = slots
+
+    # True once per lost sync: when the caller should ask the client for a keyframe
+    def Notify(self) -> bool:
+        if self.lost and not self.notified:
+            self.notified = True
+            return True
+        return False
+
+    def _Lose(self, why: str):
+        self.lost = True
+        return VoxelResync(why)
+
+    # Decode a grid frame: the grid into the next ring slot. Returns (the observation's
+    # v0 dict, grid view, origin).
+    def Decode(self, frame: bytes) -> Tuple[Dict[str, Any], np.ndarray, Tuple[int, int, int]]:
+        obs, off = DecodeObservationPart(frame, TAG_OBSERVATION_GRID)
+        seq = obs["seq"]
+        if len(frame) < off + _GRID.size:
+            raise ValueError("truncated voxel header")
+        e, kind, flags, ox, oy, oz, ref, n = _GRID.unpack_from(frame, off)
+        off += _GRID.size
+        if off + n != len(frame):
+            raise ValueError("voxel body length mismatch")
+        if not 1 <= e <= self.max_edge:
+            raise ValueError(f"voxel edge {e} outside 1..{self.max_edge}")
+        if kind not in (KIND_KEY, KIND_DELTA):
+            raise ValueError(f"unknown voxel frame kind {kind}")
+
+        cells = e ** 3
+        if kind == KIND_DELTA:
+            if self.lost or self.ring is None or self.ring.shape[1] != e or ref != self.seq:
+                raise self._Lose(f"voxel delta against seq {ref}, have {self.seq}")
+        elif self.ring is None or self.ring.shape[1] != e:
+            self.ring = np.zeros((self.slots, e, e, e), dtype=np.uint16)
+            self.mask = np.empty(cells, dtype=bool)
+            self.cur = -1
+
+        body = memoryview(frame)[off:]
+        limit = 2 * cells + (cells + 7) // 8
+        if flags & FLAG_ZLIB:
+            z = zlib.decompressobj()
+            try:
+                body = z.decompress(body, limit)
+            except zlib.error as err:
+                raise ValueError(f"bad voxel body: {err}") from None
+            if z.unconsumed_tail or not z.eof:
+                raise ValueError("voxel body inflates past the grid size")
+
+        slot = (self.cur + 1) % self.slots
+        grid = self.ring[slot]
+        if kind == KIND_KEY:
+            if len(body) != 2 * cells:
+                raise ValueError("voxel keyframe of the wrong size")
+            grid.reshape(-1)[:] = np.frombuffer(body, dtype=_IDS)
+        else:
+            nb = (cells + 7) // 8
+            if len(body) < nb:
+                raise ValueError("truncated voxel delta mask")
+            mask = self.mask
+            mask[:] = np.unpackbits(np.frombuffer(body, dtype=np.uint8, count=nb), count=cells).view(bool)
+            vals = np.frombuffer(body, dtype=_IDS, offset=nb) if len(body) > nb else np.empty(0, _IDS)
+            if (len(body) - nb) % 2 or len(vals) != int(np.count_nonzero(mask)):
+                raise ValueError("voxel delta values don't match its mask")
+            ox0, oy0, oz0 = self.origin
+            ShiftInto(grid, self.ring[self.cur], (ox - ox0, oy - oy0, oz - oz0))
+            grid.reshape(-1)[mask] = vals
+
+        self.cur = slot
+        self.seq = seq
+        self.origin = (ox, oy, oz)
+        self.lost = self.notified = False
+        return obs, grid, self.origin
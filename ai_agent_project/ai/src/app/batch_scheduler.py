@@ -0,0 +1,177 @@
+from __future__ import annotations
+import asyncio, itertools, time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+from policy_worker import QueueAdd, DrainLatest, BuildAction, LatencyWindow, PolicyError, _idle_payload
+from utils.metrics import StageMetrics
+from ticker import TickScheduler
+from tracing import Decided
+
+@dataclass
+class _Conn:
+    obs_q: asyncio.Queue
+    act_q: asyncio.Queue
+    drop_policy: str
+    on_drop: Any
+    emit_event: Any = None
+    recorder: Any = None
+    latest_obs: Optional[dict] = None
+    seq_out: Iterator[int] = field(default_factory=itertools.count)    # the connection's action seq
+    latency: LatencyWindow = field(default_factory=LatencyWindow)
+    live: Any = None                    # policy_worker.LiveQueues; overrides drop_policy when set
+    policy: Any = None                  # app.registry.PolicyHandle; None decides on the scheduler's backend
+    trace: Optional[dict] = None        # app.tracing trace of the observation decided this tick
+    remote: Any = None                  # () -> True while app.dispatch answers this connection instead
+
+class BatchScheduler:
+    """
+    One scheduler for every connection. Each tick (or arrival, see app.ticker):
+      - drains every registered obs_q, keeping each connection's most recent observation
+      - answers connections whose quantised state is in the decision cache (if any) and
+        runs decide_batch(list_of_obs) once per policy version for the rest (versions
+        concurrently; a connection without a registry handle uses the scheduler's
+        backend), within the ticker's budget
+      - clamps, validates, and enqueues each action on its connection's act_q, tagged
+        with the observation's seq and carrying its trace if it was sampled
+    Connections without an observation yet get idle, as in PolicyWorker; connections
+    served by remote workers (`remote`) are skipped once their obs_q is empty.
+    """
+    def __init__(self, backend, act_validator, log, ticker: TickScheduler | None = None, cache=None):
+        self.backend = backend          # app.executors backend for connections registered without a policy handle
+        self.act_validator = act_validator
+        self.log = log
+        self.ticker = ticker if ticker is not None else TickScheduler()
+        self.cache = cache              # policy.cache.DecisionCache (optional)
+        self.conns: Dict[Any, _Conn] = {}
+
+    def Register(self, key, obs_q, act_q, drop_policy: str, on_drop, emit_event=None, recorder=None,
+                 metrics: StageMetrics | None = None, live=None, policy=None, clock=None,
+                 action_seq: Iterator[int] | None = None, remote=None) -> None:
+        self.conns[key] = _Conn(obs_q, act_q, drop_policy, on_drop, emit_event, recorder,
+                                seq_out=action_seq if action_seq is not None else itertools.count(),
+                                latency=LatencyWindow(metrics, clock=clock), live=live, policy=policy,
+                                remote=remote)
+
+    def Unregister(self, key) -> None:
+        self.conns.pop(key, None)
+
+    async def Run(self):
+        while True:
+            await self.ticker.Wait()
+            try:
+                await self.Tick()
+            except Exception:
+                self.log.exception("batch scheduler tick failed")
+
+    async def Tick(self) -> None:
+        conns = []
+        for c in self.conns.values():
+            if c.remote is not None and c.obs_q.empty() and c.remote():
+                c.latest_obs = None
+                continue
+            conns.append(c)
+        now = time.perf_counter()
+        for c in conns:
+            prev = c.latest_obs
+            c.latest_obs = DrainLatest(c.obs_q, prev)
+            c.trace = None
+            if c.latest_obs is not prev:
+                c.latency.metrics.Record("obs_queue", now - c.latency.metrics.obs_enqueued_at)
+                c.trace = c.latest_obs.pop("trace", None)
+
+        # every connection's version is read once, here: a registry swap lands between ticks
+        groups: Dict[Any, list] = {}
+        for c in conns:
+            if c.latest_obs is not None:
+                backend = c.policy.Current() if c.policy is not None else self.backend
+                groups.setdefault(backend, []).append(c)
+        decided: Dict[int, Any] = {}
+        errors: Dict[int, str] = {}
+        versions: Dict[int, Any] = {}
+        if groups:
+            outs = await asyncio.gather(*(self._Decide(b, g) for b, g in groups.items()))
+            for (b, g), (d, err) in zip(groups.items(), outs):
+                decided.update(d)
+                for c in g:
+                    versions[id(c)] = b
+                    if err is not None:
+                        errors[id(c)] = err
+
+        for c in conns:
+            if c.latest_obs is None:
+                payload = _idle_payload()
+            else:
+                payload = decided.get(id(c))
+                err = errors.get(id(c)) if payload is None else (_ErrorText(payload) if isinstance(payload, Exception) else None)
+                if err is not None:
+                    payload = _idle_payload()
+                    if c.emit_event:
+                        await c.emit_event("policy_error", PolicyError(err, versions.get(id(c))))
+                c.latency.Add(float(c.latest_obs.get("timestamp", time.time())))
+
+            t0 = time.perf_counter()
+            msg = BuildAction(payload, next(c.seq_out), self.act_validator, self.log,
+                              c.latest_obs.get("seq") if c.latest_obs is not None else None)
+            c.latency.metrics.Record("clamp_validate", time.perf_counter() - t0)
+            if c.recorder is not None:
+                c.recorder.Acted(msg)
+            if c.trace is not None:
+                msg["trace"] = c.trace
+            await QueueAdd(c.act_q, msg, c.live.drop_policy if c.live is not None else c.drop_policy, c.on_drop)
+
+            if c.emit_event and c.latency.Due():
+                await c.emit_event("latency_stats", c.latency.Report(self.ticker, getattr(versions.get(id(c)), "name", None)))
+
+    # One policy version's share of a tick: cache lookups, then one decide_batch for the
+    # misses. Returns ({id(conn): payload | Exception}, error for the whole batch or None).
+    async def _Decide(self, backend, ready: list):
+        start = time.time()
+        cache = self.cache if self.cache is not None else getattr(backend, "cache", None)
+        cached: Dict[int, Any] = {}
+        keys: Dict[int, Any] = {}
+        if cache is not None:
+            cache.Check(backend.PolicyVersion())
+            for c in ready:
+                t0 = time.perf_counter()
+                key = keys[id(c)] = cache.Key(c.latest_obs)
+                payload = cache.Get(key)
+                c.latency.CacheResult(payload is not None)
+                if payload is not None:
+                    cached[id(c)] = payload
+                    c.latency.metrics.Record("decide", time.perf_counter() - t0)
+                    Decided(c.trace, start, time.time(), backend, cached=True)
+            ready = [c for c in ready if id(c) not in cached]
+
+        results: list = []
+        error: Optional[str] = None
+        if ready:
+            t0 = time.perf_counter()
+            try:
+                results = await backend.DecideBatch([c.latest_obs for c in ready], self.ticker.Budget())
+                batchS = time.perf_counter() - t0
+                for c in ready:
+                    c.latency.metrics.Record("decide", batchS)
+                if len(results) != len(ready):
+                    raise ValueError(f"decide_batch returned {len(results)} actions for {len(ready)} observations")
+            except asyncio.TimeoutError:
+                self.log.warning("decide_batch() timed out; sending idle", extra={"batch": len(ready)})
+                error = "decide_timeout"
+            except Exception as e:
+                self.log.warning("decide_batch() error; sending idle", extra={"error": str(e)})
+                error = str(e)
+
+        end = time.time()
+        for c in ready:
+            Decided(c.trace, start, end, backend)
+        decided = {id(c): r for c, r in zip(ready, results)} if error is None else {}
+        if cache is not None:
+            for c in ready:
+                r = decided.get(id(c))
+                if r is not None and not isinstance(r, Exception):
+                    cache.Put(keys[id(c)], r)
+        decided.update(cached)
+        return decided, error
+
+def _ErrorText(e: Exception) -> str:
+    return "decide_timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
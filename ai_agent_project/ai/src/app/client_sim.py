@@ -1,6 +1,8 @@
 # client_sim_v0.py
+#   python client_sim.py --smoke                      # the original four-message walkthrough
+#   python client_sim.py -n 50 --hz 20 --duration 30 [--server-pid PID] [--save-baseline b.json | --baseline b.json]
 from __future__ import annotations
-import asyncio, json, time, contextlib
+import argparse, asyncio, json, math, os, random, sys, time, contextlib
 import websockets
 from itertools import count
 
@@ -66,7 +68,7 @@ def action_v0(seq: int) -> dict:
         }
     }
 
-async def main():
+async def smoke():
     rtt = {}  # seq -> send_time
     action_counter = count(1)
 
@@ -147,5 +149,300 @@ async def main():
         with contextlib.suppress(asyncio.CancelledError):
             await recv_task
 
+# ---------------------------------------------------------------------------
+# Load generator: N simulated game clients, each streaming observations at `hz`
+# ---------------------------------------------------------------------------
+
+def _percentile(sorted_vals, p):
+    # p in [0,1]; input should be pre-sorted
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(p * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+def Summary(samples_ms: list) -> dict:
+    vals = sorted(samples_ms)
+    return {
+        "count": len(vals),
+        "p50_ms": _percentile(vals, 0.50),
+        "p90_ms": _percentile(vals, 0.90),
+        "p99_ms": _percentile(vals, 0.99),
+        "max_ms": vals[-1] if vals else 0.0,
+    }
+
+# Walker with a smooth random heading, so consecutive observations look like a player
+class DriftingPose:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.x, self.y, self.z = rng.uniform(-100, 100), 64.0, rng.uniform(-100, 100)
+        self.yaw, self.pitch = rng.uniform(-180, 180), 0.0
+        self.speed = 4.3  # blocks/s, vanilla walking
+
+    def Step(self, dt: float) -> dict:
+        self.yaw = (self.yaw + self.rng.gauss(0.0, 8.0) + 180.0) % 360.0 - 180.0
+        self.pitch = max(-45.0, min(45.0, self.pitch + self.rng.gauss(0.0, 3.0)))
+        rad = math.radians(self.yaw)
+        self.x += -math.sin(rad) * self.speed * dt
+        self.z += math.cos(rad) * self.speed * dt
+        if self.rng.random() < 0.02:
+            self.y += self.rng.choice((-1.0, 1.0))
+        rays = [round(self.rng.uniform(0.5, 8.0), 2) for _ in range(self.rng.choice((3, 4, 5)))]
+        return {
+            "pose": {"pos": {"x": self.x, "y": self.y, "z": self.z}, "yaw": self.yaw, "pitch": self.pitch},
+            "rays": rays,
+            "hotbar": ["minecraft:stone", "minecraft:oak_planks"] + [None] * 7,
+        }
+
+class LoadStats:
+    def __init__(self):
+        self.sent = 0
+        self.acks = 0
+        self.actions = 0
+        self.unmatched_actions = 0
+        self.repeat_actions = 0          # re-decisions on an observation that was already answered
+        self.mismatches = 0
+        self.dropped = {"observation": 0, "action": 0}
+        self.ack_rtt_ms: list = []
+        self.obs_to_action_ms: list = []
+        self.server_latency: list = []   # latency_stats payloads reported by the bridge
+        self.trace_hops_ms: dict = {}    # hop -> samples, from the bridge's sampled trace events
+        self.clock: list = []            # last (offset_ms, rtt_ms) the bridge reported per client
+        self.connect_failures = 0
+        self.received = 0                # frames from the bridge, of any kind
+        self.flow_events = 0
+        self.credit_waits = 0            # sends held back for lack of credit
+
+async def SimClient(idx: int, url: str, hz: float, duration: float, stats: LoadStats, seed: int,
+                    acks: str = "per_message", flow: bool = False) -> None:
+    rng = random.Random(seed + idx)
+    pose = DriftingPose(rng)
+    sentAt: dict = {}          # seq -> perf_counter at send, until acked
+    actionWait: dict = {}      # seq -> perf_counter at send, until an action answers it (or a newer one)
+    answered = {"seq": -1}     # highest obs_seq answered so far
+    clock = {}
+    period = 1.0 / hz
+    credit = {"credits": 0, "hz": hz}
+    creditEvt = asyncio.Event()
+
+    try:
+        ws = await websockets.connect(url, max_size=None)
+    except OSError:
+        stats.connect_failures += 1
+        return
+    hello = {"role": "game"}
+    if acks != "per_message":
+        hello["acks"] = acks
+    if flow:
+        hello["flow"] = "credit"
+    if len(hello) > 1:
+        await ws.send(json.dumps({"type": "event", "schema_version": "v0", "timestamp": time.time(),
+                                  "kind": "hello", "payload": hello}))
+
+    async def Recv():
+        async for raw in ws:
+            now = time.perf_counter()
+            stats.received += 1
+            try:
+                msg = json.loads(raw)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            mtype = msg.get("type")
+            if mtype == "action":
+                stats.actions += 1
+                obsSeq = msg.get("obs_seq")
+                t0 = actionWait.pop(obsSeq, None)
+                if t0 is not None:
+                    stats.obs_to_action_ms.append((now - t0) * 1000.0)
+                elif obsSeq is not None and obsSeq <= answered["seq"]:
+                    stats.repeat_actions += 1
+                else:
+                    stats.unmatched_actions += 1
+                if obsSeq is not None and obsSeq > answered["seq"]:
+                    # the bridge decides on the latest observation only; older ones never get an answer
+                    answered["seq"] = obsSeq
+                    for s in [s for s in actionWait if s < obsSeq]:
+                        del actionWait[s]
+                continue
+            kind = msg.get("kind")
+            payload = msg.get("payload") or {}
+            if kind == "heartbeat":
+                # echo it so the bridge can estimate our clock offset (app.tracing.ClockEstimator)
+                t1 = time.time()
+                if "offset_ms" in payload:
+                    clock.update(offset_ms=payload["offset_ms"], rtt_ms=payload["rtt_ms"])
+                await ws.send(json.dumps({"type": "event", "schema_version": "v0", "timestamp": time.time(),
+                                          "kind": "clock", "payload": {"t0": msg["timestamp"], "t1": t1, "t2": time.time()}}))
+            elif kind == "trace":
+                for hop, ms in payload.get("hops_ms", {}).items():
+                    stats.trace_hops_ms.setdefault(hop, []).append(ms)
+            elif kind == "ack":
+                t0 = sentAt.pop(payload.get("seq"), None)
+                if t0 is not None:
+                    stats.acks += 1
+                    stats.ack_rtt_ms.append((now - t0) * 1000.0)
+            elif kind == "ack_upto":
+                upto = payload.get("seq", -1)
+                for s in list(sentAt):
+                    if s > upto:
+                        break
+                    stats.acks += 1
+                    stats.ack_rtt_ms.append((now - sentAt.pop(s)) * 1000.0)
+            elif kind == "dropped_summary":
+                for d in payload.get("drops", []):
+                    stats.dropped[d["kind"]] = stats.dropped.get(d["kind"], 0) + d["count"]
+            elif kind == "dropped":
+                which = payload.get("kind", "observation")
+                stats.dropped[which] = stats.dropped.get(which, 0) + 1
+            elif kind == "flow":
+                stats.flow_events += 1
+                credit["credits"] += payload.get("credits", 0)
+                credit["hz"] = min(hz, payload.get("target_hz", hz))
+                creditEvt.set()
+            elif kind == "schema_mismatch":
+                stats.mismatches += 1
+            elif kind == "latency_stats":
+                stats.server_latency.append(payload)
+
+    recvTask = asyncio.create_task(Recv())
+    try:
+        # stagger start so N clients don't tick in lockstep
+        await asyncio.sleep(rng.uniform(0.0, period))
+        start = time.perf_counter()
+        nextAt = start
+        seq = 0
+        while time.perf_counter() - start < duration:
+            if flow:
+                # send only on credit, at the rate the bridge asks for
+                if credit["credits"] <= 0:
+                    stats.credit_waits += 1
+                    creditEvt.clear()
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(creditEvt.wait(), max(0.0, duration - (time.perf_counter() - start)))
+                    continue
+                credit["credits"] -= 1
+                period = 1.0 / credit["hz"]
+            seq += 1
+            msg = {"type": "observation", "schema_version": "v0", "timestamp": time.time(),
+                   "seq": seq, "payload": pose.Step(period)}
+            frame = json.dumps(msg)
+            t = time.perf_counter()
+            sentAt[seq] = actionWait[seq] = t
+            await ws.send(frame)
+            stats.sent += 1
+            # skip ticks we are already late for rather than bursting to catch up
+            nextAt += period
+            if nextAt < t:
+                nextAt = t + period
+            await asyncio.sleep(nextAt - time.perf_counter())
+        await asyncio.sleep(0.5)  # let trailing acks/actions arrive
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        if clock:
+            stats.clock.append((clock["offset_ms"], clock["rtt_ms"]))
+        recvTask.cancel()
+        with contextlib.suppress(BaseException):
+            await recvTask
+        await ws.close()
+
+# utime + stime of a process in seconds, from /proc (None when unavailable)
+def ProcCpuSeconds(pid: int):
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+async def RunLoad(url: str, clients: int, hz: float, duration: float, server_pid=None, seed: int = 0,
+                  acks: str = "per_message", flow: bool = False) -> dict:
+    stats = LoadStats()
+    cpu0 = ProcCpuSeconds(server_pid) if server_pid else None
+    t0 = time.perf_counter()
+    await asyncio.gather(*(SimClient(i, url, hz, duration, stats, seed, acks, flow) for i in range(clients)))
+    wall = time.perf_counter() - t0
+    cpu1 = ProcCpuSeconds(server_pid) if server_pid else None
+
+    return {
+        "config": {"url": url, "clients": clients, "hz": hz, "duration_s": duration, "acks": acks, "flow": flow},
+        "wall_s": wall,
+        "sent": stats.sent,
+        "throughput_obs_s": stats.sent / duration if duration else 0.0,
+        "received_frames": stats.received,
+        "acks": stats.acks,
+        "ack_loss": 1.0 - stats.acks / stats.sent if stats.sent else 0.0,
+        "ack_rtt": Summary(stats.ack_rtt_ms),
+        "actions": stats.actions,
+        "unmatched_actions": stats.unmatched_actions,
+        "repeat_actions": stats.repeat_actions,
+        "obs_to_action": Summary(stats.obs_to_action_ms),
+        "dropped": stats.dropped,
+        "schema_mismatch": stats.mismatches,
+        "connect_failures": stats.connect_failures,
+        "flow_events": stats.flow_events,
+        "credit_waits": stats.credit_waits,
+        "server_p90_ms_max": max((p.get("p90_ms", 0.0) for p in stats.server_latency), default=None),
+        "trace_hops": {hop: Summary(ms) for hop, ms in stats.trace_hops_ms.items()},
+        "clock_offset_ms_max": max((abs(o) for o, _ in stats.clock), default=None),
+        "clock_rtt": Summary([r for _, r in stats.clock]),
+        "server_cpu_pct": (cpu1 - cpu0) / wall * 100.0 if cpu0 is not None and cpu1 is not None else None,
+    }
+
+# Metrics where a higher value is a regression, compared against a saved baseline
+REGRESSION_KEYS = [
+    ("ack_rtt", "p50_ms"), ("ack_rtt", "p90_ms"), ("ack_rtt", "p99_ms"),
+    ("obs_to_action", "p50_ms"), ("obs_to_action", "p90_ms"), ("obs_to_action", "p99_ms"),
+    ("server_cpu_pct",), ("ack_loss",),
+]
+
+def _Get(d: dict, path: tuple):
+    for k in path:
+        d = d.get(k) if isinstance(d, dict) else None
+    return d
+
+def CompareBaseline(result: dict, baseline: dict, tolerance: float, floor_ms: float = 1.0) -> list:
+    """Return the metrics that got worse than baseline * (1 + tolerance) (+ floor_ms of slack)."""
+    regressions = []
+    for path in REGRESSION_KEYS:
+        old, new = _Get(baseline, path), _Get(result, path)
+        if old is None or new is None:
+            continue
+        limit = old * (1.0 + tolerance) + (floor_ms if path[-1].endswith("_ms") else 0.0)
+        if new > limit:
+            regressions.append({"metric": ".".join(path), "baseline": old, "current": new, "limit": limit})
+    old, new = baseline.get("throughput_obs_s"), result.get("throughput_obs_s")
+    if old and new is not None and new < old * (1.0 - tolerance):
+        regressions.append({"metric": "throughput_obs_s", "baseline": old, "current": new, "limit": old * (1.0 - tolerance)})
+    return regressions
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    ap = argparse.ArgumentParser(description="Simulated game clients for the AI bridge")
+    ap.add_argument("--smoke", action="store_true", help="run the original single-connection walkthrough")
+    ap.add_argument("--url", default=WS_URL)
+    ap.add_argument("-n", "--clients", type=int, default=10)
+    ap.add_argument("--hz", type=float, default=10.0, help="observations per second per client")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds of load per client")
+    ap.add_argument("--server-pid", type=int, default=None, help="bridge pid, to report its CPU use")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--acks", choices=["per_message", "cumulative"], default="per_message",
+                    help="cumulative negotiates ack_upto / dropped_summary via hello")
+    ap.add_argument("--flow", action="store_true", help="negotiate credit flow control and pace sends by it")
+    ap.add_argument("--save-baseline", metavar="PATH", help="write this run's summary as the baseline")
+    ap.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline; exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=0.20, help="allowed relative slowdown vs baseline")
+    args = ap.parse_args()
+
+    if args.smoke:
+        asyncio.run(smoke())
+        sys.exit(0)
+
+    result = asyncio.run(RunLoad(args.url, args.clients, args.hz, args.duration, args.server_pid, args.seed, args.acks, args.flow))
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            result["regressions"] = CompareBaseline(result, json.load(f), args.tolerance)
+    print(json.dumps(result, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if result.get("regressions"):
+        sys.exit(1)
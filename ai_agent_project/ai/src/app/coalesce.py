@@ -0,0 +1,58 @@
+from __future__ import annotations
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Negotiated with hello {"acks": "cumulative"}; v0 clients keep one ack per observation
+ACK_MODES = ["per_message", "cumulative"]
+
+class AckBatcher:
+    """
+    Cumulative acknowledgement: instead of one `ack` per observation (or per action,
+    from a policy worker), the bridge sends `ack_upto` {seq: highest seq accepted,
+    count: messages since the last one} every `every_n` messages or `every_ms`,
+    whichever comes first.
+    """
+    def __init__(self, every_ms: float = 50.0, every_n: int = 32):
+        self.every_s = every_ms / 1000.0
+        self.every_n = int(every_n)
+        self.seq = -1
+        self.count = 0
+
+    # Record one accepted message; True when the count threshold says flush now
+    def Add(self, seq: int) -> bool:
+        if seq > self.seq:
+            self.seq = seq
+        self.count += 1
+        return self.count >= self.every_n
+
+    def Take(self) -> Optional[Dict[str, Any]]:
+        if self.count == 0:
+            return None
+        out = {"seq": max(self.seq, 0), "count": self.count}
+        self.count = 0
+        return out
+
+class DropCounter:
+    """Per-interval queue overflow counts, sent as one `dropped_summary` instead of an event per drop."""
+    def __init__(self):
+        self.counts: Dict[Tuple[str, str], list] = {}     # (kind, policy) -> [count, last qsize]
+        self.since = time.monotonic()
+
+    def Add(self, kind: str, policy: str, qsize: int) -> None:
+        c = self.counts.get((kind, policy))
+        if c is None:
+            self.counts[(kind, policy)] = [1, qsize]
+        else:
+            c[0] += 1
+            c[1] = qsize
+
+    def Take(self) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        if not self.counts:
+            self.since = now
+            return None
+        drops = [{"kind": k, "policy": p, "count": n, "qsize": q} for (k, p), (n, q) in self.counts.items()]
+        out = {"interval_s": now - self.since, "drops": drops}
+        self.counts.clear()
+        self.since = now
+        return out
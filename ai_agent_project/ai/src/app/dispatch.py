@@ -0,0 +1,187 @@
+from __future__ import annotations
+import asyncio, time, itertools
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from actions.codec import WithoutLocal
+from policy_worker import _idle_payload
+from transport import SendMessage
+from shards import SHARD_STRIDE
+
+# How long an expired request keeps counting against its worker before it is forgotten
+LATE_GRACE_S = 5.0
+
+@dataclass
+class _Worker:
+    ws: Any
+    outstanding: int = 0
+    ewma_ms: float = 0.0          # smoothed reply latency
+    served: int = 0
+
+@dataclass
+class _Pending:
+    game: Any                     # websocket of the game client that sent the observation
+    worker: _Worker
+    seq: int                      # the game client's own observation seq
+    sent_ts: float
+    timer: Optional[asyncio.TimerHandle] = None
+    expired: bool = False
+
+# Routes each observation from a game client to exactly one remote policy worker
+# and the worker's action back to the game client that asked for it. While a worker
+# is available this replaces the connection's local decide (server.Handle skips the
+# obs_q and its policy task sends nothing); replies are numbered from the game
+# connection's own action seq (actSeq), so the client sees one action stream, and are
+# passed to its recorders (recorder) as local decisions are. In sharded mode
+# (app.shards) workers on other shards appear as RemoteWorker proxies and request ids
+# carry this shard's index, so a reply can be relayed back to the shard that asked.
+class Dispatcher:
+    def __init__(self, budget_ms: float, log, shard: int = 0):
+        self.budget_s = budget_ms / 1000.0
+        self.log = log
+        self.shard = shard
+        self.relay = None             # app.shards.ShardRelay when running sharded
+        self.workers: Dict[Any, _Worker] = {}
+        self.pending: Dict[int, _Pending] = {}
+        self._ids = itertools.count()
+
+    def AddWorker(self, ws) -> None:
+        if ws not in self.workers:
+            self.workers[ws] = _Worker(ws)
+            self.log.info("policy worker registered", extra={"workers": len(self.workers)})
+
+    def RemoveWorker(self, ws) -> None:
+        w = self.workers.pop(ws, None)
+        if w is None:
+            return
+        # anything still waiting on this worker falls back to idle right away
+        for rid, p in list(self.pending.items()):
+            if p.worker is w:
+                self._Expire(rid, final=True)
+        self.log.info("policy worker removed", extra={"workers": len(self.workers)})
+
+    def RemoveGame(self, ws) -> None:
+        for rid, p in list(self.pending.items()):
+            if p.game is ws:
+                p.game = None
+
+    def IsWorker(self, ws) -> bool:
+        return ws in self.workers
+
+    # True when Dispatch would find a worker (connections then stop deciding locally)
+    def Available(self) -> bool:
+        return any(not getattr(w.ws, "closed", False) for w in self.workers.values())
+
+    # Least outstanding requests among workers expected to answer within budget;
+    # if none are expected to make it, least outstanding overall.
+    def _Pick(self) -> Optional[_Worker]:
+        best = None
+        bestFits = False
+        for w in self.workers.values():
+            if getattr(w.ws, "closed", False):
+                continue
+            fits = w.ewma_ms * (w.outstanding + 1) <= self.budget_s * 1000.0
+            if best is None or (fits, -w.outstanding) > (bestFits, -best.outstanding):
+                best, bestFits = w, fits
+        return best
+
+    # Forward one observation; returns False when no worker is available
+    async def Dispatch(self, game, msg: Dict[str, Any]) -> bool:
+        w = self._Pick()
+        if w is None:
+            return False
+
+        rid = next(self._ids) * SHARD_STRIDE + self.shard
+        p = _Pending(game=game, worker=w, seq=int(msg.get("seq", 0)), sent_ts=time.time())
+        p.timer = asyncio.get_running_loop().call_later(self.budget_s, self._Expire, rid)
+        self.pending[rid] = p
+        w.outstanding += 1
+
+        # the worker sees a dispatcher-owned seq so replies from many games never collide
+        fwd = WithoutLocal(msg)       # local feature/voxel views; remote workers get the observation itself
+        fwd = dict(fwd) if fwd is msg else fwd
+        fwd["seq"] = rid
+        try:
+            await SendMessage(w.ws, fwd)
+        except Exception as e:
+            self.log.warning("dispatch to worker failed", extra={"error": str(e)})
+            self.RemoveWorker(w.ws)
+        return True
+
+    # Route a worker's action back to the originating game client
+    async def Complete(self, worker_ws, msg: Dict[str, Any]) -> None:
+        rid = msg.get("seq")
+        p = self.pending.get(rid)
+        if p is None and self.relay is not None and self.relay.Action(worker_ws, msg):
+            return
+        if p is None or p.worker.ws is not worker_ws:
+            self.log.debug("unmatched action from worker", extra={"seq": rid})
+            return
+
+        del self.pending[rid]
+        if p.timer is not None:
+            p.timer.cancel()
+        w = p.worker
+        w.outstanding = max(0, w.outstanding - 1)
+        w.served += 1
+        ms = (time.time() - p.sent_ts) * 1000.0
+        w.ewma_ms = ms if w.served == 1 else 0.8 * w.ewma_ms + 0.2 * ms
+
+        if p.expired:
+            # idle was already sent for this observation
+            self.log.debug("late action dropped", extra={"seq": p.seq, "ms": ms})
+            return
+        if p.game is None:
+            return
+
+        out = dict(msg)
+        out["seq"] = _ActionSeq(p.game, p.seq)
+        out["obs_seq"] = p.seq
+        _Record(p.game, out)
+        await self._Send(p.game, out)
+
+    def _Expire(self, rid: int, final: bool = False) -> None:
+        p = self.pending.get(rid)
+        if p is None:
+            return
+        if not p.expired and p.game is not None:
+            idle = _IdleAction(_ActionSeq(p.game, p.seq), p.seq)
+            _Record(p.game, idle)
+            asyncio.ensure_future(self._Send(p.game, idle))
+        p.expired = True
+
+        if final:
+            del self.pending[rid]
+            p.worker.outstanding = max(0, p.worker.outstanding - 1)
+            if p.timer is not None:
+                p.timer.cancel()
+        else:
+            # keep counting against the worker until it replies late or the grace runs out
+            p.timer = asyncio.get_running_loop().call_later(LATE_GRACE_S, self._Expire, rid, True)
+
+    async def _Send(self, ws, msg: Dict[str, Any]) -> None:
+        try:
+            await SendMessage(ws, msg)
+        except Exception as e:
+            self.log.debug("send to game client failed", extra={"error": str(e)})
+
+# Next seq of the game connection's action stream (connections without one echo the observation's)
+def _ActionSeq(game, obs_seq: int) -> int:
+    counter = getattr(game, "actSeq", None)
+    return next(counter) if counter is not None else obs_seq
+
+# Hand an action sent to a game client to its recorders (replay transitions, trajectory log)
+def _Record(game, msg: Dict[str, Any]) -> None:
+    recorder = getattr(game, "recorder", None)
+    if recorder is not None:
+        recorder.Acted(msg)
+
+def _IdleAction(seq: int, obs_seq: int) -> Dict[str, Any]:
+    return {
+        "type": "action",
+        "schema_version": "v0",
+        "timestamp": time.time(),
+        "seq": seq,
+        "obs_seq": obs_seq,
+        "payload": _idle_payload(),
+    }
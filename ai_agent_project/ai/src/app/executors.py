@@ -0,0 +1,420 @@
+from __future__ import annotations
+import asyncio, importlib, importlib.util, os, struct, sys, time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from policy.batch import AsBatch
+from features.extract import WIDTH as FEATURE_WIDTH, WantsFeatures, PolicyInput, PolicyBatchInput
+from policy.cache import VersionOf
+from policy.checkpoint import CheckpointTarget
+
+# Policy execution backends. Both expose the same async surface:
+#   await Decide(obs, timeout_s) -> payload       (raises asyncio.TimeoutError)
+#   await DecideBatch(obs_list, timeout_s) -> list of payload | Exception
+#   Stats() -> per-worker utilisation, Close()
+#   Depth() -> requests waiting for / held by a worker right now (for the loop monitor)
+#   PolicyVersion() -> changes whenever the policy's parameters do (policy.cache.VersionOf)
+# and `wants_features`: the policy takes the stacked feature view (features.extract)
+# rather than the observation dict, so the server must run the extraction stage;
+# `checkpoint_target`: the in-process object policy.checkpoint can snapshot (or None).
+
+class ThreadBackend:
+    """Runs the policy in the loop's default thread pool (the original behaviour)."""
+    def __init__(self, policy: Any):
+        self.decide = getattr(policy, "decide", policy)
+        self.decide_batch = AsBatch(policy)
+        self.wants_features = WantsFeatures(policy)
+        self.version = VersionOf(policy)
+        self.checkpoint_target = CheckpointTarget(policy)
+        self.busy_s = 0.0
+        self.jobs = 0
+        self.submitted = 0
+        self.running = 0
+        self._last = (time.monotonic(), 0.0)
+
+    def Start(self) -> None:
+        pass
+
+    def _Timed(self, fn, arg):
+        self.running += 1
+        t0 = time.perf_counter()
+        try:
+            return fn(arg)
+        finally:
+            self.busy_s += time.perf_counter() - t0
+            self.jobs += 1
+            self.running -= 1
+
+    async def Decide(self, obs, timeout_s: float):
+        loop = asyncio.get_running_loop()
+        arg = PolicyInput(obs, self.wants_features)
+        self.submitted += 1
+        return await asyncio.wait_for(loop.run_in_executor(None, self._Timed, self.decide, arg), timeout_s)
+
+    async def DecideBatch(self, obs_list, timeout_s: float):
+        loop = asyncio.get_running_loop()
+        arg = PolicyBatchInput(obs_list, self.wants_features)
+        self.submitted += 1
+        return await asyncio.wait_for(loop.run_in_executor(None, self._Timed, self.decide_batch, arg), timeout_s)
+
+    def PolicyVersion(self):
+        return self.version()
+
+    def Stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        t0, busy0 = self._last
+        self._last = (now, self.busy_s)
+        util = (self.busy_s - busy0) / max(1e-9, now - t0)
+        return [{"worker": "thread", "util": util, "jobs": self.jobs}]
+
+    # Timed-out calls still count until their thread finishes them
+    def Depth(self) -> Dict[str, int]:
+        running = self.running
+        return {"queued": max(0, self.submitted - self.jobs - running), "running": running}
+
+    def Close(self) -> None:
+        pass
+
+# --- shared-memory slot layout (little-endian) -------------------------------
+# Each worker owns a ring of fixed-size slots: request half written by the loop,
+# reply half written by the worker. Only (slot, gen) ids cross the pipe. For a policy
+# that wants features, each slot also carries the (frames, WIDTH) float32 stack.
+
+HOTBAR_SLOTS = 9
+HOTBAR_BYTES = 64                               # utf-8 item id, length-prefixed, 63 bytes max
+_OBS = struct.Struct("<Iqd5dB5d")               # gen, seq, ts, x y z yaw pitch, nrays, rays[5]
+_HOT = struct.Struct(f"<B{HOTBAR_BYTES - 1}s")
+_ACT = struct.Struct("<IB4dB")                  # gen, status, dYaw dPitch forward strafe, jump
+ERR_BYTES = 128
+_ERR = struct.Struct(f"<H{ERR_BYTES}s")
+_STATS = struct.Struct("<QQq")                  # busy_ns, jobs, policy version (-1 = none; one per worker)
+_MSG = struct.Struct("<II")                     # slot, gen
+_GEN = struct.Struct("<I")                      # leading field of _OBS
+
+OBS_OFF = 0
+HOT_OFF = OBS_OFF + _OBS.size
+ACT_OFF = HOT_OFF + HOTBAR_SLOTS * HOTBAR_BYTES
+ERR_OFF = ACT_OFF + _ACT.size
+FEAT_OFF = ((ERR_OFF + _ERR.size + 15) // 16) * 16
+NO_ITEM = 0xFF
+
+def SlotBytes(frames: int = 0) -> int:
+    return ((FEAT_OFF + frames * FEATURE_WIDTH * 4 + 63) // 64) * 64
+
+SLOT_BYTES = SlotBytes()
+
+def _WriteObs(buf, off: int, gen: int, obs: Dict[str, Any]) -> None:
+    p = obs["payload"]
+    pose = p["pose"]
+    pos = pose["pos"]
+    rays = list(p["rays"])[:5]
+    _OBS.pack_into(
+        buf, off + OBS_OFF, gen, int(obs.get("seq", 0)), float(obs.get("timestamp", 0.0)),
+        pos["x"], pos["y"], pos["z"], pose["yaw"], pose["pitch"],
+        len(rays), *(rays + [0.0] * (5 - len(rays)))
+    )
+    for i, item in enumerate(p["hotbar"][:HOTBAR_SLOTS]):
+        if item is None:
+            _HOT.pack_into(buf, off + HOT_OFF + i * HOTBAR_BYTES, NO_ITEM, b"")
+        else:
+            raw = item.encode("utf-8")[:HOTBAR_BYTES - 1]
+            _HOT.pack_into(buf, off + HOT_OFF + i * HOTBAR_BYTES, len(raw), raw)
+
+def _ReadObs(buf, off: int):
+    gen, seq, ts, x, y, z, yaw, pitch, nrays, *rays = _OBS.unpack_from(buf, off + OBS_OFF)
+    hotbar = []
+    for i in range(HOTBAR_SLOTS):
+        n, raw = _HOT.unpack_from(buf, off + HOT_OFF + i * HOTBAR_BYTES)
+        hotbar.append(None if n == NO_ITEM else raw[:n].decode("utf-8", "replace"))
+    return gen, {
+        "type": "observation",
+        "schema_version": "v0",
+        "timestamp": ts,
+        "seq": seq,
+        "payload": {
+            "pose": {"pos": {"x": x, "y": y, "z": z}, "yaw": yaw, "pitch": pitch},
+            "rays": rays[:nrays],
+            "hotbar": hotbar,
+        },
+    }
+
+def _WriteAction(buf, off: int, gen: int, payload: Dict[str, Any]) -> None:
+    look, move = payload["look"], payload["move"]
+    _ACT.pack_into(
+        buf, off + ACT_OFF, gen, 0,
+        float(look["dYaw"]), float(look["dPitch"]), float(move["forward"]), float(move["strafe"]),
+        1 if payload.get("jump") else 0
+    )
+
+def _WriteError(buf, off: int, gen: int, err: str) -> None:
+    _ACT.pack_into(buf, off + ACT_OFF, gen, 1, 0.0, 0.0, 0.0, 0.0, 0)
+    raw = err.encode("utf-8")[:ERR_BYTES]
+    _ERR.pack_into(buf, off + ERR_OFF, len(raw), raw)
+
+def _ReadAction(buf, off: int):
+    gen, status, dYaw, dPitch, fwd, strafe, jump = _ACT.unpack_from(buf, off + ACT_OFF)
+    if status != 0:
+        n, raw = _ERR.unpack_from(buf, off + ERR_OFF)
+        return gen, RuntimeError(raw[:n].decode("utf-8", "replace"))
+    return gen, {
+        "look": {"dYaw": dYaw, "dPitch": dPitch},
+        "move": {"forward": fwd, "strafe": strafe},
+        "jump": bool(jump),
+    }
+
+# "package.module" -> the module, "package.module:function" -> that function. fresh=True
+# executes a private copy of the module instead of the cached import, so module-level
+# state (a default policy instance, a table read at import) is built anew
+def LoadPolicy(entry: str, fresh: bool = False):
+    mod, _, fn = entry.partition(":")
+    if fresh:
+        spec = importlib.util.find_spec(mod)
+        if spec is None:
+            raise ModuleNotFoundError(f"no policy module '{mod}'")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(mod)
+    return getattr(module, fn) if fn else module
+
+# Child process main loop: read a slot id, decide, write the reply in place, signal back
+def _WorkerMain(shm_name: str, base: int, stats_off: int, entry: str, conn, src: str,
+                slot_bytes: int = SLOT_BYTES, frames: int = 0) -> None:
+    if src not in sys.path:
+        sys.path.append(src)
+    import numpy as np
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buf = shm.buf
+    policy = LoadPolicy(entry)
+    decide = getattr(policy, "decide", policy)
+    # feature policies decide straight on the slot's stack; no observation dict is rebuilt
+    feats = bool(frames) and WantsFeatures(policy)
+    versionOf = VersionOf(policy)
+    busy_ns = 0
+    jobs = 0
+    try:
+        while True:
+            # the bridge closing the pipe (Close(), a retired version) ends the worker quietly
+            try:
+                slot, _ = _MSG.unpack(conn.recv_bytes())
+            except (EOFError, OSError):
+                break
+            off = base + slot * slot_bytes
+            t0 = time.perf_counter_ns()
+            if feats:
+                gen, = _GEN.unpack_from(buf, off + OBS_OFF)
+                obs = np.ndarray((frames, FEATURE_WIDTH), dtype=np.float32, buffer=buf, offset=off + FEAT_OFF)
+            else:
+                gen, obs = _ReadObs(buf, off)
+            try:
+                _WriteAction(buf, off, gen, decide(obs))
+            except Exception as e:
+                _WriteError(buf, off, gen, f"{type(e).__name__}: {e}")
+            busy_ns += time.perf_counter_ns() - t0
+            jobs += 1
+            version = versionOf()
+            _STATS.pack_into(buf, stats_off, busy_ns, jobs, version if isinstance(version, int) else -1)
+            try:
+                conn.send_bytes(_MSG.pack(slot, gen))
+            except (EOFError, OSError):
+                break
+    finally:
+        obs = None
+        del buf
+        shm.close()
+
+@dataclass
+class _Proc:
+    index: int
+    base: int                                   # byte offset of this worker's ring
+    stats_off: int
+    proc: Any = None
+    conn: Any = None
+    free: List[int] = field(default_factory=list)
+    inflight: Dict[int, Any] = field(default_factory=dict)   # slot -> (gen, future, sent_ts)
+    restarts: int = 0
+    last_stats: tuple = (0.0, 0)                # (monotonic, busy_ns)
+
+class ProcessBackend:
+    """
+    Runs the policy in a pool of worker processes. Observations are written into
+    per-worker shared-memory ring slots; only (slot, gen) ids go over each pipe, and
+    replies are read back through loop.add_reader, so nothing blocks the event loop.
+    A timed-out request is abandoned (its slot stays busy until the worker answers);
+    a worker stuck longer than kill_after_s is terminated and respawned.
+    With wants_features, only the gen and the stacked feature view are copied into
+    the slot, and the worker decides on the slot memory directly.
+    """
+    def __init__(self, entry: str, workers: int = 1, slots: int = 4, kill_after_s: float = 1.0,
+                 wants_features: bool = False, frames: int = 0):
+        self.entry = entry
+        self.n = max(1, int(workers))
+        self.slots = max(1, int(slots))
+        self.kill_after_s = kill_after_s
+        self.wants_features = wants_features and frames > 0
+        self.checkpoint_target = None   # each worker holds its own copy of the policy
+        self.frames = int(frames) if self.wants_features else 0
+        self.slot_bytes = SlotBytes(self.frames)
+        self.ctx = mp.get_context("spawn")
+        ring = self.slots * self.slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=self.n * (ring + _STATS.size))
+        self.procs = [_Proc(i, base=i * ring, stats_off=self.n * ring + i * _STATS.size) for i in range(self.n)]
+        self.gen = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.src = str(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # ai/src
+
+    def Start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        for w in self.procs:
+            self._Spawn(w)
+
+    def _Spawn(self, w: _Proc) -> None:
+        parent, child = self.ctx.Pipe(duplex=True)
+        _STATS.pack_into(self.shm.buf, w.stats_off, 0, 0, -1)
+        w.proc = self.ctx.Process(
+            target=_WorkerMain,
+            args=(self.shm.name, w.base, w.stats_off, self.entry, child, self.src, self.slot_bytes, self.frames),
+            daemon=True, name=f"policy-worker-{w.index}",
+        )
+        w.proc.start()
+        child.close()
+        w.conn = parent
+        w.free = list(range(self.slots))
+        w.inflight = {}
+        w.last_stats = (time.monotonic(), 0)
+        self.loop.add_reader(parent.fileno(), self._OnReadable, w)
+
+    def _Kill(self, w: _Proc, why: str) -> None:
+        self.loop.remove_reader(w.conn.fileno())
+        for gen, fut, _ in w.inflight.values():
+            if not fut.done():
+                fut.set_exception(RuntimeError(why))
+        w.conn.close()
+        if w.proc.is_alive():
+            w.proc.terminate()
+        w.proc.join(0)
+        w.restarts += 1
+
+    def _OnReadable(self, w: _Proc) -> None:
+        try:
+            while w.conn.poll():
+                slot, gen = _MSG.unpack(w.conn.recv_bytes())
+                entry = w.inflight.pop(slot, None)
+                w.free.append(slot)
+                if entry is None or entry[0] != gen:
+                    continue
+                fut = entry[1]
+                if fut.done():
+                    continue            # caller already gave up (timeout); reply is dropped
+                _, result = _ReadAction(self.shm.buf, w.base + slot * self.slot_bytes)
+                if isinstance(result, Exception):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+        except (EOFError, OSError):
+            self._Kill(w, "policy worker exited")
+            self._Spawn(w)
+
+    def _Reap(self) -> None:
+        now = time.monotonic()
+        for w in self.procs:
+            if w.inflight and now - min(e[2] for e in w.inflight.values()) > self.kill_after_s:
+                self._Kill(w, "policy worker stuck")
+                self._Spawn(w)
+
+    def _Submit(self, obs) -> asyncio.Future:
+        self._Reap()
+        candidates = [w for w in self.procs if w.free]
+        if not candidates:
+            raise RuntimeError("no free policy worker slot")
+        w = min(candidates, key=lambda p: len(p.inflight))
+        slot = w.free.pop()
+        self.gen = (self.gen + 1) & 0xFFFFFFFF
+        off = w.base + slot * self.slot_bytes
+        if self.wants_features:
+            _GEN.pack_into(self.shm.buf, off + OBS_OFF, self.gen)
+            feat = obs["features"]
+            self.shm.buf[off + FEAT_OFF:off + FEAT_OFF + feat.nbytes] = memoryview(feat).cast("B")
+        else:
+            _WriteObs(self.shm.buf, off, self.gen, obs)
+        fut = self.loop.create_future()
+        w.inflight[slot] = (self.gen, fut, time.monotonic())
+        w.conn.send_bytes(_MSG.pack(slot, self.gen))
+        return fut
+
+    async def Decide(self, obs, timeout_s: float):
+        # on timeout wait_for cancels the future: the request is abandoned and the
+        # worker's late reply is discarded in _OnReadable
+        return await asyncio.wait_for(self._Submit(obs), timeout_s)
+
+    async def DecideBatch(self, obs_list, timeout_s: float):
+        futs = []
+        for obs in obs_list:
+            try:
+                futs.append(self._Submit(obs))
+            except Exception as e:
+                futs.append(e)
+        pending = [f for f in futs if isinstance(f, asyncio.Future)]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout_s)
+        out = []
+        for f in futs:
+            if isinstance(f, Exception):
+                out.append(f)
+            elif not f.done():
+                f.cancel()
+                out.append(asyncio.TimeoutError("decide_timeout"))
+            else:
+                out.append(f.exception() or f.result())
+        return out
+
+    # Each worker process has its own copy of the policy; a change in any of them (or a
+    # respawn, which starts over from the entry point) counts as a new version
+    def PolicyVersion(self):
+        return tuple((_STATS.unpack_from(self.shm.buf, w.stats_off)[2], w.restarts) for w in self.procs)
+
+    def Stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        out = []
+        for w in self.procs:
+            busy_ns, jobs, _ = _STATS.unpack_from(self.shm.buf, w.stats_off)
+            t0, busy0 = w.last_stats
+            w.last_stats = (now, busy_ns)
+            out.append({
+                "worker": w.index,
+                "util": (busy_ns - busy0) / 1e9 / max(1e-9, now - t0),
+                "jobs": jobs,
+                "inflight": len(w.inflight),
+                "restarts": w.restarts,
+            })
+        return out
+
+    def Depth(self) -> Dict[str, int]:
+        inflight = sum(len(w.inflight) for w in self.procs)
+        return {"inflight": inflight, "free_slots": sum(len(w.free) for w in self.procs)}
+
+    def Close(self) -> None:
+        for w in self.procs:
+            if w.conn is not None and not w.conn.closed:
+                if self.loop is not None and not self.loop.is_closed():
+                    self.loop.remove_reader(w.conn.fileno())
+                w.conn.close()
+            if w.proc is not None and w.proc.pid is not None:      # Start() may have failed part way
+                w.proc.join(1.0)
+                if w.proc.is_alive():
+                    w.proc.terminate()
+        self.shm.close()
+        self.shm.unlink()
+
+# Build the backend named by runtime.executor; `frames` is the feature stack depth
+def MakeBackend(runtime: Dict[str, Any], entry: str, frames: int = 0, fresh: bool = False):
+    kind = runtime.get("executor", "thread")
+    if kind == "process":
+        # imported here too, only to read its wants_features flag (workers always load their own copy)
+        return ProcessBackend(entry, workers=runtime.get("worker_tasks", 1), slots=runtime.get("worker_slots", 4),
+                              wants_features=WantsFeatures(LoadPolicy(entry)), frames=frames)
+    if kind != "thread":
+        raise ValueError(f"unknown runtime.executor '{kind}'")
+    return ThreadBackend(LoadPolicy(entry, fresh))
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+# Negotiated with hello {"flow": "credit"}; other clients send at their own pace and
+# rely on the obs_q drop policy as before
+FLOW_MODES = ["none", "credit"]
+
+class FlowController:
+    """
+    Credit-based flow control for one game connection.
+
+    The client may only send an observation while it holds a credit, and paces itself
+    at `target_hz`. Credits are topped up to `window` minus what is still queued or
+    held by the client, so at most `window` observations are ever in flight. The
+    target rate is the most the policy can use -- the tick rate (observations between
+    ticks are discarded by DrainLatest), capped by the mean decide time -- and backs
+    off multiplicatively while observations or actions pile up (AIMD).
+    """
+    def __init__(self, window: int = 4, tick_hz: float = 10.0, on_arrival: bool = False,
+                 min_hz: float = 1.0, max_hz: float = 20.0, act_high: int = 4):
+        self.window = max(1, int(window))
+        self.tick_hz = tick_hz
+        self.on_arrival = on_arrival
+        self.min_hz = min_hz
+        self.max_hz = max_hz
+        self.act_high = act_high
+        self.target_hz = self.Useful(0.0)
+        self.granted = 0
+        self.received = 0
+        self.overdrawn = 0              # observations sent without a credit
+        self.sent_hz = 0.0              # target_hz in the last flow event
+
+    @classmethod
+    def FromConfig(cls, flow_cfg: Dict[str, Any], policy_cfg: Dict[str, Any]) -> "FlowController":
+        return cls(
+            window=flow_cfg.get("window", 4),
+            tick_hz=policy_cfg.get("tick_hz", 10),
+            on_arrival=policy_cfg.get("mode", "tick") == "on_arrival",
+            min_hz=flow_cfg.get("min_hz", 1.0),
+            max_hz=flow_cfg.get("max_hz", 20.0),
+            act_high=flow_cfg.get("act_high", 4),
+        )
+
+    # Highest observation rate the policy can act on
+    def Useful(self, decide_s: float) -> float:
+        hz = self.max_hz if self.on_arrival else min(self.tick_hz, self.max_hz)
+        if decide_s > 0:
+            hz = min(hz, 1.0 / decide_s)
+        return max(self.min_hz, hz)
+
+    def Received(self) -> None:
+        self.received += 1
+        if self.received > self.granted:
+            self.overdrawn += 1
+
+    # Called every tick; the payload of a `flow` event when there is something to tell
+    def Update(self, obs_queued: int, act_backlog: int, decide_s: float) -> Optional[Dict[str, Any]]:
+        useful = self.Useful(decide_s)
+        if obs_queued > 1 or act_backlog > self.act_high:
+            self.target_hz = max(self.min_hz, self.target_hz * 0.5)
+        else:
+            self.target_hz = min(useful, self.target_hz + 0.1 * useful)
+
+        held = max(0, self.granted - self.received)
+        grant = max(0, self.window - obs_queued - held)
+        if held and grant < (self.window + 1) // 2:
+            grant = 0                   # top up in batches while the client still has credit
+        changed = abs(self.target_hz - self.sent_hz) > 0.1 * self.sent_hz
+        if grant == 0 and not changed:
+            return None
+        self.granted = max(self.granted, self.received) + grant
+        self.sent_hz = self.target_hz
+        return {
+            "credits": grant,
+            "target_hz": self.target_hz,
+            "obs_queue": obs_queued,
+            "act_backlog": act_backlog,
+            "decide_ms": decide_s * 1000.0,
+        }
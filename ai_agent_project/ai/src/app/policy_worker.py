@@ -1,15 +1,17 @@
 from __future__ import annotations
-import asyncio, time, statistics, sys, pathlib as _pathlib
+import asyncio, itertools, time, sys, pathlib as _pathlib
 from typing import Any
-from jsonschema import validate, ValidationError
-from collections import deque
+from jsonschema import ValidationError
 
 SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
 if str(SRC) not in sys.path:
     sys.path.append(str(SRC))
 
 from actions.codec import ClampAction
-from policy.dummy import decide
+from executors import ThreadBackend
+from utils.metrics import StageMetrics
+from ticker import TickScheduler
+from tracing import Decided
 
 # Safe implementation of adding items to a queue
 async def QueueAdd(q: asyncio.Queue, item: Any, drop_policy: str, on_drop):
@@ -27,6 +29,41 @@ async def QueueAdd(q: asyncio.Queue, item: Any, drop_policy: str, on_drop):
         else:
             await q.put(item)
 
+# asyncio.Queue has no public way to change maxsize; put()/full() read _maxsize on every
+# call, so setting it takes effect at once. Growing wakes putters blocked on the old limit;
+# shrinking below the current size just refuses puts until consumers catch up.
+def ResizeQueue(q: asyncio.Queue, maxsize: int) -> None:
+    q._maxsize = maxsize
+    putters = q._putters
+    while putters and not q.full():
+        putter = putters.popleft()
+        if not putter.done():
+            putter.set_result(None)
+
+class LiveQueues:
+    """
+    One connection's queue limits and drop policy, as the current config has them.
+    Workers read drop_policy at every enqueue, and Apply() resizes both queues in place,
+    so a config reload reaches a running connection without reconnecting.
+    """
+    def __init__(self, obs_q: asyncio.Queue, act_q: asyncio.Queue, drop_policy: str = "oldest"):
+        self.obs_q = obs_q
+        self.act_q = act_q
+        self.drop_policy = drop_policy
+
+    # Apply a runtime config section; returns what changed, as {key: new value}
+    def Apply(self, runtime) -> dict:
+        changed = {}
+        policy = runtime.get("drop_policy", "oldest")
+        if policy != self.drop_policy:
+            self.drop_policy = changed["drop_policy"] = policy
+        for key, q in (("obs_queue_size", self.obs_q), ("act_queue_size", self.act_q)):
+            size = int(runtime.get(key, 100))
+            if size != q.maxsize:
+                ResizeQueue(q, size)
+                changed[key] = size
+        return changed
+
 def _idle_payload():
     return {
         "look": {"dYaw": 0.0, "dPitch": 0.0},
@@ -34,113 +71,186 @@ def _idle_payload():
         "jump": False
     }
 
-def _percentile(sorted_vals, p):
-    # p in [0,1]; input should be pre-sorted
-    if not sorted_vals:
-        return 0.0
-    k = max(0, min(len(sorted_vals) - 1, int(round(p * (len(sorted_vals) - 1)))))
-    return sorted_vals[k]
+# Drain a queue without waiting and return the most recent item (or `latest` if empty)
+def DrainLatest(q: asyncio.Queue, latest=None):
+    while True:
+        try:
+            item = q.get_nowait()
+        except asyncio.QueueEmpty:
+            return latest
+        latest = item
+        q.task_done()
+
+# policy_error payload, naming the policy version (app.registry) when there is one
+def PolicyError(error: str, policy=None) -> dict:
+    out = {"error": error}
+    name = getattr(policy, "name", None)
+    if isinstance(name, str):
+        out["policy"] = name
+    return out
+
+# Wrap a decided payload into an action message, then clamp + validate; fallback to idle if invalid.
+# obs_seq names the observation the action answers (None: idle before any observation).
+def BuildAction(payload, seq: int, act_validator, log, obs_seq=None) -> dict:
+    msg = {
+        "type": "action",
+        "timestamp": time.time(),       # seconds
+        "seq": seq,
+        "schema_version": "v0",
+        "payload": payload
+    }
+    if obs_seq is not None:
+        msg["obs_seq"] = obs_seq
+    msg = ClampAction(msg)
+    try:
+        act_validator.Validate(msg)
+    except ValidationError as e:
+        log.warning("outgoing action failed schema; using idle", extra={"error": str(e)})
+        msg["payload"] = _idle_payload()
+    return msg
+
+# Per-connection latency for latency_stats: end-to-end (obs timestamp -> action built)
+# plus the window of every pipeline stage and decision cache use, reported and reset ~every 2 s.
+# With a clock (app.tracing.ClockEstimator) the client's timestamp is moved onto our clock first.
+class LatencyWindow:
+    def __init__(self, metrics: StageMetrics | None = None, every_s: float = 2.0, clock=None):
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.clock = clock
+        self.e2e = self.metrics.window["e2e"]
+        self.every_s = every_s
+        self.last_ts = time.time()
+        self.cache = None               # [hits, misses] this window once a decision cache is consulted
+
+    def CacheResult(self, hit: bool) -> None:
+        if self.cache is None:
+            self.cache = [0, 0]
+        self.cache[0 if hit else 1] += 1
+
+    def Add(self, obs_ts: float) -> None:
+        if self.clock is not None:
+            obs_ts = self.clock.ToServer(obs_ts)
+        self.metrics.Record("e2e", time.time() - obs_ts)
+
+    def Due(self) -> bool:
+        return (time.time() - self.last_ts >= self.every_s) and self.e2e.count >= 5
+
+    def Report(self, ticker: TickScheduler, policy: str | None = None) -> dict:
+        self.last_ts = time.time()
+        stages = self.metrics.Report()
+        out = stages.pop("e2e", None) or self.e2e.Summary()
+        out["hz"] = ticker.hz
+        if policy is not None:
+            out["policy"] = policy
+        out["stages"] = stages
+        out["tick"] = ticker.Stats()
+        if self.cache is not None:
+            hits, misses = self.cache
+            out["cache"] = {"hits": hits, "misses": misses, "hit_rate": hits / max(1, hits + misses)}
+            self.cache = [0, 0]
+        return out
 
 async def PolicyWorker(
     obs_q: asyncio.Queue,
     act_q: asyncio.Queue,
     drop_policy: str,
-    act_schema: dict,
+    act_validator,     # compiled action schema (utils.schemas.ACT)
     on_drop,
     log,
     emit_event=None,   # <-- NEW: async callable kind,payload -> None (optional)
+    backend=None,      # app.executors backend or app.registry.PolicyHandle; defaults to policy.dummy in the thread pool
+    recorder=None,     # training.replay.ReplayRecorder for this connection (optional)
+    metrics=None,      # utils.metrics.StageMetrics for this connection (optional)
+    ticker=None,       # app.ticker.TickScheduler (policy.tick_hz / budget_ms / mode); 10 Hz, 100 ms if omitted
+    cache=None,        # policy.cache.DecisionCache shared by every connection (optional; else the handle's own)
+    live=None,         # LiveQueues; its drop_policy (kept current by config reloads) overrides drop_policy
+    clock=None,        # app.tracing.ClockEstimator for this connection (optional)
+    action_seq=None,   # iterator of action seqs shared with app.dispatch replies (optional)
+    remote=None,       # () -> True while app.dispatch answers this connection instead (optional)
 ):
     """
-    Runs at 10 Hz. Each tick:
+    Runs at policy.tick_hz (or on each fresh observation in on_arrival mode). Each wake:
       - drains obs_q and keeps only the most recent observation
-      - runs decide(obs) with a 100 ms budget
-      - clamps, validates, and enqueues the action
+      - answers from the decision cache if it has this (quantised) state, else
+        runs decide(obs) within the ticker's (adaptive) budget on the policy version
+        the backend currently points at (a registry swap lands between two wakes)
+      - clamps, validates, and enqueues the action, tagged with the observation's seq
+        (obs_seq) and carrying its trace when the observation was sampled (app.tracing)
       - tracks latency and emits latency_stats ~every 2 s (if emit_event provided)
+    While `remote` says remote workers serve the connection, wakes with an empty obs_q
+    send nothing.
     """
-    seq_out = 0
-    tick_hz = 10.0
-    tick_dt = 1.0 / tick_hz
-    next_tick = time.time()
+    if action_seq is None:
+        action_seq = itertools.count()
+    if ticker is None:
+        ticker = TickScheduler()
 
     latest_obs = None
-    lat_samples_ms = deque(maxlen=200)  # ~20 s of samples @10 Hz
-    last_stats_ts = time.time()
-    loop = asyncio.get_running_loop()
-
-    async def _drain_latest():
-        nonlocal latest_obs
-        drained = False
-        while True:
-            try:
-                item = obs_q.get_nowait()
-            except asyncio.QueueEmpty:
-                break
-            else:
-                latest_obs = item
-                obs_q.task_done()
-                drained = True
-        return drained
+    latency = LatencyWindow(metrics, clock=clock)
+    metrics = latency.metrics
+    if backend is None:
+        from policy.dummy import decide
+        backend = ThreadBackend(decide)
 
     while True:
-        # pace to 10 Hz
-        now = time.time()
-        if now < next_tick:
-            await asyncio.sleep(next_tick - now)
-        next_tick += tick_dt
+        await ticker.Wait()
+        if remote is not None and obs_q.empty() and remote():
+            latest_obs = None
+            continue
 
         # keep only the most recent observation
-        await _drain_latest()
+        prev_obs = latest_obs
+        latest_obs = DrainLatest(obs_q, latest_obs)
+        trace = None
+        if latest_obs is not prev_obs:
+            metrics.Record("obs_queue", time.perf_counter() - metrics.obs_enqueued_at)
+            trace = latest_obs.pop("trace", None)
 
-        # decide with 100 ms budget
+        # decide within the budget left in this tick
         if latest_obs is None:
             payload = _idle_payload()
         else:
             obs_ts = float(latest_obs.get("timestamp", time.time()))
+            start = time.time()
+            t0 = time.perf_counter()
+            payload = key = None
+            policy = backend.Current() if hasattr(backend, "Current") else backend
+            tick_cache = cache if cache is not None else getattr(policy, "cache", None)
+            if tick_cache is not None:
+                tick_cache.Check(policy.PolicyVersion())
+                key = tick_cache.Key(latest_obs)
+                payload = tick_cache.Get(key)
+                latency.CacheResult(payload is not None)
+            cached = payload is not None
             try:
-                decision = await asyncio.wait_for(
-                    loop.run_in_executor(None, decide, latest_obs),
-                    timeout=0.100
-                )
-                payload = decision
+                if payload is None:
+                    payload = await policy.Decide(latest_obs, timeout_s=ticker.Budget())
+                    if key is not None:
+                        tick_cache.Put(key, payload)
+                metrics.Record("decide", time.perf_counter() - t0)
             except asyncio.TimeoutError:
                 log.warning("decide() timed out; sending idle")
                 payload = _idle_payload()
                 if emit_event:
-                    await emit_event("policy_error", {"error": "decide_timeout"})
+                    await emit_event("policy_error", PolicyError("decide_timeout", policy))
             except Exception as e:
                 log.warning("decide() error; sending idle", extra={"error": str(e)})
                 payload = _idle_payload()
                 if emit_event:
-                    await emit_event("policy_error", {"error": str(e)})
-
-            # track e2e latency from obs timestamp (seconds → ms)
-            lat_ms = max(0.0, (time.time() - obs_ts) * 1000.0)
-            lat_samples_ms.append(lat_ms)
-
-        # build action message
-        msg = {
-            "type": "action",
-            "timestamp": time.time(),       # seconds
-            "seq": seq_out,
-            "schema_version": "v0",
-            "payload": payload
-        }
-
-        # clamp + validate; fallback to idle if invalid
-        msg = ClampAction(msg)
-        try:
-            validate(instance=msg, schema=act_schema)
-        except ValidationError as e:
-            log.warning("outgoing action failed schema; using idle", extra={"error": str(e)})
-            msg["payload"] = _idle_payload()
+                    await emit_event("policy_error", PolicyError(str(e), policy))
+
+            Decided(trace, start, time.time(), policy, cached)
+            latency.Add(obs_ts)
 
-        await QueueAdd(act_q, msg, drop_policy, on_drop)
-        seq_out += 1
+        t0 = time.perf_counter()
+        msg = BuildAction(payload, next(action_seq), act_validator, log,
+                          latest_obs.get("seq") if latest_obs is not None else None)
+        metrics.Record("clamp_validate", time.perf_counter() - t0)
+        if recorder is not None:
+            recorder.Acted(msg)
+        if trace is not None:
+            msg["trace"] = trace        # SendActions takes it off before sending
+        await QueueAdd(act_q, msg, live.drop_policy if live is not None else drop_policy, on_drop)
 
         # emit latency_stats ~every 2 s
-        if emit_event and (time.time() - last_stats_ts >= 2.0) and len(lat_samples_ms) >= 5:
-            samples = sorted(lat_samples_ms)
-            p50 = statistics.median(samples)
-            p90 = _percentile(samples, 0.90)
-            await emit_event("latency_stats", {"p50_ms": p50, "p90_ms": p90, "hz": tick_hz})
-            last_stats_ts = time.time()
+        if emit_event and latency.Due():
+            await emit_event("latency_stats", latency.Report(ticker, getattr(backend, "name", None)))
@@ -0,0 +1,357 @@
+from __future__ import annotations
+import asyncio, itertools, os, time
+from typing import Any, Callable, Dict, List, Optional
+
+from executors import MakeBackend
+from policy.cache import DecisionCache
+from policy.checkpoint import Checkpointer
+from utils.metrics import METRICS
+
+# policy.versions: name -> {entry, weight, revision}. Without it the bridge runs policy.entry
+# alone, as the version named DEFAULT.
+DEFAULT = "default"
+
+# How long a replaced version may keep answering decisions already in flight before it is closed
+RETIRE_GRACE_S = 5.0
+
+def Specs(policy_cfg: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    entry = policy_cfg.get("entry", "policy.dummy")
+    versions = policy_cfg.get("versions") or {}
+    if not versions:
+        return {DEFAULT: {"entry": entry, "weight": 1.0, "revision": None}}
+    return {
+        str(name): {
+            "entry": (v or {}).get("entry", entry),
+            "weight": max(0.0, float((v or {}).get("weight", 1.0))),
+            "revision": (v or {}).get("revision"),
+        }
+        for name, v in versions.items()
+    }
+
+class PolicyVersion:
+    """
+    One loaded policy: its backend (app.executors), its own decision cache and its
+    counters (utils.metrics.PolicyMetrics). Decide/DecideBatch are the backend's,
+    timed and counted; failures still raise so callers answer idle + policy_error.
+    """
+    def __init__(self, name: str, entry: str, weight: float, backend, version: int,
+                 cache: Optional[DecisionCache] = None, revision: Any = None):
+        self.name = name
+        self.entry = entry
+        self.weight = weight
+        self.backend = backend
+        self.version = version
+        self.cache = cache
+        self.revision = revision
+        self.wants_features = backend.wants_features
+        self.metrics = METRICS.Policy(name, entry, version)
+        self.inflight = 0
+        self.retired = False
+        self.checkpointer: Optional[Checkpointer] = None     # policy.checkpoint, when enabled and supported
+
+    async def Decide(self, obs, timeout_s: float):
+        self.inflight += 1
+        t0 = time.perf_counter()
+        try:
+            out = await self.backend.Decide(obs, timeout_s)
+        except asyncio.TimeoutError:
+            self.metrics.Failed(True)
+            raise
+        except Exception:
+            self.metrics.Failed(False)
+            raise
+        finally:
+            self.inflight -= 1
+        self.metrics.Record(time.perf_counter() - t0)
+        return out
+
+    async def DecideBatch(self, obs_list, timeout_s: float):
+        self.inflight += 1
+        t0 = time.perf_counter()
+        try:
+            out = await self.backend.DecideBatch(obs_list, timeout_s)
+        except asyncio.TimeoutError:
+            self.metrics.Failed(True, len(obs_list))
+            raise
+        except Exception:
+            self.metrics.Failed(False, len(obs_list))
+            raise
+        finally:
+            self.inflight -= 1
+        failed = [r for r in out if isinstance(r, Exception)]
+        timeouts = sum(isinstance(r, asyncio.TimeoutError) for r in failed)
+        self.metrics.Record(time.perf_counter() - t0, len(out) - len(failed))
+        if failed:
+            self.metrics.Failed(True, timeouts)
+            self.metrics.Failed(False, len(failed) - timeouts)
+        return out
+
+    # Changes on a swap as well as on a parameter update inside the policy
+    def PolicyVersion(self):
+        return (self.version, self.backend.PolicyVersion())
+
+class PolicyHandle:
+    """
+    A connection's policy: the backend surface PolicyWorker expects, routed to the
+    version the registry assigned it. Current() is read once per tick, so a swap takes
+    effect between ticks; a connection whose version was replaced follows the
+    replacement, and one whose version was removed or drained (weight 0) is reassigned.
+    """
+    def __init__(self, registry: "PolicyRegistry", version: PolicyVersion):
+        self.registry = registry
+        self.version = version
+        version.metrics.connections += 1
+
+    def Current(self) -> PolicyVersion:
+        v = self.version
+        if v.retired or v.weight <= 0:
+            nxt = self.registry.versions.get(v.name)
+            if nxt is None or nxt.weight <= 0:
+                nxt = self.registry._Pick()
+            if nxt is not None and nxt is not v:
+                v.metrics.connections -= 1
+                nxt.metrics.connections += 1
+                self.version = v = nxt
+        return v
+
+    @property
+    def name(self) -> str:
+        return self.Current().name
+
+    @property
+    def wants_features(self) -> bool:
+        return self.Current().wants_features
+
+    @property
+    def cache(self) -> Optional[DecisionCache]:
+        return self.Current().cache
+
+    async def Decide(self, obs, timeout_s: float):
+        return await self.Current().Decide(obs, timeout_s)
+
+    async def DecideBatch(self, obs_list, timeout_s: float):
+        return await self.Current().DecideBatch(obs_list, timeout_s)
+
+    def PolicyVersion(self):
+        return self.Current().PolicyVersion()
+
+    def Release(self) -> None:
+        self.version.metrics.connections -= 1
+
+class PolicyRegistry:
+    """
+    The policy versions a bridge runs (policy.versions, or policy.entry alone). Apply()
+    brings the loaded set in line with a config section: a new or changed version is
+    imported on a worker thread, started and warmed with one decision, and only then
+    put in place -- a single dict assignment on the loop, so every tick sees either the
+    old version or the new one. The replaced version finishes what it has in flight and
+    is closed. New connections are spread over the versions by weight (smooth weighted
+    round robin); each version keeps its own decide latency and error counters.
+    With checkpoint_cfg enabled, a version whose policy supports policy.checkpoint resumes
+    from <path>/<name> as it loads and is snapshotted by SaveCheckpoints() and on close.
+    """
+    def __init__(self, runtime: Dict[str, Any], frames: int, log, warm: Optional[Callable[[int], Dict[str, Any]]] = None,
+                 cache_cfg: Optional[Dict[str, Any]] = None, batched: bool = False, warm_timeout_s: float = 10.0,
+                 checkpoint_cfg: Optional[Dict[str, Any]] = None):
+        self.runtime = runtime
+        self.frames = frames
+        self.log = log
+        self.warm = warm                # frames -> a valid observation to decide on (None: no warm-up)
+        self.cache_cfg = cache_cfg or {}
+        self.batched = batched
+        self.warm_timeout_s = warm_timeout_s
+        self.checkpoint_cfg = checkpoint_cfg or {}
+        self.features = True            # False once the bridge runs without feature extraction
+        self.versions: Dict[str, PolicyVersion] = {}
+        self.credit: Dict[str, float] = {}
+        self.ids = itertools.count(1)
+        self.lock = asyncio.Lock()
+        self.retiring: Dict[PolicyVersion, asyncio.Task] = {}
+
+    @property
+    def wants_features(self) -> bool:
+        return any(v.wants_features for v in self.versions.values())
+
+    # Load, swap, reweight and remove versions to match the config; returns what happened per version
+    async def Apply(self, policy_cfg: Dict[str, Any], warm: bool = True) -> Dict[str, str]:
+        async with self.lock:
+            specs = Specs(policy_cfg)
+            done: Dict[str, str] = {}
+            error: Optional[Exception] = None
+            for name, spec in specs.items():
+                cur = self.versions.get(name)
+                if cur is not None and (cur.entry, cur.revision) == (spec["entry"], spec["revision"]):
+                    if cur.weight != spec["weight"]:
+                        cur.weight = spec["weight"]
+                        done[name] = "reweighted"
+                    continue
+                # a private module copy when another live version already runs this entry
+                fresh = any(v.entry == spec["entry"] for v in self.versions.values())
+                # the replacement resumes from the running version's latest state, and only
+                # one checkpointer may write the directory
+                held = cur.checkpointer if cur is not None else None
+                if held is not None:
+                    cur.checkpointer = None
+                    await self._Checkpoint(held, close=True)
+                try:
+                    new = await self._Load(name, spec, fresh, warm, first=cur is None)
+                except Exception as e:
+                    error = e
+                    if held is not None:
+                        cur.checkpointer = await self._Attach(cur.backend, name, restore=False)
+                    self.log.warning("policy version not loaded", extra={
+                        "policy": name, "entry": spec["entry"], "error": str(e) or type(e).__name__})
+                    done[name] = f"failed: {e}"
+                    continue
+                self.versions[name] = new
+                if cur is not None:
+                    self._Retire(cur)
+                done[name] = "loaded"
+            # removed last, so their connections have the new versions to move to; a config
+            # none of whose versions could be loaded leaves the running ones alone
+            stale = [n for n in self.versions if n not in specs]
+            for name in stale if len(stale) < len(self.versions) else []:
+                self._Retire(self.versions.pop(name))
+                self.credit.pop(name, None)
+                done[name] = "removed"
+            if not self.versions:
+                raise RuntimeError("no policy version could be loaded") from error
+            return done
+
+    async def _Load(self, name: str, spec: Dict[str, Any], fresh: bool, warm: bool, first: bool) -> PolicyVersion:
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        backend = await loop.run_in_executor(None, MakeBackend, self.runtime, spec["entry"], self.frames, fresh)
+        try:
+            if backend.wants_features and not self.features:
+                raise ValueError("policy wants features but the bridge runs without feature extraction (restart it)")
+            checkpointer = await self._Attach(backend, name)
+            backend.Start()
+            if warm and self.warm is not None:
+                await self._Warm(backend, first)
+        except Exception:
+            backend.Close()
+            raise
+        cache = DecisionCache.FromConfig(self.cache_cfg) if self.cache_cfg.get("enabled", False) else None
+        v = PolicyVersion(name, spec["entry"], spec["weight"], backend, next(self.ids), cache, spec["revision"])
+        v.checkpointer = checkpointer
+        self.log.info("policy version loaded", extra={
+            "policy": name, "entry": v.entry, "version": v.version, "ms": (time.perf_counter() - t0) * 1000.0})
+        return v
+
+    # A checkpointer for the backend's policy, resumed from its last snapshot (None when
+    # checkpoints are off or the policy can't be snapshotted in this process)
+    async def _Attach(self, backend, name: str, restore: bool = True) -> Optional[Checkpointer]:
+        target = getattr(backend, "checkpoint_target", None)
+        if target is None or not self.checkpoint_cfg.get("enabled", False):
+            return None
+        ckpt = Checkpointer(target, os.path.join(self.checkpoint_cfg.get("path", "data/checkpoints"), name),
+                            slots=self.checkpoint_cfg.get("slots", 2))
+        t0 = time.perf_counter()
+        manifest = await asyncio.get_running_loop().run_in_executor(None, ckpt.Resume, restore)
+        if manifest is not None and restore:
+            self.log.info("policy checkpoint resumed", extra={
+                "policy": name, "seq": manifest["seq"], "saved_at": manifest["saved_at"],
+                "ms": (time.perf_counter() - t0) * 1000.0})
+        return ckpt
+
+    # Save (or close) one checkpointer off the loop; a failed save keeps the previous snapshot
+    async def _Checkpoint(self, ckpt: Checkpointer, close: bool = False) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, ckpt.Close if close else ckpt.Save)
+        except Exception as e:
+            self.log.warning("policy checkpoint failed", extra={"path": str(ckpt.path), "error": str(e)})
+            return None
+
+    # Snapshot every loaded version that has a checkpointer; returns {name: what was written}
+    async def SaveCheckpoints(self) -> Dict[str, Dict[str, Any]]:
+        done = {}
+        for v in list(self.versions.values()):
+            ckpt = v.checkpointer
+            if ckpt is not None:
+                out = await self._Checkpoint(ckpt)
+                if out is not None:
+                    done[v.name] = out
+        return done
+
+    # One decision before any connection sees the version. A replacement that can't decide
+    # is not swapped in; the first version of a name is kept with a warning, as prewarm did.
+    async def _Warm(self, backend, first: bool) -> None:
+        obs = self.warm(self.frames if backend.wants_features else 0)
+        try:
+            if self.batched:
+                result = (await backend.DecideBatch([obs], self.warm_timeout_s))[0]
+                if isinstance(result, Exception):
+                    raise result
+            else:
+                await backend.Decide(obs, self.warm_timeout_s)
+        except Exception as e:
+            if not first:
+                raise RuntimeError(f"warm-up decision failed: {e or type(e).__name__}") from e
+            self.log.warning("policy prewarm failed", extra={"error": str(e) or type(e).__name__})
+
+    def _Retire(self, v: PolicyVersion) -> None:
+        v.retired = True
+        self.retiring[v] = asyncio.ensure_future(self._Close(v))
+
+    async def _Close(self, v: PolicyVersion) -> None:
+        deadline = time.monotonic() + RETIRE_GRACE_S
+        while v.inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        self.retiring.pop(v, None)
+        if v.checkpointer is not None:
+            await self._Checkpoint(v.checkpointer, close=True)
+        v.backend.Close()
+        METRICS.ReleasePolicy(v.name, v.version)
+        self.log.info("policy version retired", extra={"policy": v.name, "entry": v.entry, "version": v.version})
+
+    # Smooth weighted round robin over the versions with weight > 0
+    def _Pick(self) -> Optional[PolicyVersion]:
+        live = [v for v in self.versions.values() if v.weight > 0]
+        if not live:
+            return next(iter(self.versions.values()), None)
+        total = sum(v.weight for v in live)
+        for v in live:
+            self.credit[v.name] = self.credit.get(v.name, 0.0) + v.weight
+        best = max(live, key=lambda v: self.credit[v.name])
+        self.credit[best.name] -= total
+        return best
+
+    def Assign(self) -> PolicyHandle:
+        return PolicyHandle(self, self._Pick())
+
+    # Worker rows of every version's backend, tagged with the version
+    def Stats(self) -> List[Dict[str, Any]]:
+        out = []
+        for v in list(self.versions.values()):
+            for row in v.backend.Stats():
+                row["policy"] = v.name
+                out.append(row)
+        return out
+
+    def Report(self) -> List[Dict[str, Any]]:
+        return [v.metrics.Report() for v in list(self.versions.values())]
+
+    def Depth(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for v in list(self.versions.values()):
+            for k, n in v.backend.Depth().items():
+                out[k] = out.get(k, 0) + n
+        return out
+
+    # Shutdown: close every backend, taking a last snapshot of the versions still loaded
+    def Close(self) -> None:
+        for v, task in list(self.retiring.items()):
+            task.cancel()
+            v.backend.Close()
+            METRICS.ReleasePolicy(v.name, v.version)
+        self.retiring.clear()
+        for v in list(self.versions.values()):
+            if v.checkpointer is not None:
+                try:
+                    v.checkpointer.Close()
+                except Exception as e:
+                    self.log.warning("policy checkpoint failed", extra={"path": str(v.checkpointer.path), "error": str(e)})
+            v.backend.Close()
+            METRICS.ReleasePolicy(v.name, v.version)
+        self.versions.clear()
@@ -1,16 +1,13 @@
 from __future__ import annotations
-import asyncio, json, logging, os, time, pathlib
-from websockets.server import serve, WebSocketServerProtocol
-from websockets.exceptions import ConnectionClosed, ConnectionClosedOK, ConnectionClosedError
-from jsonschema import validate, ValidationError
+import asyncio, itertools, json, logging, os, time, pathlib, struct
+from websockets.server import serve
+from jsonschema import ValidationError
 import sys
 import pathlib as _pathlib
 import logging as stdlog
 from typing import Any, Dict
 import contextlib
 
-clients = set() #temp variable
-
 #Server start time
 SERVER_START_TS = time.time()
 
@@ -21,25 +18,76 @@ if str(SRC) not in sys.path:
 
 from utils import config, logging  
 
-from utils.config import LoadConfig
-from utils.logging import SetupLogging
-from policy_worker import PolicyWorker, QueueAdd
-
-log = stdlog.getLogger("bridge.server")
-
-# Define the path to the JSON schema files
-# __file__ -> ai/src/app/server.py
-# parents[1] -> ai/src, parents[2] -> ai, so parent of that is project root
-root = pathlib.Path(__file__).resolve().parents[2]
-schemas = root.parent / "shared" / "schemas"
-
-# Load the JSON schemas
-OBS = json.loads((schemas / "observation.schema.json").read_text("utf-8"))
-ACT = json.loads((schemas / "action.schema.json").read_text("utf-8"))
-EVT = json.loads((schemas / "event.schema.json").read_text("utf-8"))
+from utils.config import Snapshot, Refresh, ChangedSections
+from utils.logging import SetupLogging, SetSampling, GetLogger
+from utils.schemas import OBS, ACT, EVT, WarmSchemas
+from utils.metrics import METRICS, ServeMetrics
+from utils.profiling import Instrumentation
+from policy_worker import PolicyWorker, QueueAdd, LiveQueues
+from dispatch import Dispatcher
+from batch_scheduler import BatchScheduler
+from ticker import TickScheduler
+from shards import ShardRelay, RunShards
+from coalesce import ACK_MODES, AckBatcher, DropCounter
+from flow import FLOW_MODES, FlowController
+from transport import CLOSED, TRANSPORTS, Connection, AsConnection, Channel, SendMessage, UnixConnection
+from registry import PolicyRegistry
+from tracing import ClockEstimator, Tracer
+from features.extract import VOCAB, FeatureExtractor
+from actions.codec import WIRE_VERSIONS, DecodeMessage
+from actions.voxels import VoxelDecoder, VoxelResync, EdgeFor
+
+log = GetLogger("bridge.server")
+
+# Observation -> remote policy worker routing (budget is set from config in StartBridge)
+dispatcher = Dispatcher(budget_ms=100, log=log)
+
+# Link to the shard hub when running with server.shards > 1; set up in StartBridge
+relay: ShardRelay | None = None
+
+# Shared cross-connection scheduler; set up in StartBridge when runtime.scheduler is "batched"
+scheduler: BatchScheduler | None = None
+
+# Loaded policy versions (policy.entry or policy.versions), each with its backend and decision cache;
+# set up in StartBridge, kept in line with the config by ApplyConfig
+policies: PolicyRegistry | None = None
+policyReloads: set = set()
+
+# Feature stack depth for the extraction stage; 0 leaves observations as dicts only (set in StartBridge)
+featureFrames = 0
+
+# Experience replay fed by every connection; set up in StartBridge when replay.enabled
+replay: ReplayBuffer | None = None
+
+# Append-only log of every validated observation and emitted action; set up in StartBridge when trajectory.enabled
+trajectory: TrajectoryRecorder | None = None
+
+# Prometheus endpoint when metrics.enabled, and the bridge's own background tasks; see StartBridge
+metricsServer = None
+bridgeTasks: list = []
+
+# Loop monitor and on-demand profiler (profiling section, `instrument` events); set up in StartBridge
+instrumentation: Instrumentation | None = None
+
+# Voxel-grid observations: largest accepted edge (0 = off) and the advertised keyframe period (set in StartBridge)
+voxelEdge = 0
+voxelKeyframeEvery = 100
+
+# Every open connection, for pushing config reloads into them (see ApplyConfig)
+connections: set = set()
+
+# Fan a connection's Observe/Acted hooks out to every enabled recorder
+class Recorders(list):
+    def Observe(self, msg: dict, raw: Any = None) -> None:
+        for r in self:
+            r.Observe(msg, raw)
+
+    def Acted(self, msg: dict) -> None:
+        for r in self:
+            r.Acted(msg)
 
 # Utility to send well-formed events to the client
-async def SendEvents(ws: WebSocketServerProtocol, kind: str, payload: dict) -> None:
+async def SendEvents(ws: Connection, kind: str, payload: dict) -> None:
     msg = {
         "type": "event",
         "schema_version": "v0",
@@ -50,55 +98,144 @@ async def SendEvents(ws: WebSocketServerProtocol, kind: str, payload: dict) -> N
 
     # Validate the event against the schema before sending
     try:
-        validate(instance=msg, schema=EVT)
+        EVT.Validate(msg)
     except ValidationError as e:
         log.warning("internal event failed schema", extra={"error": str(e), "kind": kind})
-    await ws.send(json.dumps(msg))
-
-# Create a heartbeat that pings the server and checks for responsiveness
-async def HeartBeatLoop(ws: WebSocketServerProtocol, stop_evt: asyncio.Event):
+    await SendMessage(ws, msg)
+
+# Instrumentation events (sent off the loop monitor's schedule): a subscriber that has
+# gone away just stops hearing them
+async def SendInstrumentEvent(ws: Connection, kind: str, payload: dict) -> None:
+    with contextlib.suppress(*CLOSED):
+        await SendEvents(ws, kind, payload)
+
+# Heartbeat payload, with the connection's clock estimate once it has one
+def HeartBeat(ws: Connection) -> dict:
+    payload = {"uptime_s": time.time() - SERVER_START_TS}
+    clock = getattr(ws, "clock", None)
+    if clock is not None:
+        payload.update(clock.Report())
+    return payload
+
+# Create a heartbeat that pings the server and checks for responsiveness; clients that
+# echo it as a `clock` event give us their clock offset (app.tracing.ClockEstimator)
+async def HeartBeatLoop(ws: Connection, stop_evt: asyncio.Event):
     try:
         # emit one immediately so clients see liveness right away
-        await SendEvents(ws, "heartbeat", {"uptime_s": time.time() - SERVER_START_TS})
+        await SendEvents(ws, "heartbeat", HeartBeat(ws))
         while not stop_evt.is_set():
             await asyncio.sleep(2.0)
-            await SendEvents(ws, "heartbeat", {"uptime_s": time.time() - SERVER_START_TS})
-    except (asyncio.CancelledError, ConnectionClosed, ConnectionClosedOK, ConnectionClosedError):
+            await SendEvents(ws, "heartbeat", HeartBeat(ws))
+    except (asyncio.CancelledError, *CLOSED):
         # normal shutdown/close
         pass
     except Exception as e:
         log.warning("heartbeat loop error", extra={"error": str(e)})
         
-# Drains the action queue and sends actions to the client
-async def SendActions(ws: WebSocketServerProtocol, act_q: asyncio.Queue, log):
+# Drains the action queue and sends actions to the client; a sampled action's trace is
+# completed with its send time, logged and sent as a `trace` event
+async def SendActions(ws: Connection, act_q: asyncio.Queue, log, metrics=None, tracer=None):
     while True:
         msg = await act_q.get()
         try:
-            await ws.send(json.dumps(msg))
-            log.debug("sent action", extra={"seq": msg.get("seq")})
+            t0 = time.perf_counter()
+            trace = msg.pop("trace", None)
+            if metrics is not None:
+                metrics.Record("act_queue", time.time() - msg["timestamp"])
+            await SendMessage(ws, msg)
+            if metrics is not None:
+                metrics.Record("send", time.perf_counter() - t0)
+            if trace is not None and tracer is not None:
+                record = tracer.Record(trace, msg["seq"], time.time())
+                log.info("trace", extra=record)
+                await SendEvents(ws, "trace", record)
+            if log.isEnabledFor(stdlog.DEBUG):
+                log.debug("sent action", extra={"seq": msg.get("seq")})
         finally:
             act_q.task_done()
 
-async def OnDropEvent(ws: WebSocketServerProtocol, kind: str, why: str, qsize: int):
+# Periodically log per-worker utilisation of the policy backends and each version's decide latency
+async def BackendStatsLoop(registry: PolicyRegistry, every_s: float):
+    while True:
+        await asyncio.sleep(every_s)
+        for w in registry.Stats():
+            log.info("policy backend stats", extra=w)
+        for v in registry.Report():
+            log.info("policy version stats", extra=v)
+
+# Periodically snapshot the policies that keep checkpoints (policy.checkpoint); unchanged ones write nothing
+async def CheckpointLoop(registry: PolicyRegistry, every_s: float):
+    while True:
+        await asyncio.sleep(every_s)
+        for name, saved in (await registry.SaveCheckpoints()).items():
+            log.info("policy checkpoint saved", extra=dict(saved, policy=name))
+
+# Executor queue depths for loop_health: the policy backends', plus the default thread pool
+# (thread-backend decides, recorder flushes)
+def ExecutorDepth() -> Dict[str, Any]:
+    out = policies.Depth() if policies is not None else {}
+    pool = getattr(asyncio.get_running_loop(), "_default_executor", None)
+    out["default_pool_queued"] = pool._work_queue.qsize() if pool is not None else 0
+    return out
+
+# Periodically persist a recorder (replay memmaps, trajectory segments) off the event loop
+async def FlushLoop(flush, every_s: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(every_s)
+        await loop.run_in_executor(None, flush)
+
+async def OnDropEvent(ws: Connection, kind: str, why: str, qsize: int):
+    drops = getattr(ws, "drops", None)
+    if drops is not None:
+        drops.Add(kind, why, qsize)
+        return
     await SendEvents(ws, "dropped", {"kind": kind, "policy": why, "qsize": qsize})
 
-# Handle the WebSocket connection
-async def Handle(ws: WebSocketServerProtocol):
-    #Temp
-    global clients
-    clients.add(ws)
-    print("Client added:", ws.remote_address)
-    print("All connected clients:", [str(c.remote_address) for c in clients])
+async def FlushAcks(ws: Connection) -> None:
+    payload = ws.acks.Take()
+    if payload is not None:
+        await SendEvents(ws, "ack_upto", payload)
 
-    # remote_address is a (host, port) tuple
+# Cumulative-ack connections: flush ack_upto every ack interval, dropped_summary every drop interval
+async def CoalesceLoop(ws: Connection, drop_every_s: float):
+    nextDrops = time.monotonic() + drop_every_s
     try:
-        peer = f"{ws.remote_address[0]}:{ws.remote_address[1]}"
-    except Exception:
-        peer = str(ws.remote_address)
+        while True:
+            await asyncio.sleep(ws.acks.every_s)
+            await FlushAcks(ws)
+            if time.monotonic() >= nextDrops:
+                nextDrops += drop_every_s
+                payload = ws.drops.Take()
+                if payload is not None:
+                    await SendEvents(ws, "dropped_summary", payload)
+    except CLOSED:
+        pass
+
+# Credit-flow connections: once per tick, top up credits and re-advertise the target rate
+async def FlowLoop(ws: Connection, obs_q: asyncio.Queue, act_q: asyncio.Queue, metrics, ticker):
+    decide = metrics.window["decide"]
+    decideS = 0.0
+    try:
+        while True:
+            if decide.count:
+                decideS = decide.sum_us / decide.count / 1e6
+            payload = ws.flow.Update(obs_q.qsize(), act_q.qsize(), decideS)
+            if payload is not None:
+                await SendEvents(ws, "flow", payload)
+            await asyncio.sleep(ticker.period)
+    except CLOSED:
+        pass
+
+# Handle one client connection on any transport (a bare websockets protocol is wrapped)
+async def Handle(ws):
+    ws = AsConnection(ws)
+    peer = ws.peer
     log.info("client connected", extra={"peer": peer})
+    debugLog = log.isEnabledFor(stdlog.DEBUG)
 
-    cfg = LoadConfig(env=os.getenv("APP_ENV", "dev"))
-    runTime = getattr(cfg, "runtime", None) or (cfg.get("runtime", {}) if isinstance(cfg, dict) else {})
+    cfg = Snapshot()
+    runTime = cfg.runtime or {}
 
     obsQueueSize = runTime.get("obs_queue_size", 100)
     actQueueSize = runTime.get("act_queue_size", 100)
@@ -110,88 +247,214 @@ async def Handle(ws: WebSocketServerProtocol):
     # attach queues to this websocket so other clients can access them
     ws.obsQueue = obsQueue
     ws.actQueue = actQueue
-
-
-
-    await SendEvents(ws, "connected", {"server": "ai-bridge", "version": "mvp1"})
+    # drop policy and queue limits as the config has them now; ApplyConfig keeps them current
+    live = ws.live = LiveQueues(obsQueue, actQueue, dropPolicy)
+
+    metrics = METRICS.Connection(ws, peer)
+
+    # JSON (v0) until the client opts into the binary format with hello {"wire": "v1"}
+    ws.wire = "v0"
+    # one ack / dropped event per message until hello {"acks": "cumulative"}
+    ws.acks = None
+    ws.drops = None
+    coalesceTask = None
+    eventsCfg = cfg.events or {}
+    # no credit accounting until hello {"flow": "credit"}
+    ws.flow = None
+    flowTask = None
+    # views stay valid for obs_queue_size + 2 newer frames: the whole queue plus the one being decided
+    extractor = ws.extractor = FeatureExtractor(featureFrames, slack=obsQueueSize + 2) if featureFrames else None
+    # delta-encoded grids decode into a ring with the same lifetime as the feature views
+    voxels = ws.voxels = VoxelDecoder(voxelEdge, slots=obsQueueSize + 2) if voxelEdge else None
+
+    # client clock offset from heartbeat echoes, and sampled obs -> action traces (app.tracing)
+    tracingCfg = cfg.tracing or {}
+    clock = ws.clock = ClockEstimator(tracingCfg.get("clock_samples", 8))
+    tracer = ws.tracer = Tracer.FromConfig(tracingCfg, clock)
+
+    # this connection's policy version, by weight; followed across swaps (see registry.PolicyHandle)
+    policy = ws.policy = policies.Assign()
+    # one action seq for whatever answers this client: its policy task or a remote worker (app.dispatch)
+    actSeq = ws.actSeq = itertools.count()
+
+    connected = {
+        "server": "ai-bridge", "version": "mvp1", "wire": WIRE_VERSIONS, "acks": ACK_MODES, "flow": FLOW_MODES,
+        "policy": policy.name,
+    }
+    if voxels is not None:
+        connected["voxels"] = {"max_edge": voxelEdge, "keyframe_every": voxelKeyframeEvery}
+    await SendEvents(ws, "connected", connected)
 
     # Add Heartbeat logic to Handle()
     stop_evt = asyncio.Event()
     hb_task = asyncio.create_task(HeartBeatLoop(ws, stop_evt))
 
-    # Add Policy Worker logic to handle
-    policyTask = asyncio.create_task(
-        PolicyWorker(
-            obs_q=obsQueue,
-            act_q=actQueue,
-            drop_policy=dropPolicy,
-            act_schema=ACT,
-            on_drop=lambda why: OnDropEvent(ws, "action", why, actQueue.qsize()),
-            log=log,
-            emit_event=lambda kind, payload: SendEvents(ws, kind, payload),
+    recorder = Recorders()
+    if replay is not None:
+        from training.replay import ReplayRecorder
+        from policy.qlearning import Reward
+        recorder.append(ReplayRecorder(replay, Reward))
+    if trajectory is not None:
+        from training.trajectory import ConnectionLog
+        recorder.append(ConnectionLog(trajectory))
+    recorder = ws.recorder = recorder or None       # app.dispatch records remote replies here too
+
+    # Either join the shared batch scheduler or run a per-connection Policy Worker
+    onActDrop = lambda why: OnDropEvent(ws, "action", why, actQueue.qsize())
+    emitEvent = lambda kind, payload: SendEvents(ws, kind, payload)
+    if scheduler is not None:
+        ticker = scheduler.ticker
+        scheduler.Register(ws, obsQueue, actQueue, dropPolicy, onActDrop, emitEvent, recorder, metrics,
+                           live=live, policy=policy, clock=clock, action_seq=actSeq, remote=dispatcher.Available)
+        policyTask = asyncio.create_task(stop_evt.wait())
+    else:
+        ticker = ws.ticker = TickScheduler.FromConfig(cfg.policy or {})
+        policyTask = asyncio.create_task(
+            PolicyWorker(
+                obs_q=obsQueue,
+                act_q=actQueue,
+                drop_policy=dropPolicy,
+                act_validator=ACT,
+                on_drop=onActDrop,
+                log=log,
+                emit_event=emitEvent,
+                backend=policy,
+                recorder=recorder,
+                metrics=metrics,
+                ticker=ticker,
+                live=live,
+                clock=clock,
+                action_seq=actSeq,
+                remote=dispatcher.Available,
+            )
         )
-    )
+    # drain act_q to the client; its backlog is bounded by act_queue_size and timed as the act_queue stage
+    senderTask = asyncio.create_task(SendActions(ws, actQueue, log, metrics, tracer))
+    connections.add(ws)
 
     try:
         # Start an async loop to receive messages
         async for raw in ws:
-            log.debug("recv", extra={"bytes": len(raw)})
-            print(f"[DEBUG] raw from {ws.remote_address}: {raw[:200]}")#Temp
-
-            # Try to parse the incoming message as JSON
-            try:
-                msg = json.loads(raw)
-            except json.JSONDecodeError:
-                log.warning("bad json", extra={"raw": raw[:50]})
-                await SendEvents(ws, "schema_mismatch", {"reason": "invalid_json"})
-                continue
+            if debugLog and not isinstance(raw, dict):
+                log.debug("recv", extra={"bytes": len(raw)})
+
+            # Binary frames are v1 (range-checked while decoding); text frames are v0 JSON;
+            # dicts come from in-process channels and are trusted as already validated
+            prevalidated = False
+            rxTime = time.time()
+            t0 = time.perf_counter()
+            if isinstance(raw, dict):
+                msg = raw
+                raw = None
+                prevalidated = True
+            elif isinstance(raw, (bytes, bytearray)):
+                try:
+                    msg = DecodeMessage(raw, voxels)
+                except VoxelResync as e:
+                    # deltas keep failing until the client's keyframe arrives; ask for it once
+                    if voxels.Notify():
+                        log.warning("voxel stream out of sync", extra={"error": str(e)})
+                        await SendEvents(ws, "voxel_resync", {"seq": voxels.seq, "reason": str(e)})
+                    continue
+                except (ValueError, struct.error) as e:
+                    log.warning("bad v1 frame", extra={"error": str(e)})
+                    await SendEvents(ws, "schema_mismatch", {"reason": f"invalid_v1_frame: {e}"})
+                    continue
+                prevalidated = msg["type"] == "observation"
+            else:
+                # Try to parse the incoming message as JSON
+                try:
+                    msg = json.loads(raw)
+                except json.JSONDecodeError:
+                    log.warning("bad json", extra={"raw": raw[:50]})
+                    await SendEvents(ws, "schema_mismatch", {"reason": "invalid_json"})
+                    continue
             
+            t1 = time.perf_counter()
+            metrics.Record("parse", t1 - t0)
+
             # Validate the message against the observation schema
             try:
                 myType = msg.get("type")
                 if myType == "observation":
-                    validate(instance=msg, schema=OBS)
+                    if not prevalidated:
+                        OBS.Validate(msg)
+                    metrics.Record("validate", time.perf_counter() - t1)
+                    metrics.Record("receive", rxTime - clock.ToServer(msg["timestamp"]))
                     log.info("valid observation", extra={"seq": msg.get("seq")})
-                    await SendEvents(ws, "ack", {"seq": msg.get("seq")})
-                    await QueueAdd(
-                        obsQueue, msg, dropPolicy,
-                        on_drop=lambda why: OnDropEvent(ws, "observation", why, obsQueue.qsize())
-                    )
-                    # TEMP: immediately forward the observation to the dummy AI client
-                    print("Connected clients:", [str(c.remote_address) for c in clients])
-                    for client in list(clients):
-                        if client is not ws and not client.closed:
-                            try:
-                                await client.send(json.dumps(msg))
-                                print("[SERVER] Forwarded observation to:", client.remote_address)
-
-                                # NEW: feed this observation into the other client’s queue
-                                if hasattr(client, "obsQueue"):
-                                    try:
-                                        client.obsQueue.put_nowait(msg)
-                                    except asyncio.QueueFull:
-                                        pass
-                            except Exception as e:
-                                print("[SERVER] Failed to send to", client.remote_address, ":", e)
+                    if recorder is not None:
+                        recorder.Observe(msg, raw)
+                    if ws.flow is not None:
+                        ws.flow.Received()
+                    if ws.acks is None:
+                        await SendEvents(ws, "ack", {"seq": msg.get("seq")})
+                    elif ws.acks.Add(msg["seq"]):
+                        await FlushAcks(ws)
+                    if extractor is not None and "features" not in msg:
+                        t2 = time.perf_counter()
+                        msg["features"] = extractor.Push(msg)
+                        metrics.Record("features", time.perf_counter() - t2)
+                    # exactly one decider: a remote policy worker when one is available (the reply
+                    # comes back only to this client), else this connection's own policy task
+                    if not dispatcher.IsWorker(ws) and not await dispatcher.Dispatch(ws, msg):
+                        tracer.Sample(msg, rxTime)
+                        metrics.obs_enqueued_at = time.perf_counter()
+                        await QueueAdd(
+                            obsQueue, msg, live.drop_policy,
+                            on_drop=lambda why: OnDropEvent(ws, "observation", why, obsQueue.qsize())
+                        )
+                        ticker.Notify()
 
                 elif myType == "action":
-                    validate(instance=msg, schema=ACT)
+                    if not prevalidated:
+                        ACT.Validate(msg)
                     log.info("valid action", extra={"seq": msg.get("seq")})
-                    await SendEvents(ws, "ack", {"seq": msg.get("seq")})
-
-                    # TEMP: broadcast to all other clients (e.g., dummy AI)
-                    print("Connected clients:", [str(c.remote_address) for c in clients])
-                    for client in list(clients):
-                        if client is not ws and not client.closed:
-                            try:
-                                await client.send(json.dumps(msg))
-                                print("Forwarded observation to dummy:", msg)
-                            except Exception as e:
-                                print("Failed to send to", client.remote_address, ":", e)
-                                    
+                    # a policy worker acks what it answers the same way a game client's observations are
+                    if ws.acks is None:
+                        await SendEvents(ws, "ack", {"seq": msg.get("seq")})
+                    elif ws.acks.Add(msg["seq"]):
+                        await FlushAcks(ws)
+
+                    if dispatcher.IsWorker(ws):
+                        await dispatcher.Complete(ws, msg)
+
                 elif myType == "event":
-                    validate(instance=msg, schema=EVT)
+                    if not prevalidated:
+                        EVT.Validate(msg)
                     log.info("valid event", extra={"kind": msg.get("kind")})
+                    if msg["kind"] == "hello":
+                        hello = msg["payload"]
+                        ws.wire = hello.get("wire", "v0")
+                        if hello.get("flow") == "credit" and ws.flow is None:
+                            ws.flow = FlowController.FromConfig(cfg.flow or {}, cfg.policy or {})
+                            flowTask = asyncio.create_task(FlowLoop(ws, obsQueue, actQueue, metrics, ticker))
+                        if hello.get("acks") == "cumulative" and ws.acks is None:
+                            ws.acks = AckBatcher(
+                                hello.get("ack_every_ms", eventsCfg.get("ack_every_ms", 50)),
+                                hello.get("ack_every_n", eventsCfg.get("ack_every_n", 32)),
+                            )
+                            ws.drops = DropCounter()
+                            coalesceTask = asyncio.create_task(
+                                CoalesceLoop(ws, eventsCfg.get("drop_summary_every_s", 1.0))
+                            )
+                        if hello.get("role") == "policy" and not dispatcher.IsWorker(ws):
+                            dispatcher.AddWorker(ws)
+                            if relay is not None:
+                                relay.WorkerUp(ws)
+                            # workers get observations from the dispatcher, never actions of their own
+                            if scheduler is not None:
+                                scheduler.Unregister(ws)
+                            policyTask.cancel()
+                            senderTask.cancel()
+                    elif msg["kind"] == "clock":
+                        echo = msg["payload"]
+                        clock.Add(echo["t0"], echo["t1"], echo["t2"], rxTime)
+                    elif msg["kind"] == "instrument":
+                        if instrumentation is None or not instrumentation.allow_control:
+                            await SendEvents(ws, "schema_mismatch", {"reason": "instrumentation control is disabled"})
+                        else:
+                            await instrumentation.Control(
+                                ws, lambda kind, payload: SendInstrumentEvent(ws, kind, payload), msg["payload"])
                 else:
                     raise ValidationError(f"Unknown type '{myType}'")
             
@@ -200,38 +463,325 @@ async def Handle(ws: WebSocketServerProtocol):
                 log.warning("schema validation failed", extra={"error": str(e)})
                 await SendEvents(ws, "schema_mismatch", {"reason": str(e)})
 
-    except ConnectionClosed:
+    except CLOSED:
         log.info("client disconnected", extra={"peer": peer})
     except Exception:
         log.exception("unexpected error handling client", extra={"peer": peer})
     finally:
-        #temp
-        clients.discard(ws)
-        print("Client disconnected:", ws.remote_address)
-        print("Remaining clients:", [str(c.remote_address) for c in clients])
+        connections.discard(ws)
+        dispatcher.RemoveWorker(ws)
+        if relay is not None:
+            relay.WorkerDown(ws)
+        dispatcher.RemoveGame(ws)
+        if scheduler is not None:
+            scheduler.Unregister(ws)
+        policy.Release()
+        METRICS.Release(ws)
+        if instrumentation is not None:
+            instrumentation.Unsubscribe(ws)
 
         stop_evt.set()
-        for t in (policyTask, hb_task): #Temp deleted sender task : for t in (policyTask, senderTask, hb_task):
+        tasks = [t for t in (policyTask, senderTask, hb_task, coalesceTask, flowTask) if t is not None]
+        for t in tasks:
             t.cancel()
         with contextlib.suppress(Exception):
-            await asyncio.gather(policyTask, hb_task, return_exceptions=True) # await asyncio.gather(policyTask, senderTask, hb_task, return_exceptions=True)
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+# Shard suffix for per-process resources (replay/trajectory/checkpoint dirs) when sharded
+def _PerShard(path, shard: int, shards: int):
+    return os.path.join(path, f"shard-{shard}") if path and shards > 1 else path
+
+# Everything a connection needs that outlives it: backend, scheduler, recorders, metrics.
+# Main runs this before listening; in-process users (training, benchmarks) call it
+# themselves and then open connections with ConnectInProcess.
+async def StartBridge(shard: int = 0, shards: int = 1, hubPath: str | None = None):
+
+    cfg = Snapshot()
+    SetupLogging(
+        cfg.logging["level"], cfg.logging.get("json", True),
+        background=cfg.logging.get("background", True),
+        queueSize=cfg.logging.get("queue_size", 10000),
+        sampling=cfg.logging.get("sampling"),
+    )
+    dispatcher.budget_s = cfg.policy.get("budget_ms", 100) / 1000.0
+    dispatcher.shard = shard
+
+    global scheduler, policies, replay, trajectory, relay, featureFrames, metricsServer, instrumentation
+    global voxelEdge, voxelKeyframeEvery
+    if hubPath is not None:
+        relay = dispatcher.relay = ShardRelay(shard, hubPath, dispatcher, log)
+        await relay.Connect()
+    featCfg = cfg.features or {}
+    for item in featCfg.get("vocab") or []:
+        VOCAB.Id(item)
+    frames = int(featCfg.get("frames", 4))
+    batched = cfg.runtime.get("scheduler", "per_connection") == "batched"
+    cacheCfg = cfg.decision_cache or {}
+    ckptCfg = cfg.checkpoint or {}
+    policies = PolicyRegistry(cfg.runtime, frames, log, warm=_WarmInput, cache_cfg=cacheCfg, batched=batched,
+                              warm_timeout_s=cfg.policy.get("prewarm_timeout_s", 10.0),
+                              checkpoint_cfg=dict(ckptCfg, path=_PerShard(ckptCfg.get("path", "data/checkpoints"), shard, shards)))
+    await policies.Apply(cfg.policy, warm=cfg.policy.get("prewarm", True))
+    featureFrames = frames if policies.wants_features or featCfg.get("always", False) else 0
+    # a version loaded later can't turn the extraction stage on
+    policies.features = featureFrames > 0
+
+    voxelCfg = cfg.voxels or {}
+    if voxelCfg.get("enabled", False):
+        voxelEdge = EdgeFor(cfg.server["max_msg_bytes"], voxelCfg.get("max_edge", 32))
+        voxelKeyframeEvery = max(1, int(voxelCfg.get("keyframe_every", 100)))
+        if voxelEdge < voxelCfg.get("max_edge", 32):
+            log.warning("voxel max_edge clamped to fit max_msg_bytes", extra={"max_edge": voxelEdge})
+
+    if cacheCfg.get("enabled", False) and policies.wants_features and frames > 1:
+        log.warning("decision cache keys on the current observation only; this policy reads a frame stack",
+                    extra={"frames": frames})
+    bridgeTasks.append(asyncio.create_task(BackendStatsLoop(policies, cfg.runtime.get("stats_every_s", 10.0))))
+    if ckptCfg.get("enabled", False):
+        bridgeTasks.append(asyncio.create_task(CheckpointLoop(policies, ckptCfg.get("every_s", 30.0))))
+
+    replayCfg = cfg.replay or {}
+    if replayCfg.get("enabled", False):
+        from training.replay import ReplayBuffer
+        replay = ReplayBuffer(
+            replayCfg.get("capacity", 100000),
+            path=_PerShard(replayCfg.get("path"), shard, shards),
+            prioritized=replayCfg.get("prioritized", False),
+            alpha=replayCfg.get("alpha", 0.6),
+        )
+        bridgeTasks.append(asyncio.create_task(FlushLoop(replay.Flush, replayCfg.get("flush_every_s", 5.0))))
+
+    trajCfg = cfg.trajectory or {}
+    if trajCfg.get("enabled", False):
+        from training.trajectory import TrajectoryRecorder
+        trajectory = TrajectoryRecorder(
+            _PerShard(trajCfg.get("path", "data/trajectories"), shard, shards),
+            segment_bytes=int(trajCfg.get("segment_mb", 64)) << 20,
+        )
+        bridgeTasks.append(asyncio.create_task(FlushLoop(trajectory.Flush, trajCfg.get("flush_every_s", 1.0))))
 
-async def Main():
+    metricsCfg = cfg.metrics or {}
+    if metricsCfg.get("enabled", False):
+        # one endpoint per shard: port, port + 1, ...
+        metricsPort = metricsCfg.get("port", 9108) + shard
+        try:
+            metricsServer = await ServeMetrics(
+                metricsCfg.get("host", "127.0.0.1"), metricsPort,
+                per_connection=metricsCfg.get("per_connection", False),
+            )
+            log.info("metrics endpoint started", extra={"port": metricsPort})
+        except OSError as e:
+            # another bridge on this host has the port; serve without the endpoint
+            log.warning("metrics endpoint not started", extra={"port": metricsPort, "error": str(e)})
+
+    if batched:
+        # every connection brings its policy handle; the decision caches are per version
+        scheduler = BatchScheduler(None, ACT, log, ticker=TickScheduler.FromConfig(cfg.policy))
+        bridgeTasks.append(asyncio.create_task(scheduler.Run()))
+
+    instrumentation = Instrumentation.FromConfig(cfg.profiling or {}, log, ExecutorDepth)
+    instrumentation.Start()
+
+    reloadS = cfg.server.get("config_reload_s", 2.0)
+    if reloadS:
+        bridgeTasks.append(asyncio.create_task(ConfigWatchLoop(reloadS)))
+    if cfg.policy.get("prewarm", True):
+        await Prewarm(cfg)
+    return cfg
+
+# A valid v0 observation to push through the pipeline before any client does
+def _WarmObservation() -> Dict[str, Any]:
+    return {
+        "type": "observation", "schema_version": "v0", "timestamp": time.time(), "seq": 0,
+        "payload": {
+            "pose": {"pos": {"x": 0.0, "y": 64.0, "z": 0.0}, "yaw": 0.0, "pitch": 0.0},
+            "rays": [8.0, 8.0, 8.0],
+            "hotbar": [None] * 9,
+        },
+    }
+
+# The warm-up decision input for a policy version: the observation, plus its feature
+# stack when the version reads `frames` of them
+def _WarmInput(frames: int) -> Dict[str, Any]:
+    obs = _WarmObservation()
+    if frames:
+        obs["features"] = FeatureExtractor(frames, slack=1).Push(obs)
+    return obs
+
+# Compile the validators so the first client doesn't wait on them. The policy versions
+# were warmed by the registry as they loaded (policy import and first-call setup,
+# worker processes coming up).
+async def Prewarm(cfg) -> None:
+    t0 = time.perf_counter()
+    WarmSchemas()
+    OBS.Validate(_WarmObservation())
+    log.info("prewarm done", extra={"ms": (time.perf_counter() - t0) * 1000.0})
+
+# Sections a live bridge picks up; anything else changed in the files needs a restart.
+# Per-connection settings (events, flow, tracing.clock_samples) reach connections opened after the reload.
+HOT_SECTIONS = ("runtime", "policy", "logging", "events", "flow", "tracing")
+COLD_RUNTIME = ("executor", "worker_tasks", "worker_slots", "scheduler")
+# logging.level and logging.sampling apply live; these set up the handlers at startup
+COLD_LOGGING = ("json", "background", "queue_size")
+
+# Push a reloaded config into running connections, tickers and logging
+def ApplyConfig(old, new) -> None:
+    sections = ChangedSections(old, new)
+    if not sections:
+        return
+    restart = [s for s in sections if s not in HOT_SECTIONS]
+    restart += [f"runtime.{k}" for k in COLD_RUNTIME if (old.runtime or {}).get(k) != (new.runtime or {}).get(k)]
+    restart += [f"logging.{k}" for k in COLD_LOGGING if (old.logging or {}).get(k) != (new.logging or {}).get(k)]
+
+    runTime = new.runtime or {}
+    if "runtime" in sections:
+        for ws in list(connections):
+            changed = ws.live.Apply(runTime)
+            extractor = getattr(ws, "extractor", None)
+            if extractor is not None and "obs_queue_size" in changed:
+                extractor.Reserve(changed["obs_queue_size"] + 2)
+            voxels = getattr(ws, "voxels", None)
+            if voxels is not None and "obs_queue_size" in changed:
+                voxels.Reserve(changed["obs_queue_size"] + 2)
+    if "policy" in sections:
+        policyCfg = new.policy or {}
+        dispatcher.budget_s = policyCfg.get("budget_ms", 100) / 1000.0
+        if scheduler is not None:
+            scheduler.ticker.ConfigureFrom(policyCfg)
+        for ws in list(connections):
+            ticker = getattr(ws, "ticker", None)
+            if ticker is not None:
+                ticker.ConfigureFrom(policyCfg)
+        # new versions load and warm in the background; connections keep deciding meanwhile
+        task = asyncio.ensure_future(ReloadPolicies(policyCfg))
+        policyReloads.add(task)
+        task.add_done_callback(policyReloads.discard)
+    if "tracing" in sections:
+        tracingCfg = new.tracing or {}
+        for ws in list(connections):
+            fresh = Tracer.FromConfig(tracingCfg, ws.clock)
+            ws.tracer.sample_every = fresh.sample_every
+    if "logging" in sections:
+        loggingCfg = new.logging or {}
+        level = loggingCfg.get("level", "INFO")
+        stdlog.getLogger().setLevel(getattr(stdlog, str(level).upper(), stdlog.INFO))
+        if loggingCfg.get("sampling") != (old.logging or {}).get("sampling"):
+            SetSampling(loggingCfg.get("sampling"))
+
+    log.info("config reloaded", extra={"sections": sections, "connections": len(connections),
+                                       "restart_required": restart})
+
+async def ReloadPolicies(policyCfg) -> None:
+    try:
+        done = await policies.Apply(policyCfg)
+    except Exception as e:
+        log.warning("policy reload failed; keeping the running versions", extra={"error": str(e)})
+        return
+    if done:
+        log.info("policy versions updated", extra={"changes": done})
 
-    cfg = LoadConfig(env=os.getenv("APP_ENV", "dev"))
-    SetupLogging(cfg.logging["level"], cfg.logging.get("json", True))
+# Poll the yaml files' mtimes and apply whatever changed
+async def ConfigWatchLoop(every_s: float):
+    while True:
+        await asyncio.sleep(every_s)
+        old = Snapshot()
+        try:
+            new = Refresh()
+        except Exception as e:
+            log.warning("config reload failed; keeping the current config", extra={"error": str(e)})
+            continue
+        if new is not None:
+            try:
+                ApplyConfig(old, new)
+            except Exception:
+                log.exception("applying reloaded config failed")
+
+async def StopBridge() -> None:
+    for t in bridgeTasks:
+        t.cancel()
+    with contextlib.suppress(Exception):
+        await asyncio.gather(*bridgeTasks, return_exceptions=True)
+    bridgeTasks.clear()
+    for t in list(policyReloads):
+        t.cancel()
+    with contextlib.suppress(Exception):
+        await asyncio.gather(*policyReloads, return_exceptions=True)
+    if instrumentation is not None:
+        instrumentation.Close()
+    if policies is not None:
+        policies.Close()
+    if metricsServer is not None:
+        metricsServer.close()
+    if replay is not None:
+        replay.Flush()
+    if trajectory is not None:
+        trajectory.Close()
+
+# Run Handle on a transport's connection and close it once Handle returns
+async def Serve(conn: Connection) -> None:
+    try:
+        await Handle(conn)
+    finally:
+        with contextlib.suppress(Exception):
+            await conn.close()
+
+# Open a connection to this process's bridge without a socket: the returned client end
+# sends observation/event dicts (trusted, not re-validated; an observation may carry its
+# own "features" view) and receives action/event dicts. Needs StartBridge first.
+def ConnectInProcess(peer: str = "inproc", limit: int = 1024):
+    client, conn = Channel(peer, limit)
+    client.task = asyncio.create_task(Serve(conn))
+    return client
+
+async def ServeUnix(path: str, maxBytes: int):
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    return await asyncio.start_unix_server(
+        lambda reader, writer: Serve(UnixConnection(reader, writer, maxBytes, peer=f"unix:{path}")), path
+    )
 
-    host = cfg.server["host"]
-    port = cfg.server["port"]
+async def Main(shard: int = 0, shards: int = 1, hubPath: str | None = None):
+    cfg = await StartBridge(shard, shards, hubPath)
+    srv = cfg.server
+    transports = srv.get("transports") or ["websocket"]
+    for name in transports:
+        if name not in TRANSPORTS:
+            raise ValueError(f"unknown transport '{name}' (expected one of {TRANSPORTS})")
+
+    host = srv["host"]
+    port = srv["port"]
+    unixServer = None
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            if "websocket" in transports:
+                await stack.enter_async_context(serve(
+                    Handle, host, port,
+                    ping_interval=srv["ping_interval_s"],
+                    ping_timeout=srv["ping_timeout_s"],
+                    max_size=srv["max_msg_bytes"],
+                    reuse_port=shards > 1,
+                ))
+                log.info("ws server started", extra={"host": host, "port": port, "shard": shard, "shards": shards})
+            if "unix" in transports:
+                # one socket per shard: path, path.1, ...
+                unixPath = srv.get("unix_path", "/tmp/ai-bridge.sock") + (f".{shard}" if shard else "")
+                unixServer = await ServeUnix(unixPath, srv["max_msg_bytes"])
+                log.info("unix server started", extra={"path": unixPath, "shard": shard})
+            await asyncio.Future()  # run forever
+    finally:
+        if unixServer is not None:
+            unixServer.close()
+        await StopBridge()
 
-    async with serve(
-        Handle, host, port,
-        ping_interval=cfg.server["ping_interval_s"],
-        ping_timeout=cfg.server["ping_timeout_s"],
-        max_size=cfg.server["max_msg_bytes"]
-    ):
-        log.info("ws server started", extra={"host": host, "port": port})
-        await asyncio.Future()  # run forever
+# Entry point of one shard process (see app.shards.RunShards)
+def ShardMain(shard: int, shards: int, hubPath: str) -> None:
+    asyncio.run(Main(shard, shards, hubPath))
 
 if __name__ == "__main__":
-    asyncio.run(Main())
\ No newline at end of file
+    cfg = Snapshot()
+    shards = int(cfg.server.get("shards", 1))
+    if shards > 1:
+        SetupLogging(cfg.logging["level"], cfg.logging.get("json", True))
+        RunShards(ShardMain, shards, cfg.server.get("hub_path", "/tmp/ai-bridge-hub.sock"), log)
+    else:
+        asyncio.run(Main())
\ No newline at end of file
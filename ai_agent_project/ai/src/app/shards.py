@@ -0,0 +1,254 @@
+from __future__ import annotations
+import asyncio, itertools, json, os, socket, struct, time
+import multiprocessing as mp
+from typing import Any, Callable, Dict, Optional
+
+from actions.codec import DecodeMessage, EncodeMessage
+
+# Multi-process mode: N shard processes each run the full bridge on the same port
+# (SO_REUSEPORT; the kernel spreads connections across them) and connect to a hub in
+# the parent over a Unix socket. The hub keeps the registry of policy workers and
+# relays frames, so a game client on one shard can be served by a worker on another.
+#
+# Hub frame: <BHQI kind, shard, worker id, payload length> + payload.
+#   HELLO        shard -> hub      shard index in `shard`
+#   WORKER_UP    shard -> hub -> every other shard; payload = {"wire": ...}
+#   WORKER_DOWN  shard -> hub -> every other shard
+#   TO_WORKER    shard -> hub -> owning shard; payload = the frame for the worker's socket
+#   ACTION       shard -> hub -> shard `shard`; payload = the worker's action (v0 JSON)
+KIND_HELLO = 1
+KIND_WORKER_UP = 2
+KIND_WORKER_DOWN = 3
+KIND_TO_WORKER = 4
+KIND_ACTION = 5
+FLAG_TEXT = 0x80                  # payload is a str frame (utf-8) rather than bytes
+
+_HDR = struct.Struct("<BHQI")
+
+# Reconnect backoff after losing the hub (doubles from the first to the cap)
+RECONNECT_FIRST_S = 0.1
+RECONNECT_MAX_S = 5.0
+
+# Dispatcher request ids and worker ids carry their shard in the low bits
+SHARD_STRIDE = 256
+
+def ShardOf(ident: int) -> int:
+    return ident % SHARD_STRIDE
+
+def _Frame(kind: int, shard: int, wid: int, payload) -> bytes:
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+        kind |= FLAG_TEXT
+    return _HDR.pack(kind, shard, wid, len(payload)) + payload
+
+async def _ReadFrame(reader: asyncio.StreamReader):
+    kind, shard, wid, n = _HDR.unpack(await reader.readexactly(_HDR.size))
+    payload = await reader.readexactly(n) if n else b""
+    if kind & FLAG_TEXT:
+        return kind & ~FLAG_TEXT, shard, wid, payload.decode("utf-8")
+    return kind, shard, wid, payload
+
+class RemoteWorker:
+    """Stands in for a policy worker's websocket that lives on another shard."""
+    remote = True
+
+    def __init__(self, relay: "ShardRelay", wid: int, wire: str):
+        self.relay = relay
+        self.id = wid
+        self.wire = wire
+        self.closed = False
+
+    async def send(self, frame) -> None:
+        self.relay.Write(KIND_TO_WORKER, ShardOf(self.id), self.id, frame)
+
+class ShardRelay:
+    """
+    A shard's link to the hub: announces local workers, adopts remote ones. If the hub
+    connection drops, the remote workers are dropped and the relay reconnects with
+    backoff, announcing this shard and its local workers again.
+    """
+    def __init__(self, shard: int, path: str, dispatcher, log):
+        self.shard = shard
+        self.path = path
+        self.dispatcher = dispatcher
+        self.log = log
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.local: Dict[int, Any] = {}         # worker id -> websocket on this shard
+        self.ids: Dict[Any, int] = {}           # websocket -> worker id
+        self.remote: Dict[int, RemoteWorker] = {}
+        self._ids = itertools.count(1)
+        self.task: Optional[asyncio.Task] = None
+
+    async def Connect(self) -> None:
+        reader = await self._Open()
+        self.task = asyncio.create_task(self._Run(reader))
+
+    # Connect and announce this shard and every local worker (all of them again after a reconnect)
+    async def _Open(self) -> asyncio.StreamReader:
+        reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.Write(KIND_HELLO, self.shard, 0, b"")
+        for wid, ws in self.local.items():
+            self.Write(KIND_WORKER_UP, self.shard, wid, json.dumps({"wire": getattr(ws, "wire", "v0")}))
+        return reader
+
+    async def _Run(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            await self._Read(reader)
+            delay = RECONNECT_FIRST_S
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    reader = await self._Open()
+                    break
+                except OSError as e:
+                    self.log.debug("shard hub reconnect failed", extra={"error": str(e), "retry_s": delay})
+                    delay = min(delay * 2.0, RECONNECT_MAX_S)
+            self.log.info("reconnected to shard hub", extra={"shard": self.shard, "workers": len(self.local)})
+
+    def Write(self, kind: int, shard: int, wid: int, payload) -> None:
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(_Frame(kind, shard, wid, payload))
+
+    def WorkerUp(self, ws) -> None:
+        wid = next(self._ids) * SHARD_STRIDE + self.shard
+        self.local[wid] = ws
+        self.ids[ws] = wid
+        self.Write(KIND_WORKER_UP, self.shard, wid, json.dumps({"wire": getattr(ws, "wire", "v0")}))
+
+    def WorkerDown(self, ws) -> None:
+        wid = self.ids.pop(ws, None)
+        if wid is not None:
+            self.local.pop(wid, None)
+            self.Write(KIND_WORKER_DOWN, self.shard, wid, b"")
+
+    # A local worker answered an observation that a game client on another shard sent
+    def Action(self, worker_ws, msg: Dict[str, Any]) -> bool:
+        wid = self.ids.get(worker_ws)
+        target = ShardOf(int(msg.get("seq", 0)))
+        if wid is None or target == self.shard:
+            return False
+        self.Write(KIND_ACTION, target, wid, EncodeMessage(msg, "v0"))
+        return True
+
+    async def _Read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                kind, shard, wid, payload = await _ReadFrame(reader)
+                if kind == KIND_WORKER_UP:
+                    proxy = self.remote[wid] = RemoteWorker(self, wid, json.loads(payload).get("wire", "v0"))
+                    self.dispatcher.AddWorker(proxy)
+                elif kind == KIND_WORKER_DOWN:
+                    proxy = self.remote.pop(wid, None)
+                    if proxy is not None:
+                        proxy.closed = True
+                        self.dispatcher.RemoveWorker(proxy)
+                elif kind == KIND_TO_WORKER:
+                    ws = self.local.get(wid)
+                    if ws is not None:
+                        try:
+                            await ws.send(payload)
+                        except Exception as e:
+                            self.log.debug("relay to worker failed", extra={"error": str(e)})
+                elif kind == KIND_ACTION:
+                    proxy = self.remote.get(wid)
+                    if proxy is not None:
+                        await self.dispatcher.Complete(proxy, DecodeMessage(payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.log.warning("lost connection to shard hub; reconnecting")
+        finally:
+            for proxy in list(self.remote.values()):
+                proxy.closed = True
+                self.dispatcher.RemoveWorker(proxy)
+            self.remote.clear()
+            if self.writer is not None:
+                self.writer.close()
+
+class Hub:
+    """Parent-side registry and relay between shards."""
+    def __init__(self, path: str, log):
+        self.path = path
+        self.log = log
+        self.shards: Dict[int, asyncio.StreamWriter] = {}
+        self.workers: Dict[int, bytes] = {}     # worker id -> its WORKER_UP frame, replayed to new shards
+
+    async def Start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        return await asyncio.start_unix_server(self._Serve, self.path)
+
+    def _Broadcast(self, origin: int, frame: bytes) -> None:
+        for idx, w in self.shards.items():
+            if idx != origin:
+                w.write(frame)
+
+    async def _Serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shard = None
+        try:
+            while True:
+                kind, target, wid, payload = await _ReadFrame(reader)
+                if kind == KIND_HELLO:
+                    shard = target
+                    self.shards[shard] = writer
+                    for frame in self.workers.values():
+                        writer.write(frame)
+                elif kind == KIND_WORKER_UP:
+                    frame = _Frame(kind, target, wid, payload)
+                    self.workers[wid] = frame
+                    self._Broadcast(shard, frame)
+                elif kind == KIND_WORKER_DOWN:
+                    self.workers.pop(wid, None)
+                    self._Broadcast(shard, _Frame(kind, target, wid, payload))
+                else:
+                    # TO_WORKER / ACTION: forward unchanged to the target shard
+                    w = self.shards.get(target)
+                    if w is not None:
+                        w.write(_Frame(kind, target, wid, payload))
+                        await w.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if shard is not None and self.shards.get(shard) is writer:
+                del self.shards[shard]
+                # that shard's workers are gone with it
+                for wid in [w for w in self.workers if ShardOf(w) == shard]:
+                    del self.workers[wid]
+                    self._Broadcast(shard, _Frame(KIND_WORKER_DOWN, shard, wid, b""))
+            writer.close()
+
+def _CheckReusePort() -> None:
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("server.shards > 1 needs SO_REUSEPORT, which this platform lacks")
+
+# Parent process: run the hub, start `shards` processes running target(index, shards,
+# hub_path), and restart any that die
+def RunShards(target: Callable[[int, int, str], None], shards: int, hub_path: str, log) -> None:
+    _CheckReusePort()
+    if shards > SHARD_STRIDE:
+        raise ValueError(f"at most {SHARD_STRIDE} shards")
+    ctx = mp.get_context("spawn")
+
+    async def supervise():
+        hub = Hub(hub_path, log)
+        server = await hub.Start()
+        procs = {}
+        try:
+            while True:
+                for i in range(shards):
+                    p = procs.get(i)
+                    if p is None or not p.is_alive():
+                        if p is not None:
+                            log.warning("shard exited; restarting", extra={"shard": i, "exitcode": p.exitcode})
+                        p = procs[i] = ctx.Process(target=target, args=(i, shards, hub_path), name=f"bridge-shard-{i}")
+                        p.start()
+                await asyncio.sleep(1.0)
+        finally:
+            server.close()
+            for p in procs.values():
+                p.terminate()
+            deadline = time.time() + 5.0
+            for p in procs.values():
+                p.join(max(0.0, deadline - time.time()))
+            if os.path.exists(hub_path):
+                os.unlink(hub_path)
+
+    asyncio.run(supervise())
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import asyncio, time
+from typing import Any, Dict
+
+from utils.metrics import LogHistogram
+
+TICK_MODES = ("tick", "on_arrival")
+
+class TickScheduler:
+    """
+    Paces a policy loop on the monotonic clock.
+
+    tick        wake every 1/tick_hz. A late wake skips the ticks it missed (keeping the
+                original phase) instead of firing them back to back.
+    on_arrival  also wake as soon as Notify() reports a fresh observation; the next
+                timer tick is pushed a full period out so a decision isn't repeated.
+
+    Budget() is the decide deadline for the current wake: budget_ms, cut down to the
+    time left before the next tick when the loop is running late, never below
+    min_budget_ms. Timer wake-up lateness is kept as a jitter histogram.
+    """
+    def __init__(self, tick_hz: float = 10.0, budget_ms: float = 100.0, mode: str = "tick",
+                 min_budget_ms: float = 10.0):
+        self.Configure(tick_hz, budget_ms, mode, min_budget_ms)
+        self.next = None                # first Wait() ticks immediately and sets the phase
+        self.woke = 0.0
+        self.arrived = asyncio.Event()
+        self.ticks = 0
+        self.skipped = 0
+        self.arrivals = 0
+        self.jitter = LogHistogram()
+
+    @classmethod
+    def FromConfig(cls, policy_cfg: Dict[str, Any]) -> "TickScheduler":
+        ticker = cls()
+        ticker.ConfigureFrom(policy_cfg)
+        return ticker
+
+    # (Re)set rate, budget and mode; a running loop picks them up from its next wake
+    def Configure(self, tick_hz: float = 10.0, budget_ms: float = 100.0, mode: str = "tick",
+                  min_budget_ms: float = 10.0) -> None:
+        if mode not in TICK_MODES:
+            raise ValueError(f"unknown tick mode {mode!r}; expected one of {TICK_MODES}")
+        self.hz = float(tick_hz)
+        self.period = 1.0 / self.hz
+        self.budget_s = budget_ms / 1000.0
+        self.min_budget_s = min(min_budget_ms / 1000.0, self.budget_s)
+        self.mode = mode
+
+    def ConfigureFrom(self, policy_cfg: Dict[str, Any]) -> None:
+        self.Configure(
+            tick_hz=policy_cfg.get("tick_hz", 10),
+            budget_ms=policy_cfg.get("budget_ms", 100),
+            mode=policy_cfg.get("mode", "tick"),
+            min_budget_ms=policy_cfg.get("min_budget_ms", 10),
+        )
+
+    # A fresh observation was queued (only wakes the loop in on_arrival mode)
+    def Notify(self) -> None:
+        if self.mode == "on_arrival":
+            self.arrived.set()
+
+    # Sleep until the next tick (or arrival); returns "tick" or "arrival"
+    async def Wait(self) -> str:
+        now = time.monotonic()
+        if self.next is None:
+            self.next = now
+        if now < self.next:
+            if self.mode == "on_arrival":
+                if not self.arrived.is_set():
+                    try:
+                        await asyncio.wait_for(self.arrived.wait(), self.next - now)
+                    except asyncio.TimeoutError:
+                        pass
+                if self.arrived.is_set():
+                    self.arrived.clear()
+                    self.woke = time.monotonic()
+                    self.next = self.woke + self.period
+                    self.arrivals += 1
+                    return "arrival"
+            else:
+                await asyncio.sleep(self.next - now)
+            now = time.monotonic()
+
+        self.jitter.Record(now - self.next)
+        self.woke = now
+        late = now - self.next
+        missed = int(late // self.period) if late >= self.period else 0
+        self.skipped += missed
+        self.next += (missed + 1) * self.period
+        self.ticks += 1
+        self.arrived.clear()
+        return "tick"
+
+    # Decide deadline for this wake, shrunk when we are already eating into the next tick
+    def Budget(self) -> float:
+        if self.next is None:
+            return self.budget_s
+        left = self.next - time.monotonic()
+        return max(self.min_budget_s, min(self.budget_s, left))
+
+    def Stats(self) -> Dict[str, Any]:
+        p50, p99 = self.jitter.Percentiles((0.50, 0.99))
+        return {
+            "mode": self.mode,
+            "jitter_p50_ms": p50,
+            "jitter_p99_ms": p99,
+            "jitter_max_ms": self.jitter.max_us / 1000.0,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Heartbeat echoes older than this (or from the future) are not clock samples
+MAX_ECHO_AGE_S = 10.0
+
+class ClockEstimator:
+    """
+    NTP-style estimate of how far a client's clock is ahead of the bridge's. Every
+    heartbeat is echoed by the client as a `clock` event {t0: the heartbeat's timestamp,
+    t1: client receive time, t2: client send time}; with t3, the bridge's receive time:
+
+        rtt    = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+
+    The estimate is the sample with the lowest rtt among the last `samples` (the one
+    least distorted by queueing), as NTP's clock filter does.
+    """
+    def __init__(self, samples: int = 8):
+        self.samples: deque = deque(maxlen=max(1, int(samples)))    # (rtt, offset) in seconds
+        self.offset: Optional[float] = None
+        self.rtt: Optional[float] = None
+
+    # Add one echo; False when it can't be a reply to one of our heartbeats
+    def Add(self, t0: float, t1: float, t2: float, t3: float) -> bool:
+        if not 0.0 <= t3 - t0 <= MAX_ECHO_AGE_S or t2 < t1:
+            return False
+        rtt = max(0.0, (t3 - t0) - (t2 - t1))
+        self.samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2.0))
+        self.rtt, self.offset = min(self.samples)
+        return True
+
+    # A client timestamp on the bridge's clock (unchanged until the first sample)
+    def ToServer(self, ts: float) -> float:
+        return ts - self.offset if self.offset is not None else ts
+
+    # offset_ms / rtt_ms for heartbeat payloads and trace records (empty before the first sample)
+    def Report(self) -> Dict[str, float]:
+        if self.offset is None:
+            return {}
+        return {"offset_ms": self.offset * 1000.0, "rtt_ms": self.rtt * 1000.0}
+
+class Tracer:
+    """
+    Sampled observation -> action traces for one connection. Every `sample_every`-th
+    observation gets a `trace` dict (a local field, see actions.codec.LOCAL_FIELDS)
+    stamped on the way through: server receive here, decide start/end by the policy
+    worker or batch scheduler, send by SendActions, which hands it to Record(). An
+    observation superseded before it is decided takes its trace with it.
+    """
+    def __init__(self, sample_every: int, clock: ClockEstimator):
+        self.sample_every = max(0, int(sample_every))
+        self.clock = clock
+        self.count = 0
+
+    @classmethod
+    def FromConfig(cls, tracing: Dict[str, Any], clock: ClockEstimator) -> "Tracer":
+        return cls(tracing.get("sample_every", 100) if tracing.get("enabled", True) else 0, clock)
+
+    def Sample(self, msg: Dict[str, Any], rx: float) -> None:
+        if not self.sample_every:
+            return
+        self.count += 1
+        if self.count >= self.sample_every:
+            self.count = 0
+            msg["trace"] = {"obs_seq": msg["seq"], "client_send": float(msg["timestamp"]), "server_recv": rx}
+
+    # The trace event payload: timestamps (s) on each side's clock, plus per-hop times.
+    # uplink needs a clock estimate; downlink is estimated as half the rtt.
+    def Record(self, trace: Dict[str, Any], seq: int, sent: float) -> Dict[str, Any]:
+        rx = trace["server_recv"]
+        start = trace.get("decide_start", rx)
+        end = trace.get("decide_end", start)
+        hops = {
+            "queue": (start - rx) * 1000.0,
+            "decide": (end - start) * 1000.0,
+            "send": (sent - end) * 1000.0,
+            "server": (sent - rx) * 1000.0,
+        }
+        if self.clock.offset is not None:
+            hops["uplink"] = (rx - self.clock.ToServer(trace["client_send"])) * 1000.0
+            hops["downlink_est"] = self.clock.rtt * 500.0
+        out = dict(trace, seq=seq, server_send=sent, hops_ms=hops)
+        out.update(self.clock.Report())
+        return out
+
+# Stamp a trace with the decide window and the version that decided (no-op without one)
+def Decided(trace: Optional[Dict[str, Any]], start: float, end: float, policy=None, cached: bool = False) -> None:
+    if trace is None:
+        return
+    trace["decide_start"] = start
+    trace["decide_end"] = end
+    name = getattr(policy, "name", None)
+    if isinstance(name, str):
+        trace["policy"] = name
+    if cached:
+        trace["cached"] = True
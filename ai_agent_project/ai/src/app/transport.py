@@ -0,0 +1,214 @@
+from __future__ import annotations
+import asyncio, struct
+from typing import Any, Dict, Optional, Tuple, Union
+from websockets.exceptions import ConnectionClosed
+
+from actions.codec import EncodeMessage, DecodeMessage
+
+# Transports a bridge can listen on (server.transports); in-process channels are opened from
+# code with server.ConnectInProcess() and need no listener
+TRANSPORTS = ["websocket", "unix"]
+
+class TransportClosed(ConnectionError):
+    """Send or receive on a closed Unix socket / in-process connection."""
+
+# What Handle and its loops treat as "the peer went away"
+CLOSED = (ConnectionClosed, TransportClosed)
+
+# Unix socket frame header: flags, payload length; the payload is UTF-8 text (v0 JSON) or a v1 frame
+_HDR = struct.Struct("<BI")
+FLAG_TEXT = 0x01
+
+Frame = Union[str, bytes]
+
+class Connection:
+    """
+    What server.Handle talks to. Iterating yields incoming items: wire frames (str for
+    v0 JSON, bytes for v1) that the bridge parses and validates, or -- on in-process
+    connections only -- message dicts that are trusted as already validated. send()
+    writes one wire frame; SendMessage() writes one message dict in whatever form the
+    transport carries. Handle keeps its per-connection state (wire, acks, flow, queues)
+    as attributes on the connection.
+    """
+    wire = "v0"
+    peer = "?"
+
+    @property
+    def closed(self) -> bool:
+        raise NotImplementedError
+
+    async def send(self, frame: Frame) -> None:
+        raise NotImplementedError
+
+    async def SendMessage(self, msg: Dict[str, Any]) -> None:
+        await self.send(EncodeMessage(msg, self.wire))
+
+    async def recv(self):
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        raise NotImplementedError
+
+    def __aiter__(self):
+        return self._Items()
+
+    # Ends quietly when the peer closes
+    async def _Items(self):
+        while True:
+            try:
+                item = await self.recv()
+            except TransportClosed:
+                return
+            yield item
+
+class WebSocketConnection(Connection):
+    """The websockets server protocol behind the existing port."""
+    def __init__(self, ws):
+        self.ws = ws
+        try:
+            self.peer = f"{ws.remote_address[0]}:{ws.remote_address[1]}"
+        except Exception:
+            self.peer = str(ws.remote_address)
+
+    @property
+    def closed(self) -> bool:
+        return self.ws.closed
+
+    async def send(self, frame: Frame) -> None:
+        await self.ws.send(frame)
+
+    async def recv(self):
+        return await self.ws.recv()
+
+    async def close(self) -> None:
+        await self.ws.close()
+
+    def __aiter__(self):
+        return self.ws.__aiter__()
+
+class UnixConnection(Connection):
+    """Length-prefixed frames over a Unix domain socket; same frames as the websocket, no HTTP/WS framing."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 max_bytes: int = 1 << 20, peer: str = "unix"):
+        self.reader = reader
+        self.writer = writer
+        self.max_bytes = max_bytes
+        self.peer = peer
+
+    @property
+    def closed(self) -> bool:
+        return self.writer.is_closing()
+
+    async def send(self, frame: Frame) -> None:
+        if self.writer.is_closing():
+            raise TransportClosed("unix connection closed")
+        if isinstance(frame, str):
+            data = frame.encode("utf-8")
+            self.writer.write(_HDR.pack(FLAG_TEXT, len(data)) + data)
+        else:
+            self.writer.write(_HDR.pack(0, len(frame)) + frame)
+        try:
+            await self.writer.drain()
+        except ConnectionError as e:
+            raise TransportClosed(str(e)) from e
+
+    async def recv(self) -> Frame:
+        try:
+            flags, n = _HDR.unpack(await self.reader.readexactly(_HDR.size))
+            if n > self.max_bytes:
+                self.writer.close()
+                raise TransportClosed(f"frame of {n} bytes exceeds max_msg_bytes")
+            data = await self.reader.readexactly(n) if n else b""
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            raise TransportClosed("unix connection closed") from e
+        return data.decode("utf-8") if flags & FLAG_TEXT else data
+
+    async def close(self) -> None:
+        if not self.writer.is_closing():
+            self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+async def OpenUnix(path: str, max_bytes: int = 1 << 20) -> UnixConnection:
+    reader, writer = await asyncio.open_unix_connection(path)
+    return UnixConnection(reader, writer, max_bytes, peer=f"unix:{path}")
+
+_EOF = object()
+
+class InProcessConnection(Connection):
+    """
+    One end of an in-process channel (see Channel). Items are handed over as Python
+    objects: SendMessage() passes the dict itself, send() passes a frame unchanged, and
+    nothing is encoded, copied or validated on the way. The receiving end owns what it
+    is given, so don't reuse a message dict after sending it. At most `limit` items wait
+    in an inbox; a sender beyond that waits, like on a full socket buffer.
+    """
+    def __init__(self, peer: str = "inproc", limit: int = 1024):
+        self.peer = peer
+        self.limit = max(1, int(limit))
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.drained = asyncio.Event()
+        self.other: Optional["InProcessConnection"] = None
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or self.other is None or self.other._closed
+
+    async def send(self, item) -> None:
+        other = self.other
+        if self.closed:
+            raise TransportClosed("in-process channel closed")
+        inbox = other.inbox
+        while inbox.qsize() >= other.limit:
+            other.drained.clear()
+            await other.drained.wait()
+            if self.closed:
+                raise TransportClosed("in-process channel closed")
+        inbox.put_nowait(item)
+
+    async def SendMessage(self, msg: Dict[str, Any]) -> None:
+        await self.send(msg)
+
+    async def recv(self):
+        item = await self.inbox.get()
+        if item is _EOF:
+            self.inbox.put_nowait(_EOF)         # every later recv() sees the close too
+            raise TransportClosed("in-process channel closed")
+        if self.inbox.qsize() < self.limit:
+            self.drained.set()
+        return item
+
+    # recv(), with any wire frame (e.g. relayed from another shard) decoded to its dict
+    async def RecvMessage(self) -> Dict[str, Any]:
+        item = await self.recv()
+        return item if isinstance(item, dict) else DecodeMessage(item)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for end in (self, self.other):
+            if end is not None:
+                end.inbox.put_nowait(_EOF)
+                end.drained.set()          # wake senders blocked on a full inbox
+
+# A connected pair: (client end, bridge end)
+def Channel(peer: str = "inproc", limit: int = 1024) -> Tuple[InProcessConnection, InProcessConnection]:
+    client = InProcessConnection(peer, limit)
+    bridge = InProcessConnection(peer, limit)
+    client.other, bridge.other = bridge, client
+    return client, bridge
+
+# Wrap a bare websockets protocol; anything already a Connection is returned as is
+def AsConnection(ws) -> Connection:
+    return ws if isinstance(ws, Connection) else WebSocketConnection(ws)
+
+# Send a message dict to a connection or to a stand-in that only takes frames (shards.RemoteWorker)
+async def SendMessage(ws, msg: Dict[str, Any]) -> None:
+    if isinstance(ws, Connection):
+        await ws.SendMessage(msg)
+    else:
+        await ws.send(EncodeMessage(msg, getattr(ws, "wire", "v0")))
@@ -0,0 +1,69 @@
+# Benchmark: Q-table checkpoint cost -- a full pickle dump vs incremental policy.checkpoint
+# saves after a batch of updates, and resume time from each
+#   python ai/src/bench/checkpoint_bench.py [--yaw-bins 32768] [--updates 256 4096] [--rounds 5]
+from __future__ import annotations
+import argparse, json, os, pickle, statistics, sys, tempfile, time, pathlib as _pathlib
+import numpy as np
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from policy.checkpoint import Checkpointer
+from policy.qlearning import QLearningPolicy
+
+def _Updates(p: QLearningPolicy, n: int, rng) -> None:
+    s = rng.integers(0, p.q.shape[0], n)
+    a = rng.integers(0, p.q.shape[1], n)
+    p.Update(s, a, rng.random(n, dtype=np.float32), rng.integers(0, p.q.shape[0], n), np.zeros(n, dtype=bool))
+
+def Run(yaw_bins: int, updates: int, rounds: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    p = QLearningPolicy(yaw_bins=yaw_bins, seed=seed)
+    with tempfile.TemporaryDirectory() as d:
+        d = _pathlib.Path(d)
+        ckpt = Checkpointer(p, d / "ckpt")
+        ckpt.Resume()
+        _Updates(p, updates, rng)
+        ckpt.Save()                                 # first save of each slot writes what's been touched
+        ckpt.Save()
+        pickleMs, saveMs, saveBytes = [], [], []
+        for _ in range(rounds):
+            _Updates(p, updates, rng)
+            t0 = time.perf_counter()
+            with open(d / "q.pkl", "wb") as f:
+                pickle.dump({"arrays": p.CheckpointArrays(), "state": p.CheckpointState()}, f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())                # Save() syncs too
+            pickleMs.append((time.perf_counter() - t0) * 1000.0)
+            out = ckpt.Save()
+            saveMs.append(out["ms"])
+            saveBytes.append(out["bytes"])
+        ckpt.Close()
+
+        t0 = time.perf_counter()
+        with open(d / "q.pkl", "rb") as f:
+            pickle.load(f)
+        unpickleMs = (time.perf_counter() - t0) * 1000.0
+        q = QLearningPolicy(yaw_bins=yaw_bins, seed=seed)
+        t0 = time.perf_counter()
+        Checkpointer(q, d / "ckpt").Resume()
+        resumeMs = (time.perf_counter() - t0) * 1000.0
+        assert np.array_equal(q.q, p.q) and q.steps == p.steps
+    return {
+        "table_bytes": sum(a.nbytes for a in p.CheckpointArrays().values()),
+        "updates_per_save": updates,
+        "pickle_ms_median": statistics.median(pickleMs),
+        "checkpoint_ms_median": statistics.median(saveMs),
+        "checkpoint_bytes_median": statistics.median(saveBytes),
+        "unpickle_ms": unpickleMs,
+        "resume_ms": resumeMs,
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--yaw-bins", type=int, default=32768)
+    ap.add_argument("--updates", type=int, nargs="+", default=[256, 4096])
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+    print(json.dumps([Run(args.yaw_bins, n, args.rounds) for n in args.updates], indent=2))
@@ -0,0 +1,65 @@
+# Benchmark: headless VoxelEnv stepping and an end-to-end Q-learning training loop
+#   python ai/src/bench/env_bench.py [--envs 1024] [--steps 200] [--rays 3]
+from __future__ import annotations
+import argparse, json, sys, time, pathlib as _pathlib
+import numpy as np
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from training.voxel_env import VoxelEnv, ActionArrays
+from policy.qlearning import QLearningPolicy, ActionPayload
+
+def Run(envs: int, steps: int, rays: int) -> dict:
+    rng = np.random.default_rng(0)
+
+    # raw stepping with random actions
+    env = VoxelEnv(n=envs, n_rays=rays, seed=0)
+    acts = rng.uniform(-1.0, 1.0, (steps, envs, 5)).astype(np.float32)
+    acts[:, :, :2] *= 45.0
+    t0 = time.perf_counter()
+    for i in range(steps):
+        env.Step(acts[i])
+    step_s = steps * envs / (time.perf_counter() - t0)
+
+    # Q-learning on the array state: discretise, act, step, TD update
+    pol = QLearningPolicy(n_rays=rays, seed=0)
+    table = ActionArrays([ActionPayload(a) for a in range(pol.n_actions)])
+    env = VoxelEnv(n=envs, n_rays=rays, seed=1)
+    s = pol.StateIndex(env.yaw, env.pitch, env.rays)
+    ret = 0.0
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        a = pol.Act(s)
+        r, done = env.Step(table[a])
+        s2 = pol.StateIndex(env.yaw, env.pitch, env.rays)
+        pol.Update(s, a, r, s2, done.astype(np.float32))
+        s = s2
+        ret += float(r.mean())
+    train_s = steps * envs / (time.perf_counter() - t0)
+
+    # the same loop through v0 observation dicts, as the bridge would see them
+    n = max(1, steps // 10)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        payloads = pol.decide_batch(env.Observations())
+        env.StepPayloads(payloads)
+    dict_s = n * envs / (time.perf_counter() - t0)
+
+    return {
+        "envs": envs,
+        "rays": rays,
+        "env_steps_per_s": step_s,
+        "train_steps_per_s": train_s,
+        "v0_dict_steps_per_s": dict_s,
+        "mean_reward_per_step": ret / steps,
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--envs", type=int, default=1024)
+    ap.add_argument("--steps", type=int, default=200)
+    ap.add_argument("--rays", type=int, default=3)
+    args = ap.parse_args()
+    print(json.dumps(Run(args.envs, args.steps, args.rays), indent=2))
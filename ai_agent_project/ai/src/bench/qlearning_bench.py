@@ -0,0 +1,62 @@
+# Micro-benchmark: tabular Q-learning decide latency and TD-update throughput
+#   python ai/src/bench/qlearning_bench.py [--batch 65536] [--rounds 50]
+from __future__ import annotations
+import argparse, json, sys, time, pathlib as _pathlib
+import numpy as np
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from policy.qlearning import QLearningPolicy
+from bench.validation_bench import SampleMessages
+
+def Run(batch: int, rounds: int) -> dict:
+    pol = QLearningPolicy(seed=0)
+    rng = np.random.default_rng(0)
+    obs, _, _ = SampleMessages()
+
+    n = 20000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pol.decide(obs)
+    decide_us = (time.perf_counter() - t0) / n * 1e6
+
+    obs_list = [obs] * 64
+    t0 = time.perf_counter()
+    for _ in range(200):
+        pol.decide_batch(obs_list)
+    batch_us = (time.perf_counter() - t0) / (200 * len(obs_list)) * 1e6
+
+    yaw = rng.uniform(-180, 180, batch)
+    pitch = rng.uniform(-90, 90, batch)
+    rays = rng.uniform(0, 8, (batch, pol.n_rays))
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        s = pol.StateIndex(yaw, pitch, rays)
+    states_s = rounds * batch / (time.perf_counter() - t0)
+
+    a = pol.Act(s)
+    r = rng.standard_normal(batch).astype(np.float32)
+    s2 = np.roll(s, -1)
+    done = (rng.random(batch) < 0.01).astype(np.float32)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        pol.Update(s, a, r, s2, done)
+    updates_s = rounds * batch / (time.perf_counter() - t0)
+
+    return {
+        "n_states": pol.n_states,
+        "n_actions": pol.n_actions,
+        "decide_us": decide_us,
+        "decide_batch_us_per_obs": batch_us,
+        "state_index_per_s": states_s,
+        "td_updates_per_s": updates_s,
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, default=65536)
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+    print(json.dumps(Run(args.batch, args.rounds), indent=2))
@@ -0,0 +1,81 @@
+# Benchmark: observation -> ack round trips through the full bridge (parse, validate, features,
+# obs_q) over each transport, lockstep from one client
+#   python ai/src/bench/transport_bench.py [--steps 5000] [--transports websocket unix inproc]
+from __future__ import annotations
+import argparse, asyncio, json, os, sys, tempfile, time, pathlib as _pathlib
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+for p in (SRC, SRC / "app"):
+    if str(p) not in sys.path:
+        sys.path.append(str(p))
+
+import websockets
+from websockets.server import serve
+import server
+from transport import OpenUnix
+from training.voxel_env import VoxelEnv
+
+# Send one observation, read until its ack; actions and heartbeats in between are counted
+async def _Lockstep(send, recv, env: VoxelEnv, steps: int, encode) -> dict:
+    actions = 0
+    t0 = time.perf_counter()
+    for i in range(steps):
+        obs = env.Observation(0)
+        obs["seq"] = i
+        await send(encode(obs))
+        while True:
+            msg = await recv()
+            if msg.get("type") == "action":
+                actions += 1
+            elif msg.get("kind") == "ack" and msg["payload"]["seq"] == i:
+                break
+    dt = time.perf_counter() - t0
+    return {"round_trips_per_s": steps / dt, "us_per_round_trip": dt / steps * 1e6, "actions": actions}
+
+async def RunWebSocket(env: VoxelEnv, steps: int, port: int = 8797) -> dict:
+    async with serve(server.Handle, "127.0.0.1", port):
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as ws:
+            return await _Lockstep(ws.send, lambda: _Json(ws.recv()), env, steps, json.dumps)
+
+async def RunUnix(env: VoxelEnv, steps: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    srv = await server.ServeUnix(path, 1 << 20)
+    try:
+        conn = await OpenUnix(path)
+        try:
+            return await _Lockstep(conn.send, lambda: _Json(conn.recv()), env, steps, json.dumps)
+        finally:
+            await conn.close()
+    finally:
+        srv.close()
+
+async def RunInProcess(env: VoxelEnv, steps: int) -> dict:
+    client = server.ConnectInProcess("bench")
+    try:
+        return await _Lockstep(client.SendMessage, client.RecvMessage, env, steps, lambda o: o)
+    finally:
+        await client.close()
+        await client.task
+
+async def _Json(frame):
+    return json.loads(await frame)
+
+RUNNERS = {"websocket": RunWebSocket, "unix": RunUnix, "inproc": RunInProcess}
+
+async def Run(steps: int, transports) -> dict:
+    await server.StartBridge()
+    try:
+        env = VoxelEnv(n=1, seed=0)
+        out = {}
+        for name in transports:
+            out[name] = await RUNNERS[name](env, steps)
+        return out
+    finally:
+        await server.StopBridge()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, default=5000)
+    ap.add_argument("--transports", nargs="+", default=list(RUNNERS), choices=list(RUNNERS))
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(Run(args.steps, args.transports)), indent=2))
@@ -0,0 +1,66 @@
+# Micro-benchmark: per-message schema validation cost, before vs after utils.schemas
+#   python ai/src/bench/validation_bench.py [--n 20000]
+from __future__ import annotations
+import argparse, json, sys, time, pathlib as _pathlib
+from jsonschema import validate, Draft7Validator
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from utils.schemas import OBS, ACT, EVT
+
+def SampleMessages():
+    obs = {
+        "type": "observation", "schema_version": "v0", "timestamp": time.time(), "seq": 1,
+        "payload": {
+            "pose": {"pos": {"x": 1.5, "y": 64.0, "z": -3.25}, "yaw": 90.0, "pitch": 0.0},
+            "rays": [2.0, 3.2, 5.5],
+            "hotbar": ["minecraft:stone"] + [None] * 8,
+        },
+    }
+    act = {
+        "type": "action", "schema_version": "v0", "timestamp": time.time(), "seq": 1,
+        "payload": {"look": {"dYaw": 5.0, "dPitch": -2.0}, "move": {"forward": 1.0, "strafe": 0.0}, "jump": False},
+    }
+    evts = [
+        {"type": "event", "schema_version": "v0", "timestamp": time.time(), "kind": "ack", "payload": {"seq": 1}},
+        {"type": "event", "schema_version": "v0", "timestamp": time.time(), "kind": "heartbeat", "payload": {"uptime_s": 12.5}},
+        {"type": "event", "schema_version": "v0", "timestamp": time.time(), "kind": "latency_stats",
+         "payload": {"p50_ms": 3.0, "p90_ms": 9.0, "hz": 10.0}},
+    ]
+    return obs, act, evts
+
+def _Rate(fn, msgs, n: int) -> float:
+    k = len(msgs)
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(msgs[i % k])
+    return n / (time.perf_counter() - t0)
+
+def Run(n: int) -> dict:
+    obs, act, evts = SampleMessages()
+    cases = {
+        "observation": (OBS, [obs]),
+        "action": (ACT, [act]),
+        "event": (EVT, evts),
+    }
+    out = {}
+    for name, (compiled, msgs) in cases.items():
+        schema = compiled.Warm().schema
+        cached = Draft7Validator(schema)
+        out[name] = {
+            # what the bridge did before: re-check the schema and build a validator per call
+            "jsonschema_validate_msgs_s": _Rate(lambda m: validate(instance=m, schema=schema), msgs, max(1, n // 20)),
+            "cached_validator_msgs_s": _Rate(cached.validate, msgs, max(1, n // 4)),
+            "fast_path_msgs_s": _Rate(compiled.Validate, msgs, n),
+            "fast_path_enabled": compiled.fast is not None,
+        }
+        out[name]["speedup"] = out[name]["fast_path_msgs_s"] / out[name]["jsonschema_validate_msgs_s"]
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+    print(json.dumps(Run(args.n), indent=2))
@@ -0,0 +1,58 @@
+# Benchmark: voxel-grid observation size (keyframe vs delta) and encode / decode cost
+# for a player walking through the headless VoxelEnv
+#   python ai/src/bench/voxel_bench.py [--steps 2000] [--edge 16 32]
+from __future__ import annotations
+import argparse, json, statistics, sys, time, pathlib as _pathlib
+import numpy as np
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from actions.codec import DecodeMessage, EncodeObservationV1
+from actions.voxels import KIND_DELTA, VoxelDecoder, VoxelEncoder
+from training.voxel_env import VoxelEnv
+
+def Run(edge: int, steps: int, keyframe_every: int, seed: int = 0) -> dict:
+    env = VoxelEnv(n=1, seed=seed, max_height=12)
+    enc = VoxelEncoder(edge, keyframe_every)
+    dec = VoxelDecoder(edge, slots=4)
+    grid = np.empty((edge,) * 3, dtype=np.uint16)
+    rng = np.random.default_rng(seed)
+    key, delta = [], []
+    encS = decS = 0.0
+    for _ in range(steps):
+        a = np.array([[rng.uniform(-10, 10), 0.0, 1.0, rng.uniform(-0.3, 0.3), rng.random() < 0.1]], dtype=np.float32)
+        env.Step(a)
+        obs = env.Observation(0)
+        _, origin = env.Grid(0, edge, grid)
+        t0 = time.perf_counter()
+        frame = enc.Encode(obs, grid, origin)
+        t1 = time.perf_counter()
+        msg = DecodeMessage(frame, dec)
+        t2 = time.perf_counter()
+        encS += t1 - t0
+        decS += t2 - t1
+        assert np.array_equal(msg["voxels"], grid)
+        kind = frame[len(EncodeObservationV1(obs)) + 1]       # grid header: edge, kind, ...
+        (delta if kind == KIND_DELTA else key).append(len(frame))
+    base = len(EncodeObservationV1(obs))
+    return {
+        "edge": edge,
+        "raw_grid_bytes": 2 * edge ** 3,
+        "plain_observation_bytes": base,
+        "keyframe_bytes_median": statistics.median(key),
+        "delta_bytes_median": statistics.median(delta) if delta else None,
+        "mean_frame_bytes": (sum(key) + sum(delta)) / steps,
+        "keyframes": len(key),
+        "encode_us": encS / steps * 1e6,
+        "decode_us": decS / steps * 1e6,
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, default=2000)
+    ap.add_argument("--edge", type=int, nargs="+", default=[16, 32])
+    ap.add_argument("--keyframe-every", type=int, default=100)
+    args = ap.parse_args()
+    print(json.dumps([Run(e, args.steps, args.keyframe_every) for e in args.edge], indent=2))
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import math, struct
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+# Fixed-width float32 layout of one observation:
+#   [0:3]    pos x, y, z
+#   [3:7]    sin yaw, cos yaw, sin pitch, cos pitch (degrees in, so 359 and 1 end up close)
+#   [7:12]   rays, padded with RAY_PAD past the ones the client sent
+#   [12]     number of rays sent
+#   [13:22]  hotbar item ids (HotbarVocab; 0 = empty slot)
+POS = slice(0, 3)
+ANGLES = slice(3, 7)
+MAX_RAYS = 5
+RAYS = slice(7, 7 + MAX_RAYS)
+NRAYS = 12
+HOTBAR_SLOTS = 9
+HOTBAR = slice(13, 13 + HOTBAR_SLOTS)
+WIDTH = 13 + HOTBAR_SLOTS
+RAY_PAD = -1.0                  # rays are >= 0 by schema, so padding can't be mistaken for a hit
+
+_RAD = math.pi / 180.0
+_ROW = struct.Struct(f"<{WIDTH}f")
+_PAD = [[RAY_PAD] * (MAX_RAYS - n) for n in range(MAX_RAYS + 1)]
+
+class HotbarVocab:
+    """
+    Interns hotbar item strings to small integer ids (exact in float32). Id 0 is an
+    empty slot, 1 stands for any item seen after `max_items` distinct ones.
+    """
+    EMPTY = 0
+    OTHER = 1
+
+    def __init__(self, items: Iterable[str] = (), max_items: int = 1 << 16):
+        self.max_items = max_items
+        self.ids: Dict[str, int] = {}
+        self.names: List[Optional[str]] = [None, None]
+        for name in items:
+            self.Id(name)
+
+    def Id(self, name: Optional[str]) -> int:
+        if name is None:
+            return self.EMPTY
+        i = self.ids.get(name)
+        if i is None:
+            if len(self.names) >= self.max_items:
+                return self.OTHER
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def Name(self, i: int) -> Optional[str]:
+        return self.names[i] if 0 <= i < len(self.names) else None
+
+# Process-wide vocabulary; seed it from features.vocab so ids stay stable across runs and shards
+VOCAB = HotbarVocab()
+
+class FrameStack:
+    """
+    The last `frames` feature rows of one connection as a contiguous (frames, WIDTH) view.
+
+    Rows are written in place into a preallocated (frames + slack) buffer; once the
+    write position reaches the end, the newest frames - 1 rows are copied back to the
+    front. Nothing is allocated per frame, and the view it returns stays intact for the next
+    `slack` pushes, so a view can sit in a queue or be decided on while newer
+    observations keep arriving. Before `frames` observations the older rows are zero.
+    """
+    def __init__(self, frames: int = 4, slack: int = 64, width: int = WIDTH):
+        self.frames = max(1, int(frames))
+        self.size = self.frames + max(1, int(slack))
+        self.buf = np.zeros((self.size, width), dtype=np.float32)
+        self.pos = self.frames - 2          # last row written
+
+    # Row to fill for the next frame; call View() once it is written
+    def Next(self) -> np.ndarray:
+        self.pos += 1
+        if self.pos == self.size:
+            k = self.frames - 1
+            if k:
+                self.buf[:k] = self.buf[self.size - k:]
+            self.pos = k
+        return self.buf[self.pos]
+
+    def View(self) -> np.ndarray:
+        return self.buf[self.pos - self.frames + 1:self.pos + 1]
+
+    # Grow the slack (never shrinks). Views already handed out keep the old buffer alive
+    # and are never written again, so they stay intact.
+    def Reserve(self, slack: int) -> None:
+        size = self.frames + max(1, int(slack))
+        if size <= self.size:
+            return
+        buf = np.zeros((size, self.buf.shape[1]), dtype=np.float32)
+        rows = self.buf[max(0, self.pos - self.frames + 1):self.pos + 1]
+        buf[self.frames - len(rows):self.frames] = rows
+        self.buf, self.size, self.pos = buf, size, self.frames - 1
+
+# Fill `row` (WIDTH float32, contiguous) from a validated v0 observation
+def ExtractInto(row: np.ndarray, obs: Dict[str, Any], vocab: HotbarVocab = VOCAB) -> np.ndarray:
+    p = obs["payload"]
+    pose = p["pose"]
+    pos = pose["pos"]
+    rays = p["rays"]
+    n = min(len(rays), MAX_RAYS)
+    yaw = pose["yaw"] * _RAD
+    pitch = pose["pitch"] * _RAD
+    vals = [pos["x"], pos["y"], pos["z"], math.sin(yaw), math.cos(yaw), math.sin(pitch), math.cos(pitch)]
+    vals += rays[:n]
+    vals += _PAD[n]
+    vals.append(n)
+    ids = vocab.ids
+    for item in p["hotbar"][:HOTBAR_SLOTS]:
+        vals.append(0 if item is None else ids.get(item) or vocab.Id(item))
+    _ROW.pack_into(row.data, 0, *vals)
+    return row
+
+def Extract(obs: Dict[str, Any], vocab: HotbarVocab = VOCAB) -> np.ndarray:
+    return ExtractInto(np.zeros(WIDTH, dtype=np.float32), obs, vocab)
+
+class FeatureExtractor:
+    """Per-connection stage between validation and obs_q: observation -> stacked feature view."""
+    def __init__(self, frames: int = 4, slack: int = 64, vocab: HotbarVocab = VOCAB):
+        self.stack = FrameStack(frames, slack)
+        self.vocab = vocab
+
+    def Reserve(self, slack: int) -> None:
+        self.stack.Reserve(slack)
+
+    def Push(self, obs: Dict[str, Any]) -> np.ndarray:
+        ExtractInto(self.stack.Next(), obs, self.vocab)
+        return self.stack.View()
+
+# A policy (module, object or function) opts in with `wants_features = True`: it is then
+# called with the (frames, WIDTH) float32 view -- decide_batch with (N, frames, WIDTH) --
+# instead of the observation dict. Views point into the connection's buffer; copy to keep.
+def WantsFeatures(policy: Any) -> bool:
+    return bool(getattr(policy, "wants_features", False))
+
+# What a backend hands the policy for one queued observation
+def PolicyInput(obs: Dict[str, Any], wants_features: bool):
+    return obs["features"] if wants_features else obs
+
+def PolicyBatchInput(obs_list: List[Dict[str, Any]], wants_features: bool):
+    return np.stack([o["features"] for o in obs_list]) if wants_features else obs_list
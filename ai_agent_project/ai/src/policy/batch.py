@@ -0,0 +1,32 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Union
+
+Obs = Dict[str, Any]
+Payload = Dict[str, Any]
+DecideBatch = Callable[[List[Obs]], List[Union[Payload, Exception]]]
+
+def AsBatch(policy: Any) -> DecideBatch:
+    """
+    Return a decide_batch(list_of_obs) -> list_of_payloads for any policy.
+    Accepts a module/object exposing decide_batch or decide, or a bare decide function.
+    Scalar policies are looped; a failing observation yields its Exception in place of
+    a payload so one bad input doesn't cost every other agent its action.
+    """
+    batch = getattr(policy, "decide_batch", None)
+    if callable(batch):
+        return batch
+
+    decide = getattr(policy, "decide", policy)
+    if not callable(decide):
+        raise TypeError(f"{policy!r} has neither decide_batch nor decide")
+
+    def decide_batch(obs_list: List[Obs]) -> List[Union[Payload, Exception]]:
+        out: List[Union[Payload, Exception]] = []
+        for obs in obs_list:
+            try:
+                out.append(decide(obs))
+            except Exception as e:
+                out.append(e)
+        return out
+
+    return decide_batch
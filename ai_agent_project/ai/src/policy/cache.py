@@ -0,0 +1,109 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class DecisionCache:
+    """
+    Payload cache in front of decide(), keyed on a quantised observation.
+
+    The key is (pos, yaw/pitch, rays[, hotbar]) snapped to pos_step / angle_step /
+    ray_step; a step of None leaves that field out of the key entirely. Entries live at
+    most ttl_s and the least recently used one is evicted beyond `capacity`. Every
+    lookup compares the policy's version (see VersionOf) with the one the entries were
+    decided under, and a change empties the cache.
+
+    Only sound for (near-)greedy policies that look at the current observation alone:
+    a hit repeats the decision, exploration included, and ignores any frame history.
+    Payloads are shared between hits, so they must not be mutated (ClampAction copies).
+    """
+    def __init__(self, capacity: int = 4096, ttl_s: float = 0.5, pos_step: Optional[float] = 0.5,
+                 angle_step: Optional[float] = 15.0, ray_step: Optional[float] = 0.5, hotbar: bool = False):
+        self.capacity = max(1, int(capacity))
+        self.ttl_s = ttl_s
+        self.pos_q = 1.0 / pos_step if pos_step else None
+        self.angle_q = 1.0 / angle_step if angle_step else None
+        self.ray_q = 1.0 / ray_step if ray_step else None
+        self.hotbar = hotbar
+        self.entries: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()   # key -> (payload, stored at)
+        self.version: Any = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def FromConfig(cls, cache_cfg: Dict[str, Any]) -> "DecisionCache":
+        return cls(
+            capacity=cache_cfg.get("capacity", 4096),
+            ttl_s=cache_cfg.get("ttl_ms", 500) / 1000.0,
+            pos_step=cache_cfg.get("pos_step", 0.5),
+            angle_step=cache_cfg.get("angle_step", 15.0),
+            ray_step=cache_cfg.get("ray_step", 0.5),
+            hotbar=cache_cfg.get("hotbar", False),
+        )
+
+    def Key(self, obs: Dict[str, Any]) -> Tuple:
+        p = obs["payload"]
+        pose = p["pose"]
+        key: tuple = ()
+        if self.pos_q is not None:
+            pos = pose["pos"]
+            q = self.pos_q
+            key += (round(pos["x"] * q), round(pos["y"] * q), round(pos["z"] * q))
+        if self.angle_q is not None:
+            q = self.angle_q
+            key += (round((pose["yaw"] % 360.0) * q) % round(360.0 * q), round(pose["pitch"] * q))
+        if self.ray_q is not None:
+            q = self.ray_q
+            key += tuple(round(r * q) for r in p["rays"])
+        if self.hotbar:
+            key += tuple(p["hotbar"])
+        return key
+
+    # Drop everything decided under an older policy version
+    def Check(self, version: Any) -> None:
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+                self.entries.clear()
+            self.version = version
+
+    def Get(self, key: Tuple, now: Optional[float] = None) -> Optional[Any]:
+        e = self.entries.get(key)
+        if e is not None:
+            now = time.monotonic() if now is None else now
+            if now - e[1] <= self.ttl_s:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return e[0]
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def Put(self, key: Tuple, payload: Any, now: Optional[float] = None) -> None:
+        self.entries[key] = (payload, time.monotonic() if now is None else now)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def Stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+# How to read a policy's parameter version: a `policy_version()` callable on the
+# module/object, else a live `version` attribute on the object, else constant (None)
+def VersionOf(policy: Any) -> Callable[[], Any]:
+    fn = getattr(policy, "policy_version", None)
+    if callable(fn):
+        return fn
+    owner = getattr(policy, "__self__", policy)     # bound decide -> its policy object
+    return lambda: getattr(owner, "version", None)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+import contextlib, json, os, pathlib, threading, time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# --- policy checkpoints ------------------------------------------------------
+# A policy that supports checkpointing exposes
+#   CheckpointArrays() -> {name: ndarray}     tables with the same number of elements
+#   CheckpointState() -> dict                 JSON-able scalars (version, epsilon, rng state, ...)
+#   RestoreCheckpoint(arrays, state)          adopt resumed tables and state
+#   lock                                      held while the tables change
+#   dirty                                     set here to a DirtyBlocks; the policy Marks what it changes
+#
+# On disk, one directory per policy:
+#
+#   <name>.<k>.npy    `slots` full copies of every table (k = 0 .. slots-1)
+#   blocks.<k>.npy    the blocks the last save into slot k wrote (or was about to write)
+#   manifest.json     the last complete slot, its seq and the policy state
+#
+# Save() writes the slot after the manifest's one, so the slot the manifest names is
+# never being written: a crash mid-save leaves the previous snapshot intact. Only blocks
+# changed since that slot was last written are copied into it (each slot keeps its own
+# pending mask): the block mask is synced first, then the blocks, and the manifest is
+# replaced last (atomic rename). After a restart the other slots owe at most the blocks
+# in any slot's mask, so the first saves stay incremental too.
+# Resume() maps the manifest's slot copy-on-write as the live tables, so startup costs
+# a few mmap calls whatever the table size; pages are read in as decide() touches them.
+# (Saves only ever write a live value over a slot's block, so the copy-on-write pages
+# that haven't been written yet keep reading what the policy last saw.)
+
+MANIFEST = "manifest.json"
+FORMAT = 1
+BLOCK = 1024                    # elements per dirty-tracking block (4 KiB of float32)
+
+class DirtyBlocks:
+    """Which BLOCK-element blocks of a policy's flattened tables changed since the last Take()."""
+    def __init__(self, n_elements: int, block: int = BLOCK):
+        self.block = int(block)
+        self.mask = np.zeros(-(-int(n_elements) // self.block), dtype=bool)
+
+    # flat: element indices into the flattened tables
+    def Mark(self, flat: np.ndarray) -> None:
+        self.mask[np.asarray(flat) // self.block] = True
+
+    def Take(self) -> np.ndarray:
+        out = self.mask.copy()
+        self.mask[:] = False
+        return out
+
+# Runs of consecutive blocks in a block mask, as [start, stop) element ranges
+def BlockRuns(mask: np.ndarray, block: int, n_elements: int) -> List[Tuple[int, int]]:
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return [(int(a) * block, min(int(b) * block, n_elements)) for a, b in zip(edges[::2], edges[1::2])]
+
+# How the bridge reaches a policy's checkpoint support: the object behind the module's
+# (or object's) decide, if it implements the contract above
+def CheckpointTarget(policy: Any) -> Any:
+    decide = getattr(policy, "decide", policy)
+    owner = getattr(decide, "__self__", policy)
+    return owner if hasattr(owner, "CheckpointArrays") else None
+
+def _Fsync(path: pathlib.Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class Checkpointer:
+    """
+    Incremental snapshots of one policy's tables and state in `path`, rotated over
+    `slots` slot files (see the layout above). Save() runs off the event loop; it holds
+    the policy's lock only while copying the changed blocks out. Resume() before the
+    policy decides anything; Close() saves one last time.
+    """
+    def __init__(self, policy: Any, path, slots: int = 2, block: int = BLOCK):
+        self.policy = policy
+        self.path = pathlib.Path(path)
+        self.slots = max(2, int(slots))
+        self.block = int(block)
+        self.lock = threading.Lock()
+        arrays = policy.CheckpointArrays()
+        sizes = {a.size for a in arrays.values()}
+        if len(sizes) != 1:
+            raise ValueError("checkpointed tables must have the same number of elements")
+        self.n_elements = sizes.pop()
+        self.layout = {name: {"dtype": a.dtype.str, "shape": list(a.shape)} for name, a in arrays.items()}
+        policy.dirty = DirtyBlocks(self.n_elements, self.block)
+        nblocks = len(policy.dirty.mask)
+        # every slot owes the blocks changed since it was last written; all of them until then
+        self.pending = [np.ones(nblocks, dtype=bool) for _ in range(self.slots)]
+        self.files: List[Dict[str, np.memmap]] = [{} for _ in range(self.slots)]
+        self.slot = self.slots - 1      # the manifest's slot; the first Save() writes slot 0
+        self.seq = 0
+        self.saved_version: Any = None
+        self.closed = False
+
+    def _File(self, name: str, k: int) -> pathlib.Path:
+        return self.path / f"{name}.{k}.npy"
+
+    # The slot's tables and block mask, opened for writing on first use (created if missing)
+    def _Open(self, k: int) -> Dict[str, np.memmap]:
+        if not self.files[k]:
+            specs = dict(self.layout, blocks={"dtype": "|b1", "shape": [len(self.pending[k])]})
+            for name, spec in specs.items():
+                f = self._File(name, k)
+                mode = "r+" if f.exists() else "w+"
+                self.files[k][name] = np.lib.format.open_memmap(
+                    f, mode=mode, dtype=np.dtype(spec["dtype"]), shape=tuple(spec["shape"]))
+        return self.files[k]
+
+    # Starting without a snapshot: slot files left from an unfinished first run are
+    # dropped, and new ones start as zeros, so only blocks that aren't zero are owed
+    def _Fresh(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        for k in range(self.slots):
+            for name in list(self.layout) + ["blocks"]:
+                with contextlib.suppress(FileNotFoundError):
+                    self._File(name, k).unlink()
+        nonzero = np.zeros(len(self.pending[0]), dtype=bool)
+        full = self.n_elements // self.block
+        for a in self.policy.CheckpointArrays().values():
+            flat = a.reshape(-1)
+            nonzero[:full] |= flat[:full * self.block].reshape(full, self.block).any(axis=1)
+            if full < len(nonzero):
+                nonzero[full] |= flat[full * self.block:].any()
+        for m in self.pending:
+            m[:] = nonzero
+
+    # Adopt the last snapshot, if there is one; returns its manifest (None: starting fresh).
+    # With restore=False the policy keeps its own tables and state (they may be newer than
+    # the snapshot), and the next saves into each slot write every block.
+    def Resume(self, restore: bool = True) -> Optional[Dict[str, Any]]:
+        f = self.path / MANIFEST
+        if not f.exists():
+            self._Fresh()
+            return None
+        manifest = json.loads(f.read_text("utf-8"))
+        if manifest.get("format") != FORMAT or manifest.get("arrays") != self.layout:
+            raise ValueError(f"checkpoint at {self.path} doesn't match this policy's tables "
+                             f"({manifest.get('arrays')} vs {self.layout})")
+        k = int(manifest["slot"])
+        self.slot = k
+        self.seq = int(manifest["seq"])
+        if not restore:
+            return manifest
+        # plain ndarray views of the private mappings: skips np.memmap's per-index overhead
+        arrays = {name: np.asarray(np.load(self._File(name, k), mmap_mode="c")) for name in self.layout}
+        with self.policy.lock:
+            self.policy.RestoreCheckpoint(arrays, manifest["state"])
+            self.policy.dirty.Take()
+        self.saved_version = manifest["state"].get("version")
+        # the slot we resumed from matches the live tables; the others differ from it at
+        # most in blocks some save wrote since they were last written (any slot's mask)
+        owed = np.zeros(len(self.pending[0]), dtype=bool)
+        for j in range(self.slots):
+            try:
+                owed |= np.load(self._File("blocks", j))
+            except (FileNotFoundError, ValueError):
+                owed[:] = True
+        for j, m in enumerate(self.pending):
+            m[:] = owed if j != k else False
+        return manifest
+
+    # Write the changed blocks into the next slot, then point the manifest at it.
+    # Returns what was written, or None when nothing changed since the last save.
+    def Save(self) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            if self.closed:
+                return None
+            t0 = time.perf_counter()
+            k = (self.slot + 1) % self.slots
+            with self.policy.lock:
+                state = self.policy.CheckpointState()
+                changed = self.policy.dirty.Take()
+                for m in self.pending:
+                    m |= changed
+                if not self.pending[k].any() and state.get("version") == self.saved_version:
+                    return None
+                blocks = int(self.pending[k].sum())
+                runs = BlockRuns(self.pending[k], self.block, self.n_elements)
+                data = {name: [a.reshape(-1)[lo:hi].copy() for lo, hi in runs]
+                        for name, a in self.policy.CheckpointArrays().items()}
+            copyS = time.perf_counter() - t0
+
+            files = self._Open(k)
+            files["blocks"][:] = self.pending[k]
+            files["blocks"].flush()
+            for name, chunks in data.items():
+                flat = files[name].reshape(-1)
+                for (lo, hi), chunk in zip(runs, chunks):
+                    flat[lo:hi] = chunk
+                files[name].flush()
+            self.pending[k][:] = False
+
+            self.seq += 1
+            manifest = {
+                "format": FORMAT, "seq": self.seq, "slot": k, "slots": self.slots,
+                "saved_at": time.time(), "arrays": self.layout, "state": state,
+            }
+            tmp = self.path / (MANIFEST + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path / MANIFEST)
+            _Fsync(self.path)
+            self.slot = k
+            self.saved_version = state.get("version")
+            elements = sum(hi - lo for lo, hi in runs)
+            return {"seq": self.seq, "slot": k, "blocks": blocks,
+                    "bytes": sum(elements * np.dtype(s["dtype"]).itemsize for s in self.layout.values()),
+                    "copy_ms": copyS * 1000.0, "ms": (time.perf_counter() - t0) * 1000.0}
+
+    # Final save; later Save() calls are no-ops (the policy may be replaced by a fresh copy)
+    def Close(self) -> Optional[Dict[str, Any]]:
+        out = self.Save()
+        with self.lock:
+            self.closed = True
+            self.files = [{} for _ in range(self.slots)]
+        return out
@@ -1,18 +1,38 @@
 import asyncio
 import json
+import os
+import sys
+import time
+import pathlib
 import websockets
 from dummy import decide
 
+SRC = pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from actions.codec import DecodeMessage, EncodeMessage
+
 uri = "ws://localhost:8765"
+wire = os.getenv("AI_WIRE", "v0")   # "v1" switches observations/actions to binary frames
 
 async def run_dummy():
     async with websockets.connect(uri) as ws:
         print("[DUMMY AI] Connected to AI bridge")
 
+        # Register as a policy worker so the bridge routes observations here
+        await ws.send(json.dumps({
+            "type": "event",
+            "schema_version": "v0",
+            "timestamp": time.time(),
+            "kind": "hello",
+            "payload": {"role": "policy", "wire": wire}
+        }))
+
         async for message in ws:
             try:
-                data = json.loads(message)
-            except json.JSONDecodeError:
+                data = DecodeMessage(message)
+            except ValueError:
                 print("[DUMMY AI] Bad JSON:", message)
                 continue
 
@@ -22,7 +42,8 @@ async def run_dummy():
                 # Make a decision
                 payload = decide(data)
 
-                # Wrap decision in valid schema structure
+                # Wrap decision in valid schema structure; seq is echoed so the
+                # bridge can route the action back to the game client that asked
                 msg = {
                     "type": "action",
                     "schema_version": "v0",
@@ -31,7 +52,7 @@ async def run_dummy():
                     "payload": payload
                 }
 
-                await ws.send(json.dumps(msg))
+                await ws.send(EncodeMessage(msg, wire))
                 print("[DUMMY AI] Sent action:", msg)
 
 asyncio.run(run_dummy())
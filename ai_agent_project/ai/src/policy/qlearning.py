@@ -0,0 +1,207 @@
+from __future__ import annotations
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence
+import math, threading
+import numpy as np
+
+from actions.codec import ALLOWED
+
+# v0 payload for each discrete action. "attack" is in codec.ALLOWED but has no v0 action
+# field, so it is left out of the action set until the schema can express it.
+TURN_DEG = 15.0
+_PAYLOADS: Dict[str, Dict[str, Any]] = {
+    "noop":         {"look": {"dYaw": 0.0, "dPitch": 0.0},        "move": {"forward": 0.0, "strafe": 0.0},  "jump": False},
+    "move_forward": {"look": {"dYaw": 0.0, "dPitch": 0.0},        "move": {"forward": 1.0, "strafe": 0.0},  "jump": False},
+    "move_back":    {"look": {"dYaw": 0.0, "dPitch": 0.0},        "move": {"forward": -1.0, "strafe": 0.0}, "jump": False},
+    "turn_left":    {"look": {"dYaw": -TURN_DEG, "dPitch": 0.0},  "move": {"forward": 0.0, "strafe": 0.0},  "jump": False},
+    "turn_right":   {"look": {"dYaw": TURN_DEG, "dPitch": 0.0},   "move": {"forward": 0.0, "strafe": 0.0},  "jump": False},
+    "jump":         {"look": {"dYaw": 0.0, "dPitch": 0.0},        "move": {"forward": 1.0, "strafe": 0.0},  "jump": True},
+}
+ACTIONS: List[str] = [a for a in sorted(ALLOWED) if a in _PAYLOADS]
+
+def ActionPayload(a: int) -> Dict[str, Any]:
+    p = _PAYLOADS[ACTIONS[a]]
+    return {"look": dict(p["look"]), "move": dict(p["move"]), "jump": p["jump"]}
+
+class QLearningPolicy:
+    """
+    Tabular Q-learning over a discretised v0 observation.
+
+    State = (yaw sector, pitch band, one distance bin per ray), flattened mixed-radix
+    into a row of a contiguous (n_states, n_actions) Q array. Bin edges are fixed at
+    construction, so discretising a batch is a handful of searchsorted/arithmetic calls.
+    Act() and Update() take whole batches and touch the table with single array ops.
+    Epsilon decays linearly from `epsilon` to `epsilon_end` over `epsilon_decay_steps`
+    learned transitions (0: constant). The Q-table, visit counts and schedule can be
+    snapshotted incrementally by policy.checkpoint.
+    """
+    def __init__(
+        self,
+        yaw_bins: int = 8,
+        pitch_edges: Sequence[float] = (-30.0, 30.0),
+        ray_edges: Sequence[float] = (1.0, 2.0, 4.0),
+        n_rays: int = 3,
+        alpha: float = 0.1,
+        gamma: float = 0.95,
+        epsilon: float = 0.1,
+        seed: Optional[int] = None,
+        dtype=np.float32,
+        epsilon_end: Optional[float] = None,
+        epsilon_decay_steps: int = 0,
+    ):
+        self.yaw_bins = int(yaw_bins)
+        self.pitch_edges = np.asarray(pitch_edges, dtype=np.float64)
+        self.ray_edges = np.asarray(ray_edges, dtype=np.float64)
+        self.n_rays = int(n_rays)
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.epsilon_start = epsilon
+        self.epsilon_end = epsilon if epsilon_end is None else epsilon_end
+        self.epsilon_decay_steps = int(epsilon_decay_steps)
+        self.steps = 0                  # transitions learned
+        self.rng = np.random.default_rng(seed)
+
+        # mixed-radix layout: [yaw, pitch, ray_0 .. ray_{n-1}]
+        radix = [self.yaw_bins, len(self.pitch_edges) + 1] + [len(self.ray_edges) + 1] * self.n_rays
+        self.radix = np.asarray(radix, dtype=np.int64)
+        self.strides = np.concatenate([np.cumprod(self.radix[::-1])[::-1][1:], [1]]).astype(np.int64)
+        self.n_states = int(np.prod(self.radix))
+        self.n_actions = len(ACTIONS)
+        self.q = np.zeros((self.n_states, self.n_actions), dtype=dtype)
+        self.visits = np.zeros((self.n_states, self.n_actions), dtype=np.uint32)
+        self.version = 0                # bumped by every Update(); policy.cache drops stale decisions
+        self.lock = threading.Lock()    # held by Update(); checkpoints copy the tables under it
+        self.dirty = None               # policy.checkpoint.DirtyBlocks once a Checkpointer is attached
+
+        # plain-Python copies for the scalar path (cheaper than numpy on one value)
+        self._pitch_list = self.pitch_edges.tolist()
+        self._ray_list = self.ray_edges.tolist()
+        self._stride_list = self.strides.tolist()
+
+    # --- discretisation -------------------------------------------------------
+    def StateIndex(self, yaw: np.ndarray, pitch: np.ndarray, rays: np.ndarray) -> np.ndarray:
+        """yaw, pitch: (N,); rays: (N, >= n_rays) with missing rays padded. Returns (N,) int64."""
+        yaw_bin = (np.mod(yaw, 360.0) * (self.yaw_bins / 360.0)).astype(np.int64)
+        np.minimum(yaw_bin, self.yaw_bins - 1, out=yaw_bin)
+        idx = yaw_bin * self.strides[0]
+        idx += np.searchsorted(self.pitch_edges, pitch, side="right") * self.strides[1]
+        ray_bins = np.searchsorted(self.ray_edges, rays[:, :self.n_rays], side="right")
+        idx += ray_bins @ self.strides[2:]
+        return idx
+
+    def StateOf(self, obs: Dict[str, Any]) -> int:
+        p = obs["payload"]
+        pose = p["pose"]
+        rays = p["rays"]
+        yaw_bin = min(int((pose["yaw"] % 360.0) * (self.yaw_bins / 360.0)), self.yaw_bins - 1)
+        s = yaw_bin * self._stride_list[0] + bisect_right(self._pitch_list, pose["pitch"]) * self._stride_list[1]
+        for i in range(self.n_rays):
+            r = rays[i] if i < len(rays) else math.inf
+            s += bisect_right(self._ray_list, r) * self._stride_list[2 + i]
+        return s
+
+    def StatesOf(self, obs_list: List[Dict[str, Any]]) -> np.ndarray:
+        n = len(obs_list)
+        yaw = np.empty(n)
+        pitch = np.empty(n)
+        rays = np.full((n, self.n_rays), np.inf)
+        for i, obs in enumerate(obs_list):
+            p = obs["payload"]
+            yaw[i] = p["pose"]["yaw"]
+            pitch[i] = p["pose"]["pitch"]
+            r = p["rays"][:self.n_rays]
+            rays[i, :len(r)] = r
+        return self.StateIndex(yaw, pitch, rays)
+
+    # --- acting / learning ----------------------------------------------------
+    def Act(self, states: np.ndarray, greedy: bool = False) -> np.ndarray:
+        actions = self.q[states].argmax(axis=1)
+        if not greedy and self.epsilon > 0:
+            explore = self.rng.random(len(states)) < self.epsilon
+            n = int(explore.sum())
+            if n:
+                actions[explore] = self.rng.integers(0, self.n_actions, n)
+        return actions
+
+    def Update(self, s: np.ndarray, a: np.ndarray, r: np.ndarray, s2: np.ndarray, done: np.ndarray) -> np.ndarray:
+        """
+        One TD(0) step for a batch of transitions. Every target is computed against the
+        same table snapshot; repeated (s, a) pairs move by alpha * their mean TD error so a
+        large batch can't overshoot. Returns the per-transition TD errors.
+        """
+        with self.lock:
+            target = r + self.gamma * (1.0 - done) * self.q[s2].max(axis=1)
+            td = target - self.q[s, a]
+            flat = s * self.n_actions + a
+            cells, inv, counts = np.unique(flat, return_inverse=True, return_counts=True)
+            step = np.bincount(inv, weights=td) * (self.alpha / counts)
+            self.q.reshape(-1)[cells] += step.astype(self.q.dtype, copy=False)
+            self.visits.reshape(-1)[cells] += counts.astype(np.uint32)
+            if self.dirty is not None:
+                self.dirty.Mark(cells)
+            self.steps += len(flat)
+            self.epsilon = self.EpsilonAt(self.steps)
+            self.version += 1
+        return td
+
+    def EpsilonAt(self, steps: int) -> float:
+        if self.epsilon_decay_steps <= 0:
+            return self.epsilon
+        frac = min(1.0, steps / self.epsilon_decay_steps)
+        return self.epsilon_start + (self.epsilon_end - self.epsilon_start) * frac
+
+    # --- checkpoint contract (policy.checkpoint) --------------------------------
+    def CheckpointArrays(self) -> Dict[str, np.ndarray]:
+        return {"q": self.q, "visits": self.visits}
+
+    def CheckpointState(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "steps": self.steps,
+            "epsilon": self.epsilon,
+            "epsilon_start": self.epsilon_start,
+            "epsilon_end": self.epsilon_end,
+            "epsilon_decay_steps": self.epsilon_decay_steps,
+            "rng": self.rng.bit_generator.state,
+        }
+
+    def RestoreCheckpoint(self, arrays: Dict[str, np.ndarray], state: Dict[str, Any]) -> None:
+        self.q = arrays["q"]
+        self.visits = arrays["visits"]
+        self.version = state["version"]
+        self.steps = state["steps"]
+        self.epsilon_start = state["epsilon_start"]
+        self.epsilon_end = state["epsilon_end"]
+        self.epsilon_decay_steps = state["epsilon_decay_steps"]
+        self.epsilon = state["epsilon"]
+        self.rng.bit_generator.state = state["rng"]
+
+    # --- decide contract used by PolicyWorker / BatchScheduler -----------------
+    def decide(self, obs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.epsilon > 0 and self.rng.random() < self.epsilon:
+            a = int(self.rng.integers(0, self.n_actions))
+        else:
+            a = int(self.q[self.StateOf(obs)].argmax())
+        return ActionPayload(a)
+
+    def decide_batch(self, obs_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not obs_list:
+            return []
+        return [ActionPayload(a) for a in self.Act(self.StatesOf(obs_list)).tolist()]
+
+# Exploration reward for online learning: horizontal progress, minus a penalty for
+# hugging a wall (shortest forward ray under half a block)
+def Reward(obs: Dict[str, Any], next_obs: Dict[str, Any]) -> float:
+    a = obs["payload"]["pose"]["pos"]
+    b = next_obs["payload"]["pose"]["pos"]
+    moved = math.hypot(b["x"] - a["x"], b["z"] - a["z"])
+    return moved - (0.5 if min(next_obs["payload"]["rays"]) < 0.5 else 0.0)
+
+# Default instance so `policy.qlearning` can be named as policy.entry
+POLICY = QLearningPolicy()
+decide = POLICY.decide
+decide_batch = POLICY.decide_batch
+
+def policy_version() -> int:
+    return POLICY.version
@@ -0,0 +1,177 @@
+# Offline replay of a recorded trajectory (see training/trajectory.py)
+#   python ai/src/training/playback.py data/trajectories decide [--entry policy.qlearning] [--batch 64]
+#   python ai/src/training/playback.py data/trajectories bridge [--url ws://localhost:8765] [--speed 1.0]
+#
+# --speed 1 replays at recorded wall-clock pace, 2 at double speed, 0 as fast as possible.
+from __future__ import annotations
+import argparse, asyncio, contextlib, json, sys, time, pathlib as _pathlib
+from typing import Any, Dict, List
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from training.trajectory import TrajectoryReader, KIND_OBSERVATION, FLAG_BINARY, FrameOf
+from actions.codec import DecodeMessage
+from actions.voxels import VoxelDecoder
+from features.extract import FeatureExtractor, WantsFeatures, PolicyInput, PolicyBatchInput
+
+# Sleep until the recording's clock (scaled by speed) catches up with record time t
+class Pacer:
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.t0 = None
+        self.start = 0.0
+
+    async def Wait(self, t: float) -> None:
+        if self.speed <= 0:
+            return
+        if self.t0 is None:
+            self.t0, self.start = t, time.perf_counter()
+            return
+        delay = (t - self.t0) / self.speed - (time.perf_counter() - self.start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def _Decode(kind: int, frame, voxels=None) -> Dict[str, Any]:
+    if kind & FLAG_BINARY:
+        return DecodeMessage(bytes(frame), voxels)
+    return json.loads(str(frame, "utf-8"))
+
+# Stream observations straight into the policy, no bridge or sockets involved
+async def RunDecide(reader: TrajectoryReader, entry: str, batch: int, speed: float, frames: int = 4) -> dict:
+    from app.executors import LoadPolicy
+    from policy.batch import AsBatch
+    policy = LoadPolicy(entry)
+    decide = getattr(policy, "decide", policy)
+    decideBatch = AsBatch(policy)
+    wants = WantsFeatures(policy)
+    extractors: Dict[int, FeatureExtractor] = {}
+    voxels: Dict[int, VoxelDecoder] = {}      # grid deltas chain per recorded connection
+
+    pacer = Pacer(speed)
+    pending: List[Dict[str, Any]] = []
+    n = errors = 0
+    decodeS = decideS = 0.0
+    t0 = time.perf_counter()
+    for t, kind, conn, frame in reader.Records({KIND_OBSERVATION}):
+        await pacer.Wait(t)
+        d0 = time.perf_counter()
+        vox = voxels.get(conn)
+        if vox is None:
+            vox = voxels[conn] = VoxelDecoder(slots=batch + 1)
+        obs = _Decode(kind, frame, vox)
+        if wants:
+            ex = extractors.get(conn)
+            if ex is None:
+                # a pending batch holds up to `batch` views of this connection's stack
+                ex = extractors[conn] = FeatureExtractor(frames, slack=batch + 1)
+            obs["features"] = ex.Push(obs)
+        d1 = time.perf_counter()
+        decodeS += d1 - d0
+        if batch <= 1:
+            try:
+                decide(PolicyInput(obs, wants))
+            except Exception:
+                errors += 1
+            decideS += time.perf_counter() - d1
+            n += 1
+            continue
+        pending.append(obs)
+        if len(pending) >= batch:
+            out = decideBatch(PolicyBatchInput(pending, wants))
+            decideS += time.perf_counter() - d1
+            errors += sum(isinstance(o, Exception) for o in out)
+            n += len(pending)
+            pending = []
+    if pending:
+        d1 = time.perf_counter()
+        out = decideBatch(PolicyBatchInput(pending, wants))
+        decideS += time.perf_counter() - d1
+        errors += sum(isinstance(o, Exception) for o in out)
+        n += len(pending)
+
+    wall = time.perf_counter() - t0
+    return {
+        "mode": "decide",
+        "entry": entry,
+        "observations": n,
+        "errors": errors,
+        "wall_s": wall,
+        "obs_per_s": n / wall if wall else 0.0,
+        "decode_us": decodeS / n * 1e6 if n else 0.0,
+        "decide_us": decideS / n * 1e6 if n else 0.0,
+    }
+
+# Re-open one game connection per recorded connection and send its frames as recorded
+async def RunBridge(reader: TrajectoryReader, url: str, speed: float) -> dict:
+    import websockets
+    socks: Dict[int, Any] = {}
+    drains = []
+    counts = {"sent": 0, "acks": 0, "actions": 0, "mismatches": 0}
+
+    async def Drain(ws):
+        with contextlib.suppress(websockets.ConnectionClosed):
+            async for m in ws:
+                try:
+                    msg = DecodeMessage(m)
+                except ValueError:
+                    continue
+                if msg.get("type") == "action":
+                    counts["actions"] += 1
+                elif msg.get("kind") == "ack":
+                    counts["acks"] += 1
+                elif msg.get("kind") == "schema_mismatch":
+                    counts["mismatches"] += 1
+
+    pacer = Pacer(speed)
+    t0 = time.perf_counter()
+    sendS = 0.0
+    try:
+        for t, kind, conn, frame in reader.Records({KIND_OBSERVATION}):
+            ws = socks.get(conn)
+            if ws is None:
+                ws = socks[conn] = await websockets.connect(url, max_size=None)
+                if kind & FLAG_BINARY:
+                    await ws.send(json.dumps({
+                        "type": "event", "schema_version": "v0", "timestamp": time.time(),
+                        "kind": "hello", "payload": {"role": "game", "wire": "v1"},
+                    }))
+                drains.append(asyncio.create_task(Drain(ws)))
+            await pacer.Wait(t)
+            await ws.send(FrameOf(kind, frame))
+            counts["sent"] += 1
+        sendS = time.perf_counter() - t0
+        # give the bridge a moment to answer the tail of the recording
+        await asyncio.sleep(0.5)
+    finally:
+        for ws in socks.values():
+            await ws.close()
+        with contextlib.suppress(Exception):
+            await asyncio.gather(*drains, return_exceptions=True)
+
+    return {"mode": "bridge", "url": url, "connections": len(socks), "send_s": sendS,
+            "obs_per_s": counts["sent"] / sendS if sendS else 0.0, **counts}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path", help="trajectory directory (trajectory.path in the config)")
+    ap.add_argument("mode", choices=["decide", "bridge"])
+    ap.add_argument("--entry", default="policy.dummy", help="policy for decide mode, as policy.entry")
+    ap.add_argument("--batch", type=int, default=1, help="decide mode: observations per decide_batch call")
+    ap.add_argument("--frames", type=int, default=4, help="decide mode: feature stack depth for wants_features policies")
+    ap.add_argument("--url", default="ws://localhost:8765")
+    ap.add_argument("--speed", type=float, default=0.0, help="1 = recorded pace, 0 = as fast as possible")
+    args = ap.parse_args()
+
+    reader = TrajectoryReader(args.path)
+    records = len(reader)
+    try:
+        if args.mode == "decide":
+            result = asyncio.run(RunDecide(reader, args.entry, args.batch, args.speed, args.frames))
+        else:
+            result = asyncio.run(RunBridge(reader, args.url, args.speed))
+    finally:
+        reader.Close()
+    result["records"] = records
+    print(json.dumps(result, indent=2))
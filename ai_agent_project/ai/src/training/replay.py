@@ -0,0 +1,259 @@
+from __future__ import annotations
+import json, os, pathlib
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+
+# Column layout of one transition (struct-of-arrays, one preallocated array per field)
+N_RAYS = 5
+HOTBAR_SLOTS = 9
+COLUMNS = {
+    "pose":        (np.float32, (5,)),               # x, y, z, yaw, pitch
+    "rays":        (np.float32, (N_RAYS,)),          # unused rays = 0
+    "nrays":       (np.uint8,   ()),
+    "hotbar":      (np.int32,   (HOTBAR_SLOTS,)),    # interned item ids, 0 = empty slot
+    "action":      (np.float32, (5,)),               # dYaw, dPitch, forward, strafe, jump
+    "reward":      (np.float32, ()),
+    "next_pose":   (np.float32, (5,)),
+    "next_rays":   (np.float32, (N_RAYS,)),
+    "next_nrays":  (np.uint8,   ()),
+    "next_hotbar": (np.int32,   (HOTBAR_SLOTS,)),
+    "done":        (np.uint8,   ()),
+    "priority":    (np.float64, ()),                 # kept so the sum-tree can be rebuilt on load
+}
+
+class SumTree:
+    """
+    Binary sum-tree over `capacity` leaves in one flat array (root at 1, leaves at
+    [size, 2*size)). Set() and Find() take index/mass arrays and walk the tree one
+    level at a time for the whole batch, so both are O(batch * log capacity).
+    """
+    def __init__(self, capacity: int):
+        self.size = 1 << max(0, int(capacity) - 1).bit_length()
+        self.depth = self.size.bit_length() - 1
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+        self._shifts = np.arange(self.depth + 1, dtype=np.int64)
+
+    def Total(self) -> float:
+        return float(self.tree[1])
+
+    def Get(self, idx: np.ndarray) -> np.ndarray:
+        return self.tree[np.asarray(idx) + self.size]
+
+    def Set(self, idx: np.ndarray, prio: np.ndarray) -> None:
+        pos = np.asarray(idx, dtype=np.int64) + self.size
+        self.tree[pos] = prio
+        if self.depth == 0:
+            return
+        pos = np.unique(pos >> 1)
+        while True:
+            self.tree[pos] = self.tree[2 * pos] + self.tree[2 * pos + 1]
+            if pos[0] == 1:
+                break
+            pos = np.unique(pos >> 1)
+
+    # Single leaf: add the delta along its root path in one fancy-indexed op
+    def SetOne(self, idx: int, prio: float) -> None:
+        leaf = idx + self.size
+        delta = prio - self.tree[leaf]
+        self.tree[leaf >> self._shifts] += delta
+
+    def Rebuild(self, prio: np.ndarray) -> None:
+        self.tree[:] = 0.0
+        self.tree[self.size:self.size + len(prio)] = prio
+        for lvl in range(self.depth - 1, -1, -1):
+            lo, hi = 1 << lvl, 1 << (lvl + 1)
+            self.tree[lo:hi] = self.tree[2 * lo:2 * hi:2] + self.tree[2 * lo + 1:2 * hi:2]
+
+    # Leaf index whose cumulative-priority interval contains each mass
+    def Find(self, mass: np.ndarray) -> np.ndarray:
+        mass = np.array(mass, dtype=np.float64)
+        pos = np.ones(len(mass), dtype=np.int64)
+        for _ in range(self.depth):
+            left = self.tree[2 * pos]
+            right = mass >= left
+            mass -= np.where(right, left, 0.0)
+            pos = 2 * pos + right
+        return pos - self.size
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring of transitions in preallocated numpy columns (see COLUMNS).
+    With `path`, every column is an np.memmap'd .npy file plus a small meta.json, so a
+    multi-million transition buffer lives in the page cache rather than the heap and
+    is picked up again after a restart. `prioritized` adds a sum-tree for proportional
+    sampling; uniform sampling is always available.
+    """
+    def __init__(self, capacity: int, path: Optional[str] = None, prioritized: bool = False,
+                 alpha: float = 0.6, beta: float = 0.4, eps: float = 1e-3, seed: Optional[int] = None):
+        self.capacity = int(capacity)
+        self.path = pathlib.Path(path) if path else None
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.cursor = 0
+        self.max_prio = 1.0
+        self.items: Dict[str, int] = {}
+
+        meta = self._OpenColumns()
+        if meta:
+            self.size, self.cursor = meta["size"], meta["cursor"]
+            self.max_prio = meta.get("max_prio", 1.0)
+            self.items = meta.get("items", {})
+
+        self.tree = SumTree(self.capacity) if prioritized else None
+        if self.tree is not None and self.size:
+            self.tree.Rebuild(self.cols["priority"][:self.size])
+
+    def _OpenColumns(self) -> Optional[Dict[str, Any]]:
+        self.cols: Dict[str, np.ndarray] = {}
+        self.maps: list = []
+        meta = None
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            metaFile = self.path / "meta.json"
+            if metaFile.exists():
+                meta = json.loads(metaFile.read_text("utf-8"))
+                if meta.get("capacity") != self.capacity:
+                    raise ValueError(f"replay buffer at {self.path} has capacity {meta.get('capacity')}, not {self.capacity}")
+        for name, (dtype, shape) in COLUMNS.items():
+            full = (self.capacity,) + shape
+            if self.path is None:
+                self.cols[name] = np.zeros(full, dtype=dtype)
+                continue
+            f = self.path / f"{name}.npy"
+            mode = "r+" if (meta and f.exists()) else "w+"
+            mm = np.lib.format.open_memmap(f, mode=mode, dtype=dtype, shape=full)
+            self.maps.append(mm)
+            # plain ndarray view of the same pages: skips np.memmap's per-index overhead
+            self.cols[name] = np.asarray(mm)
+        return meta
+
+    def __len__(self) -> int:
+        return self.size
+
+    def ItemId(self, item: Optional[str]) -> int:
+        if item is None:
+            return 0
+        i = self.items.get(item)
+        if i is None:
+            i = self.items[item] = len(self.items) + 1
+        return i
+
+    def _WriteObs(self, i: int, obs: Dict[str, Any], prefix: str) -> None:
+        p = obs["payload"]
+        pose = p["pose"]
+        pos = pose["pos"]
+        self.cols[prefix + "pose"][i] = (pos["x"], pos["y"], pos["z"], pose["yaw"], pose["pitch"])
+        rays = p["rays"][:N_RAYS]
+        row = self.cols[prefix + "rays"][i]
+        row[:len(rays)] = rays
+        row[len(rays):] = 0.0
+        self.cols[prefix + "nrays"][i] = len(rays)
+        self.cols[prefix + "hotbar"][i] = [self.ItemId(h) for h in p["hotbar"][:HOTBAR_SLOTS]]
+
+    # O(1): a few row writes into the preallocated columns, no per-transition objects kept
+    def Add(self, obs: Dict[str, Any], action: Dict[str, Any], reward: float,
+            next_obs: Dict[str, Any], done: bool = False) -> int:
+        i = self.cursor
+        self._WriteObs(i, obs, "")
+        self._WriteObs(i, next_obs, "next_")
+        look, move = action["look"], action["move"]
+        self.cols["action"][i] = (look["dYaw"], look["dPitch"], move["forward"], move["strafe"], 1.0 if action["jump"] else 0.0)
+        self.cols["reward"][i] = reward
+        self.cols["done"][i] = 1 if done else 0
+        self.cols["priority"][i] = self.max_prio
+        if self.tree is not None:
+            self.tree.SetOne(i, self.max_prio)
+
+        self.cursor = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    def Gather(self, idx: np.ndarray) -> Dict[str, np.ndarray]:
+        return {name: col[idx] for name, col in self.cols.items() if name != "priority"}
+
+    def SampleUniform(self, batch: int) -> Dict[str, np.ndarray]:
+        if self.size == 0:
+            raise ValueError("replay buffer is empty")
+        idx = self.rng.integers(0, self.size, batch)
+        out = self.Gather(idx)
+        out["index"] = idx
+        out["weight"] = np.ones(batch, dtype=np.float32)
+        return out
+
+    # Stratified proportional sampling through the sum-tree, with importance weights
+    def Sample(self, batch: int) -> Dict[str, np.ndarray]:
+        if self.tree is None:
+            return self.SampleUniform(batch)
+        if self.size == 0:
+            raise ValueError("replay buffer is empty")
+        total = self.tree.Total()
+        seg = total / batch
+        mass = (np.arange(batch) + self.rng.random(batch)) * seg
+        np.minimum(mass, np.nextafter(total, 0.0), out=mass)
+        idx = np.minimum(self.tree.Find(mass), self.size - 1)
+        prob = self.tree.Get(idx) / total
+        weight = (self.size * np.maximum(prob, 1e-12)) ** (-self.beta)
+        out = self.Gather(idx)
+        out["index"] = idx
+        out["weight"] = (weight / weight.max()).astype(np.float32)
+        return out
+
+    def UpdatePriorities(self, idx: np.ndarray, td: np.ndarray) -> None:
+        prio = (np.abs(td) + self.eps) ** self.alpha
+        self.cols["priority"][idx] = prio
+        self.max_prio = max(self.max_prio, float(prio.max()))
+        if self.tree is not None:
+            self.tree.Set(idx, prio)
+
+    # Persist memmap pages and meta.json (atomic rename); call off the event loop
+    def Flush(self) -> None:
+        if self.path is None:
+            return
+        for mm in self.maps:
+            mm.flush()
+        meta = {"capacity": self.capacity, "size": self.size, "cursor": self.cursor,
+                "max_prio": self.max_prio, "items": self.items}
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta), "utf-8")
+        os.replace(tmp, self.path / "meta.json")
+
+class ReplayRecorder:
+    """
+    Per-connection feed from the bridge: Observe() each validated observation and
+    Acted() each action chosen for it; the observation the action names (obs_seq) and
+    the one that follows it make one (obs, action, reward, next_obs) transition.
+    Observations newer than the one decided on may arrive before the action does, so
+    the last `keep` are held by seq.
+    """
+    def __init__(self, buffer: ReplayBuffer, reward_fn: Callable[[Dict[str, Any], Dict[str, Any]], float], keep: int = 8):
+        self.buffer = buffer
+        self.reward_fn = reward_fn
+        self.keep = max(2, int(keep))
+        self.recent: Dict[int, Dict[str, Any]] = {}     # seq -> observation, oldest first
+        self.acted_seq = -1                             # last observation a transition was taken from
+        self.pending: Optional[tuple] = None            # (obs, action payload) waiting for its next_obs
+
+    def Observe(self, obs: Dict[str, Any], raw: Any = None) -> None:
+        if self.pending is not None:
+            prev, action = self.pending
+            self.buffer.Add(prev, action, self.reward_fn(prev, obs), obs)
+            self.pending = None
+        self.recent[int(obs["seq"])] = obs
+        while len(self.recent) > self.keep:
+            del self.recent[next(iter(self.recent))]
+
+    def Acted(self, action: Dict[str, Any]) -> None:
+        seq = action.get("obs_seq")
+        if seq is None or seq <= self.acted_seq or seq not in self.recent:
+            return
+        self.acted_seq = seq
+        obs = self.recent[seq]
+        after = next((o for s, o in self.recent.items() if s > seq), None)
+        if after is not None:
+            self.buffer.Add(obs, action["payload"], self.reward_fn(obs, after), after)
+        else:
+            self.pending = (obs, action["payload"])
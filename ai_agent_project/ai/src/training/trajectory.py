@@ -0,0 +1,148 @@
+from __future__ import annotations
+import itertools, json, mmap, pathlib, struct, threading, time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+from actions.codec import WithoutLocal
+
+# Segmented, append-only trajectory log.
+#
+#   <dir>/seg-000000.log   magic + records: <IdBI len, wall time, kind, conn> + frame bytes
+#   <dir>/seg-000000.idx   one fixed 25-byte entry per record: <QIdBI offset + the same fields
+#
+# Frames are stored exactly as they crossed the bridge (JSON text or v1 binary), so a
+# reader can hand them back to the bridge, or decode them, without re-encoding.
+
+MAGIC = b"TRJLOG1\n"
+KIND_OBSERVATION = 1
+KIND_ACTION = 2
+FLAG_BINARY = 0x80
+
+_REC = struct.Struct("<IdBI")
+_IDX = struct.Struct("<QIdBI")
+IDX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("t", "<f8"), ("kind", "u1"), ("conn", "<u4")])
+assert IDX_DTYPE.itemsize == _IDX.size
+
+def _SegName(n: int, ext: str) -> str:
+    return f"seg-{n:06d}.{ext}"
+
+class TrajectoryRecorder:
+    """
+    Appends frames to the current segment and rolls to a new one past segment_bytes.
+    Record() only copies into the files' userspace buffers; Flush() (run it off the
+    event loop) pushes them to the OS. Writes are serialised with a lock so Flush can
+    run on an executor thread while the loop keeps recording.
+    """
+    def __init__(self, path: str, segment_bytes: int = 64 << 20, buffer_bytes: int = 1 << 20):
+        self.dir = pathlib.Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = int(segment_bytes)
+        self.buffer_bytes = int(buffer_bytes)
+        self.lock = threading.Lock()
+        self._conn_ids = itertools.count()
+        existing = sorted(self.dir.glob("seg-*.log"))
+        self.seg = int(existing[-1].stem.split("-")[1]) + 1 if existing else 0
+        self.log = self.idx = None
+        self._Open()
+
+    def _Open(self) -> None:
+        self.log = open(self.dir / _SegName(self.seg, "log"), "wb", buffering=self.buffer_bytes)
+        self.idx = open(self.dir / _SegName(self.seg, "idx"), "wb", buffering=self.buffer_bytes)
+        self.log.write(MAGIC)
+        self.offset = len(MAGIC)
+
+    def NewConnection(self) -> int:
+        return next(self._conn_ids)
+
+    def Record(self, kind: int, conn: int, frame: Union[str, bytes], t: Optional[float] = None) -> None:
+        if isinstance(frame, str):
+            data = frame.encode("utf-8")
+        else:
+            data = bytes(frame)
+            kind |= FLAG_BINARY
+        t = time.time() if t is None else t
+        with self.lock:
+            if self.offset + _REC.size + len(data) > self.segment_bytes and self.offset > len(MAGIC):
+                self._Roll()
+            self.log.write(_REC.pack(len(data), t, kind, conn))
+            self.log.write(data)
+            self.idx.write(_IDX.pack(self.offset, len(data), t, kind, conn))
+            self.offset += _REC.size + len(data)
+
+    def _Roll(self) -> None:
+        self.log.close()
+        self.idx.close()
+        self.seg += 1
+        self._Open()
+
+    def Flush(self) -> None:
+        with self.lock:
+            self.log.flush()
+            self.idx.flush()
+
+    def Close(self) -> None:
+        with self.lock:
+            self.log.close()
+            self.idx.close()
+
+class ConnectionLog:
+    """Per-connection hooks (same shape as training.replay.ReplayRecorder)."""
+    def __init__(self, recorder: TrajectoryRecorder):
+        self.recorder = recorder
+        self.conn = recorder.NewConnection()
+
+    def Observe(self, obs: Dict[str, Any], raw: Union[str, bytes, None] = None) -> None:
+        if raw is None:
+            # in-process observations arrive as dicts, possibly with their own feature/voxel views
+            raw = json.dumps(WithoutLocal(obs))
+        self.recorder.Record(KIND_OBSERVATION, self.conn, raw)
+
+    def Acted(self, msg: Dict[str, Any]) -> None:
+        self.recorder.Record(KIND_ACTION, self.conn, json.dumps(msg))
+
+class TrajectoryReader:
+    """
+    Memory-maps every segment and its index. Records() yields
+    (t, kind, conn, frame) with `frame` a memoryview into the mapped log, so scanning
+    a recording copies nothing until a frame is actually used.
+    """
+    def __init__(self, path: str):
+        self.dir = pathlib.Path(path)
+        self.segments: List[Tuple[mmap.mmap, np.ndarray]] = []
+        for logFile in sorted(self.dir.glob("seg-*.log")):
+            idxFile = logFile.with_suffix(".idx")
+            if not idxFile.exists() or logFile.stat().st_size <= len(MAGIC):
+                continue
+            with open(logFile, "rb") as f:
+                log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if log[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{logFile} is not a trajectory segment")
+            raw = idxFile.read_bytes()
+            idx = np.frombuffer(raw, dtype=IDX_DTYPE, count=len(raw) // _IDX.size)
+            # a crash can leave index entries past the log's flushed end; ignore them
+            end = idx["offset"] + _REC.size + idx["length"]
+            self.segments.append((log, idx[end <= len(log)]))
+
+    def __len__(self) -> int:
+        return sum(len(idx) for _, idx in self.segments)
+
+    def Index(self) -> np.ndarray:
+        return np.concatenate([idx for _, idx in self.segments]) if self.segments else np.zeros(0, IDX_DTYPE)
+
+    def Records(self, kinds: Optional[set] = None) -> Iterator[Tuple[float, int, int, memoryview]]:
+        for log, idx in self.segments:
+            view = memoryview(log)
+            for off, ln, t, kind, conn in idx.tolist():
+                if kinds is not None and (kind & ~FLAG_BINARY) not in kinds:
+                    continue
+                start = off + _REC.size
+                yield t, kind, conn, view[start:start + ln]
+
+    def Close(self) -> None:
+        for log, _ in self.segments:
+            log.close()
+        self.segments = []
+
+# Frame payload as the bridge would receive it: str for JSON records, bytes for v1
+def FrameOf(kind: int, frame: memoryview) -> Union[str, bytes]:
+    return bytes(frame) if kind & FLAG_BINARY else str(frame, "utf-8")
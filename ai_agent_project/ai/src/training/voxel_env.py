@@ -0,0 +1,233 @@
+from __future__ import annotations
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from actions.codec import LOOK_LIMIT, MOVE_LIMIT
+
+# Action array columns, as in the replay buffer's "action" column
+A_DYAW, A_DPITCH, A_FORWARD, A_STRAFE, A_JUMP = range(5)
+
+# Per game tick, Minecraft units (blocks, blocks/tick)
+WALK_SPEED = 0.2158
+JUMP_VELOCITY = 0.42
+GRAVITY = 0.08
+DRAG = 0.98
+EYE_HEIGHT = 1.62
+STEP_HEIGHT = 0.6                   # ledges up to this high are walked onto; higher ones block
+PITCH_LIMIT = 90.0
+LOOK_SCALE = 0.15                   # Entity.turn(): the client applies dYaw/dPitch * 0.15 degrees
+
+BLOCK_SOLID = 1                     # Grid() ids: AIR (0) or this
+HOTBAR_ITEMS = ["minecraft:stone", "minecraft:dirt", "minecraft:oak_planks", "minecraft:cobblestone",
+                "minecraft:torch", "minecraft:bread", "minecraft:wooden_pickaxe", "minecraft:stone_sword"]
+
+# Smooth random terrain: integer column heights in [0, max_height]
+def Heightmap(size: int, max_height: int, rng: np.random.Generator, waves: int = 6) -> np.ndarray:
+    x = np.arange(size, dtype=np.float64)
+    h = np.zeros((size, size))
+    for _ in range(waves):
+        fx, fz = rng.uniform(0.5, 4.0, 2) * (2 * np.pi / size)
+        px, pz = rng.uniform(0, 2 * np.pi, 2)
+        h += np.sin(fx * x + px)[:, None] * np.cos(fz * x + pz)[None, :]
+    h -= h.min()
+    h *= max_height / max(h.max(), 1e-9)
+    return np.floor(h).astype(np.int16)
+
+# Pack v0 action payloads into an (N, 5) array
+def ActionArrays(payloads: Sequence[Dict[str, Any]]) -> np.ndarray:
+    out = np.empty((len(payloads), 5), dtype=np.float32)
+    for i, p in enumerate(payloads):
+        look, move = p["look"], p["move"]
+        out[i] = (look["dYaw"], look["dPitch"], move["forward"], move["strafe"], 1.0 if p.get("jump") else 0.0)
+    return out
+
+# Same limits as actions.codec.ClampAction, applied to a whole batch in place
+def ClampActions(a: np.ndarray) -> np.ndarray:
+    np.clip(a[:, A_DYAW:A_DPITCH + 1], -LOOK_LIMIT, LOOK_LIMIT, out=a[:, A_DYAW:A_DPITCH + 1])
+    np.clip(a[:, A_FORWARD:A_STRAFE + 1], -MOVE_LIMIT, MOVE_LIMIT, out=a[:, A_FORWARD:A_STRAFE + 1])
+    a[:, A_JUMP] = a[:, A_JUMP] > 0.5
+    return a
+
+class VoxelEnv:
+    """
+    Headless stand-in for the game: N players on one voxel heightmap, stepped in
+    lockstep. Column (x, z) is solid below heights[x, z]; the world edge is a wall.
+
+    One Step() is one observation interval of the live client (ticks_per_step game
+    ticks, 10 by default as in BotMod): look is applied once (scaled like
+    Entity.turn), then walking, jumping, gravity and collision run per tick for every
+    player at once. Rays are marched from the eye at yaw offsets `ray_spread` degrees
+    apart and report the distance to the first solid voxel (max_dist if none).
+
+    State is kept as arrays (pos, yaw, pitch, rays) so vectorised policies -- e.g.
+    QLearningPolicy.StateIndex -- never touch a dict; Observations() builds the exact v0
+    observation messages for everything else. Reward mirrors policy.qlearning.Reward;
+    episodes end after episode_steps and those players respawn.
+    """
+    def __init__(self, n: int = 256, n_rays: int = 3, size: int = 128, max_height: int = 6,
+                 ticks_per_step: int = 10, max_dist: float = 8.0, ray_step: float = 0.25,
+                 ray_spread: float = 30.0, episode_steps: int = 200, seed: Optional[int] = None):
+        if not 3 <= n_rays <= 5:
+            raise ValueError("v0 observations carry 3-5 rays")
+        self.n = int(n)
+        self.n_rays = int(n_rays)
+        self.size = int(size)
+        self.ticks = int(ticks_per_step)
+        self.max_dist = float(max_dist)
+        self.episode_steps = int(episode_steps)
+        self.rng = np.random.default_rng(seed)
+        self.heights = Heightmap(self.size, max_height, self.rng)
+        # one-column wall around the map, so lookups only need a clip
+        self.hmap = np.pad(self.heights, 1, constant_values=max_height + 64)
+
+        # ray march samples and per-ray yaw offsets, centred on the view direction
+        self.t = np.arange(1, int(self.max_dist / ray_step) + 1, dtype=np.float32) * np.float32(ray_step)
+        self.ray_yaw = (np.arange(self.n_rays) - (self.n_rays - 1) / 2.0) * ray_spread
+
+        self.pos = np.zeros((self.n, 3))
+        self.vy = np.zeros(self.n)
+        self.on_ground = np.ones(self.n, dtype=bool)
+        self.yaw = np.zeros(self.n)
+        self.pitch = np.zeros(self.n)
+        self.rays = np.zeros((self.n, self.n_rays), dtype=np.float32)
+        self.steps = np.zeros(self.n, dtype=np.int64)
+        self.seq = np.zeros(self.n, dtype=np.int64)
+        self.hotbar: List[List[Optional[str]]] = [[None] * 9 for _ in range(self.n)]
+        self.Reset()
+
+    # --- world queries --------------------------------------------------------
+    def _Height(self, x: np.ndarray, z: np.ndarray) -> np.ndarray:
+        last = self.size + 1
+        ix = np.clip(np.floor(x).astype(np.int64) + 1, 0, last)
+        iz = np.clip(np.floor(z).astype(np.int64) + 1, 0, last)
+        return self.hmap[ix, iz]
+
+    def _CastRays(self) -> None:
+        yaw = np.radians(self.yaw[:, None] + self.ray_yaw[None, :])          # (N, R)
+        pitch = np.radians(self.pitch)[:, None]
+        cp = np.cos(pitch)
+        dx = (-np.sin(yaw) * cp).astype(np.float32)[..., None]
+        dz = (np.cos(yaw) * cp).astype(np.float32)[..., None]
+        dy = np.broadcast_to(-np.sin(pitch), yaw.shape).astype(np.float32)[..., None]
+        ox = self.pos[:, 0].astype(np.float32)[:, None, None]
+        oy = (self.pos[:, 1] + EYE_HEIGHT).astype(np.float32)[:, None, None]
+        oz = self.pos[:, 2].astype(np.float32)[:, None, None]
+        px = ox + dx * self.t                                                   # (N, R, S)
+        py = oy + dy * self.t
+        pz = oz + dz * self.t
+        solid = (py < self._Height(px, pz)) | (py < 0)
+        first = solid.argmax(axis=2)
+        hit = np.take_along_axis(solid, first[..., None], axis=2)[..., 0]
+        self.rays[:] = np.where(hit, self.t[first], np.float32(self.max_dist))
+
+    # --- episodes ---------------------------------------------------------------
+    def Reset(self, which: Optional[np.ndarray] = None) -> None:
+        idx = np.arange(self.n) if which is None else np.flatnonzero(which)
+        k = len(idx)
+        if k == 0:
+            return
+        x = self.rng.uniform(1.0, self.size - 1.0, k)
+        z = self.rng.uniform(1.0, self.size - 1.0, k)
+        self.pos[idx] = np.stack([x, self._Height(x, z).astype(np.float64), z], axis=1)
+        self.vy[idx] = 0.0
+        self.on_ground[idx] = True
+        self.yaw[idx] = self.rng.uniform(-180.0, 180.0, k)
+        self.pitch[idx] = 0.0
+        self.steps[idx] = 0
+        for i in idx.tolist():
+            slots = self.rng.integers(0, len(HOTBAR_ITEMS) + 4, 9)
+            self.hotbar[i] = [HOTBAR_ITEMS[s] if s < len(HOTBAR_ITEMS) else None for s in slots.tolist()]
+        if which is None:
+            self._CastRays()
+
+    # --- stepping ---------------------------------------------------------------
+    def Step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        actions: (N, 5) dYaw, dPitch, forward, strafe, jump (see ActionArrays), clamped
+        to the v0 limits first. Returns (reward, done), both (N,); done players have
+        already been respawned, so the current state is their first observation.
+        """
+        a = ClampActions(np.array(actions, dtype=np.float32, copy=True))
+        self.yaw = (self.yaw + a[:, A_DYAW] * LOOK_SCALE + 180.0) % 360.0 - 180.0
+        self.pitch = np.clip(self.pitch + a[:, A_DPITCH] * LOOK_SCALE, -PITCH_LIMIT, PITCH_LIMIT)
+
+        fwd, strafe = a[:, A_FORWARD], a[:, A_STRAFE]
+        norm = np.maximum(1.0, np.hypot(fwd, strafe))
+        yaw = np.radians(self.yaw)
+        s, c = np.sin(yaw), np.cos(yaw)
+        # Minecraft facing: yaw 0 = +z, 90 = -x; positive strafe is to the left
+        vx = (-s * fwd + c * strafe) / norm * WALK_SPEED
+        vz = (c * fwd + s * strafe) / norm * WALK_SPEED
+        jump = a[:, A_JUMP] > 0
+
+        before = self.pos.copy()
+        x, y, z = self.pos[:, 0], self.pos[:, 1], self.pos[:, 2]
+        for tick in range(self.ticks):
+            if tick == 0:
+                start = jump & self.on_ground
+                self.vy[start] = JUMP_VELOCITY
+                self.on_ground[start] = False
+            # horizontal, one axis at a time so players slide along walls
+            nx = x + vx
+            ok = self._Height(nx, z) <= y + STEP_HEIGHT
+            x[ok] = nx[ok]
+            nz = z + vz
+            ok = self._Height(x, nz) <= y + STEP_HEIGHT
+            z[ok] = nz[ok]
+            # vertical
+            ground = self._Height(x, z).astype(np.float64)
+            y += self.vy
+            self.vy = (self.vy - GRAVITY) * DRAG
+            landed = y <= ground
+            y[landed] = ground[landed]
+            self.vy[landed] = 0.0
+            self.on_ground = landed
+
+        self._CastRays()
+        moved = np.hypot(x - before[:, 0], z - before[:, 2])
+        reward = moved - np.where(self.rays.min(axis=1) < 0.5, 0.5, 0.0)
+        self.steps += 1
+        self.seq += 1
+        done = self.steps >= self.episode_steps
+        if done.any():
+            self.Reset(done)
+            self._CastRays()
+        return reward.astype(np.float32), done
+
+    def StepPayloads(self, payloads: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        return self.Step(ActionArrays(payloads))
+
+    # --- v0 views ---------------------------------------------------------------
+    def Observation(self, i: int, timestamp: Optional[float] = None) -> Dict[str, Any]:
+        x, y, z = self.pos[i].tolist()
+        return {
+            "type": "observation",
+            "schema_version": "v0",
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "seq": int(self.seq[i]),
+            "payload": {
+                "pose": {"pos": {"x": x, "y": y, "z": z}, "yaw": float(self.yaw[i]), "pitch": float(self.pitch[i])},
+                "rays": self.rays[i].tolist(),
+                "hotbar": list(self.hotbar[i]),
+            },
+        }
+
+    def Observations(self) -> List[Dict[str, Any]]:
+        ts = time.time()
+        return [self.Observation(i, ts) for i in range(self.n)]
+
+    # Block ids in the edge^3 cube centred on player i's feet, indexed [x, y, z] from the
+    # returned origin (as actions.voxels grids): BLOCK_SOLID under the heightmap, below
+    # y = 0 and in the world-edge wall, AIR above
+    def Grid(self, i: int, edge: int, out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Tuple[int, int, int]]:
+        origin = np.floor(self.pos[i]).astype(np.int64) - edge // 2
+        r = np.arange(edge)
+        last = self.size + 1
+        ix = np.clip(origin[0] + r + 1, 0, last)
+        iz = np.clip(origin[2] + r + 1, 0, last)
+        y = (origin[1] + r)[None, :, None]
+        solid = (y < self.hmap[np.ix_(ix, iz)][:, None, :]) | (y < 0)
+        out = out if out is not None else np.empty((edge,) * 3, dtype=np.uint16)
+        np.multiply(solid, BLOCK_SOLID, out=out, casting="unsafe")
+        return out, (int(origin[0]), int(origin[1]), int(origin[2]))
@@ -1,15 +1,38 @@
 from __future__ import annotations
-import os, pathlib, yaml
-from typing import Any, Dict
+import os, pathlib, threading
+from typing import Any, Dict, List, Optional, Tuple
 
 ROOT = pathlib.Path(__file__).resolve().parents[3]  # ai/src/utils -> ai/
 SHARED = ROOT.parent / "ai_agent_project" / "shared"
 DEF = SHARED / "config" / "default.yaml"
 DEV = SHARED / "config" / "dev.yaml"
 
-# Assign config 
+def _ReadOnly(self, *args, **kwargs):
+    raise TypeError("config snapshots are read-only; edit the yaml files (they are reloaded)")
+
+# Assign config; nested sections are Configs too, lists become tuples, nothing can be changed in place
 class Config(dict):
     __getattr__ = dict.get      # cfg.server, cfg.logging
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _ReadOnly
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        dict.__init__(self, {k: _Freeze(v) for k, v in (data or {}).items()})
+
+    def __reduce__(self):
+        return (Config, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def _Freeze(v: Any) -> Any:
+    if isinstance(v, dict) and not isinstance(v, Config):
+        return Config(v)
+    if isinstance(v, list):
+        return tuple(_Freeze(x) for x in v)
+    return v
 
 # Merge the two python-created yaml dictionaries
 def DeepMerge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
@@ -21,11 +44,27 @@ def DeepMerge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
             out[i] = j
     return out
 
-# Load the config information from the yaml files
+def _Files(env: str) -> List[pathlib.Path]:
+    return [DEF, DEV] if env == "dev" else [DEF]
+
+# (path, mtime_ns, size) of every file a snapshot is built from; a missing file counts as (path, 0, -1)
+def _Stamp(env: str) -> Tuple:
+    out = []
+    for p in _Files(env):
+        try:
+            st = p.stat()
+            out.append((str(p), st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            out.append((str(p), 0, -1))
+    return tuple(out)
+
+# Load the config information from the yaml files (always re-reads them; see Snapshot)
 def LoadConfig(env: str | None = None) -> Config:
+    import yaml     # only needed when a file actually has to be parsed
+
     # Assign environment variable or default to dev
     env = env or os.getenv("APP_ENV", "dev")
-    
+
     # Parse the yaml files into python dictionaries
     with open(DEF, "r", encoding="utf-8") as f:
         base = yaml.safe_load(f) or {}
@@ -33,4 +72,37 @@ def LoadConfig(env: str | None = None) -> Config:
         with open(DEV, "r", encoding="utf-8") as f:
             base = DeepMerge(base, yaml.safe_load(f) or {})
 
-    return Config(base)
\ No newline at end of file
+    return Config(base)
+
+# env -> (file stamp, snapshot)
+_snapshots: Dict[str, Tuple[Tuple, Config]] = {}
+_lock = threading.Lock()
+
+# The process-wide config: parsed once, then shared. Cheap enough to call per connection.
+def Snapshot(env: str | None = None) -> Config:
+    env = env or os.getenv("APP_ENV", "dev")
+    entry = _snapshots.get(env)
+    if entry is None:
+        with _lock:
+            entry = _snapshots.get(env)
+            if entry is None:
+                stamp = _Stamp(env)
+                entry = _snapshots[env] = (stamp, LoadConfig(env))
+    return entry[1]
+
+# Re-read the yaml files if any of them changed on disk (mtime/size); returns the new
+# snapshot when it did, else None. A file that fails to parse keeps the old snapshot.
+def Refresh(env: str | None = None) -> Optional[Config]:
+    env = env or os.getenv("APP_ENV", "dev")
+    stamp = _Stamp(env)
+    entry = _snapshots.get(env)
+    if entry is not None and entry[0] == stamp:
+        return None
+    cfg = LoadConfig(env)
+    with _lock:
+        _snapshots[env] = (stamp, cfg)
+    return cfg
+
+# Top-level sections whose contents differ between two snapshots
+def ChangedSections(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    return sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
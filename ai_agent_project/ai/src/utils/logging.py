@@ -1,12 +1,30 @@
 from __future__ import annotations
-import json, logging, sys, time
+import atexit, json, logging, queue, sys, time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_PLAIN = {str, int, float, bool, type(None), dict, list}
+
+# Records are formatted later on the listener thread, so an extra may be an object that
+# has since gone away (websockets passes weak proxies); never let that break a log line
+def _Plain(v):
+    if type(v) in _PLAIN:
+        return v
+    try:
+        return str(v)
+    except Exception:
+        return f"<{type(v).__name__}>"
 
 # Custom logger that outputs JSON formatted logs
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         payload = {
-            "timestamp": time.time(),
+            "timestamp": record.created,
             "level": record.levelname,
+            "logger": record.name,
             "msg": record.getMessage(),
         }
 
@@ -15,13 +33,109 @@ class JsonFormatter(logging.Formatter):
             payload["exec_info"] = self.formatException(record.exc_info)
 
         # Include any extra fields passed in the log call
-        for k in getattr(record, "args", {}) if isinstance(record.args, dict) else {}:
-            payload[k] = record.args[k]
+        for k, v in record.__dict__.items():
+            if k not in _STANDARD and k not in payload:
+                payload[k] = _Plain(v)
+
+        return json.dumps(payload, default=str)
+
+class Sampler:
+    """
+    Thins out hot-path messages. Rules are keyed by the unformatted message text:
+        {"valid observation": {"every": 100}, "recv": {"per_s": 5}}
+    `every` keeps 1 record in N; `per_s` is a token bucket.
+    """
+    def __init__(self, rules: Optional[Dict[str, Dict[str, float]]] = None):
+        self.rules = rules or {}
+        self.state: Dict[str, list] = {}      # msg -> [seen, tokens, last_refill, suppressed]
+
+    # None to drop this message, else how many were dropped since the last one kept
+    def Admit(self, msg: str) -> Optional[int]:
+        rule = self.rules.get(msg)
+        if rule is None:
+            return 0
+        st = self.state.get(msg)
+        if st is None:
+            st = self.state[msg] = [0, float(rule.get("per_s", 0.0)), time.monotonic(), 0]
+        st[0] += 1
+        if "every" in rule:
+            keep = (st[0] - 1) % int(rule["every"]) == 0
+        else:
+            now = time.monotonic()
+            rate = float(rule["per_s"])
+            st[1] = min(rate, st[1] + (now - st[2]) * rate)
+            st[2] = now
+            keep = st[1] >= 1.0
+            if keep:
+                st[1] -= 1.0
+        if not keep:
+            st[3] += 1
+            return None
+        suppressed, st[3] = st[3], 0
+        return suppressed
+
+_sampler = Sampler()
+
+# Swap in new sampling rules (config reload); counts start over
+def SetSampling(sampling: Optional[Dict[str, Dict[str, float]]]) -> None:
+    global _sampler
+    _sampler = Sampler(sampling)
 
-        return json.dumps(payload)
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger for hot paths. Below WARNING, a message sampled out by the configured rules
+    returns before a LogRecord is even built; kept ones carry `suppressed` = how many
+    were dropped since. Warnings and above always go through. `extra` is passed as is.
+    """
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and _sampler.rules and isinstance(msg, str):
+            suppressed = _sampler.Admit(msg)
+            if suppressed is None:
+                return
+            if suppressed:
+                kwargs["extra"] = dict(kwargs.get("extra") or {}, suppressed=suppressed)
+        self.logger.log(level, msg, *args, **kwargs)
+
+def GetLogger(name: str) -> SampledLogger:
+    return SampledLogger(logging.getLogger(name))
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread untouched: no message formatting, no json,
+    no I/O on the caller's thread. A full queue drops the record rather than wait.
+    """
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[QueueListener] = None
+
+def _StopListener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 # Setup logging config for the application
-def SetupLogging(level: str = "INFO", jsonLogs: bool = True) -> None:
+def SetupLogging(level: str = "INFO", jsonLogs: bool = True, background: bool = False,
+                 queueSize: int = 10000, sampling: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+    global _listener, _sampler
+    _StopListener()
+    _sampler = Sampler(sampling)
     root = logging.getLogger()
     root.handlers.clear()
     root.setLevel(getattr(logging, level.upper(), logging.INFO))
@@ -34,4 +148,12 @@ def SetupLogging(level: str = "INFO", jsonLogs: bool = True) -> None:
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     ))
 
-    root.addHandler(h)
\ No newline at end of file
+    # Background mode: the event loop only enqueues; a listener thread formats and writes
+    if background:
+        qh = _NonBlockingQueueHandler(queue.Queue(maxsize=queueSize))
+        _listener = QueueListener(qh.queue, h, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_StopListener)
+        h = qh
+
+    root.addHandler(h)
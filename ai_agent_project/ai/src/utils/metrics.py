@@ -0,0 +1,271 @@
+from __future__ import annotations
+import asyncio, time
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Dict, List, Optional
+
+# Pipeline stages timed by the bridge, in message order.
+#   receive        obs timestamp (client clock) -> frame received; includes clock skew
+#   parse          JSON / v1 decode
+#   validate       observation schema check
+#   obs_queue      observation enqueued -> picked up by the policy tick
+#   decide         policy decide / decide_batch through the backend
+#   clamp_validate action clamp + schema check
+#   act_queue      action built -> taken by the sender
+#   send           websocket send of the action
+#   e2e            obs timestamp -> action built (what latency_stats p50/p90 always reported)
+STAGES = ("receive", "parse", "validate", "features", "obs_queue", "decide", "clamp_validate", "act_queue", "send", "e2e")
+
+# HDR-style log-linear buckets over integer microseconds: values below 2*SUB are exact,
+# above that every power of two is split into SUB linear sub-buckets (~3% relative error).
+SUB_BITS = 5
+SUB = 1 << SUB_BITS
+_EXACT = SUB << 1
+MAX_BITS = 36                       # ~19 h; larger values land in the last bucket
+
+def _Index(us: int) -> int:
+    if us < _EXACT:
+        return us
+    e = us.bit_length() - SUB_BITS - 1
+    return ((e + 1) << SUB_BITS) + (us >> e) - SUB
+
+N_BUCKETS = _Index((1 << MAX_BITS) - 1) + 1
+_MAX_US = (1 << MAX_BITS) - 1
+
+# [low, high) of bucket i in microseconds
+def _Bounds(i: int):
+    if i < _EXACT:
+        return i, i + 1
+    e = (i >> SUB_BITS) - 1
+    m = (i & (SUB - 1)) + SUB
+    return m << e, (m + 1) << e
+
+_MID = [(lo + hi - 1) / 2.0 for lo, hi in map(_Bounds, range(N_BUCKETS))]
+_TOP = [_Bounds(i)[1] - 1 for i in range(N_BUCKETS)]     # largest value in each bucket
+
+class LogHistogram:
+    """Constant-memory latency histogram (N_BUCKETS counters) with streaming percentiles."""
+    __slots__ = ("counts", "count", "sum_us", "max_us")
+
+    def __init__(self):
+        self.Reset()
+
+    def Reset(self) -> None:
+        self.counts: List[int] = [0] * N_BUCKETS
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def Record(self, seconds: float) -> None:
+        us = int(seconds * 1e6)
+        if us < 0:
+            us = 0
+        elif us > _MAX_US:
+            us = _MAX_US
+        self.counts[_Index(us)] += 1
+        self.count += 1
+        self.sum_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def Merge(self, other: "LogHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    # Values at quantiles ps (each in [0, 1]), in milliseconds: bucket midpoint, capped
+    # at the max seen. One C-level prefix sum, then a bisect per quantile.
+    def Percentiles(self, ps) -> List[float]:
+        if self.count == 0:
+            return [0.0] * len(ps)
+        cum = list(accumulate(self.counts))
+        out = []
+        for p in ps:
+            i = bisect_left(cum, max(1, int(p * self.count + 0.999999)))
+            out.append(min(_MID[i], self.max_us) / 1000.0)
+        return out
+
+    def Percentile(self, p: float) -> float:
+        return self.Percentiles((p,))[0]
+
+    # Number of samples <= le seconds (bucket-granular), for Prometheus buckets
+    def CountBelow(self, les) -> List[int]:
+        cum = list(accumulate(self.counts))
+        out = []
+        for le in les:
+            i = bisect_right(_TOP, int(le * 1e6))
+            out.append(cum[i - 1] if i else 0)
+        return out
+
+    def Summary(self) -> Dict[str, Any]:
+        p50, p90, p99 = self.Percentiles((0.50, 0.90, 0.99))
+        return {"count": self.count, "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "max_ms": self.max_us / 1000.0}
+
+class StageMetrics:
+    """
+    One connection's stage histograms. Record() feeds a window (reset by Report(), for
+    latency_stats), the connection's cumulative totals, and the registry aggregate.
+    """
+    def __init__(self, name: str = "", aggregate: Optional[Dict[str, LogHistogram]] = None):
+        self.name = name
+        self.window = {s: LogHistogram() for s in STAGES}
+        self.total = {s: LogHistogram() for s in STAGES}
+        self.aggregate = aggregate
+        self.obs_enqueued_at = 0.0          # perf_counter of the newest queued observation
+
+    def Record(self, stage: str, seconds: float) -> None:
+        self.window[stage].Record(seconds)
+        self.total[stage].Record(seconds)
+        if self.aggregate is not None:
+            self.aggregate[stage].Record(seconds)
+
+    # Window summaries for every stage that saw samples, then start a new window
+    def Report(self) -> Dict[str, Dict[str, Any]]:
+        out = {s: h.Summary() for s, h in self.window.items() if h.count}
+        for h in self.window.values():
+            if h.count:
+                h.Reset()
+        return out
+
+class PolicyMetrics:
+    """Decide latency and failures of one loaded policy version (app.registry)."""
+    def __init__(self, name: str, entry: str, version: int):
+        self.name = name
+        self.entry = entry
+        self.version = version
+        self.decide = LogHistogram()
+        self.window = LogHistogram()        # since the last Report()
+        self.decisions = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.connections = 0
+
+    def Record(self, seconds: float, n: int = 1) -> None:
+        self.decide.Record(seconds)
+        self.window.Record(seconds)
+        self.decisions += n
+
+    def Failed(self, timeout: bool, n: int = 1) -> None:
+        if timeout:
+            self.timeouts += n
+        else:
+            self.errors += n
+
+    # Counters plus the decide latency window, then start a new window
+    def Report(self) -> Dict[str, Any]:
+        out = {
+            "policy": self.name, "entry": self.entry, "version": self.version,
+            "connections": self.connections, "decisions": self.decisions,
+            "errors": self.errors, "timeouts": self.timeouts, "decide": self.window.Summary(),
+        }
+        self.window.Reset()
+        return out
+
+class MetricsRegistry:
+    """Per-connection StageMetrics plus an all-connections aggregate that outlives them."""
+    def __init__(self):
+        self.aggregate = {s: LogHistogram() for s in STAGES}
+        self.conns: Dict[Any, StageMetrics] = {}
+        self.policies: Dict[Any, PolicyMetrics] = {}
+        self.started = time.time()
+
+    def Policy(self, name: str, entry: str, version: int) -> PolicyMetrics:
+        m = self.policies[(name, version)] = PolicyMetrics(name, entry, version)
+        return m
+
+    def ReleasePolicy(self, name: str, version: int) -> None:
+        self.policies.pop((name, version), None)
+
+    def Connection(self, key, name: str = "") -> StageMetrics:
+        m = self.conns[key] = StageMetrics(name, self.aggregate)
+        return m
+
+    def Release(self, key) -> None:
+        self.conns.pop(key, None)
+
+    def Prometheus(self, per_connection: bool = False) -> str:
+        lines = [
+            "# HELP bridge_connections Open game/policy connections.",
+            "# TYPE bridge_connections gauge",
+            f"bridge_connections {len(self.conns)}",
+            "# HELP bridge_stage_seconds Per-stage latency of the observation -> action pipeline.",
+            "# TYPE bridge_stage_seconds histogram",
+        ]
+        for s, h in self.aggregate.items():
+            if h.count:
+                lines.extend(_PromHistogram("bridge_stage_seconds", f'stage="{s}"', h))
+        lines += [
+            "# HELP bridge_stage_quantile_seconds Streaming quantiles of bridge_stage_seconds.",
+            "# TYPE bridge_stage_quantile_seconds gauge",
+        ]
+        groups = [("", self.aggregate)]
+        if per_connection:
+            groups += [(f',conn="{m.name}"', m.total) for m in list(self.conns.values())]
+        for extra, hists in groups:
+            for s, h in hists.items():
+                if not h.count:
+                    continue
+                for q, v in zip((0.5, 0.9, 0.99), h.Percentiles((0.5, 0.9, 0.99))):
+                    lines.append(f'bridge_stage_quantile_seconds{{stage="{s}"{extra},quantile="{q}"}} {v / 1000.0:.6f}')
+        if self.policies:
+            lines.extend(self._PolicyLines())
+        return "\n".join(lines) + "\n"
+
+    # One series set per loaded policy version, labelled policy / entry / version
+    def _PolicyLines(self) -> List[str]:
+        policies = list(self.policies.values())
+        labels = [f'policy="{m.name}",entry="{m.entry}",version="{m.version}"' for m in policies]
+        lines = [
+            "# HELP bridge_policy_decide_seconds decide() latency per loaded policy version.",
+            "# TYPE bridge_policy_decide_seconds histogram",
+        ]
+        for m, lb in zip(policies, labels):
+            lines.extend(_PromHistogram("bridge_policy_decide_seconds", lb, m.decide))
+        lines += [
+            "# HELP bridge_policy_errors_total Decisions answered with idle and a policy_error event.",
+            "# TYPE bridge_policy_errors_total counter",
+        ]
+        for m, lb in zip(policies, labels):
+            lines.append(f'bridge_policy_errors_total{{{lb},reason="error"}} {m.errors}')
+            lines.append(f'bridge_policy_errors_total{{{lb},reason="timeout"}} {m.timeouts}')
+        lines += [
+            "# HELP bridge_policy_connections Connections assigned to each policy version.",
+            "# TYPE bridge_policy_connections gauge",
+        ]
+        lines.extend(f"bridge_policy_connections{{{lb}}} {m.connections}" for m, lb in zip(policies, labels))
+        return lines
+
+# Fixed exposition buckets (seconds); the log histogram itself is much finer
+PROM_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _PromHistogram(name: str, labels: str, h: LogHistogram) -> List[str]:
+    out = [f'{name}_bucket{{{labels},le="{le}"}} {n}' for le, n in zip(PROM_BUCKETS, h.CountBelow(PROM_BUCKETS))]
+    out.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+    out.append(f"{name}_sum{{{labels}}} {h.sum_us / 1e6:.6f}")
+    out.append(f"{name}_count{{{labels}}} {h.count}")
+    return out
+
+# Shared by the server, policy workers and the batch scheduler
+METRICS = MetricsRegistry()
+
+# Minimal HTTP/1.0 endpoint: GET /metrics returns the Prometheus text format
+async def ServeMetrics(host: str, port: int, registry: MetricsRegistry = METRICS, per_connection: bool = False):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                body = registry.Prometheus(per_connection).encode("utf-8")
+                head = "HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            else:
+                body = b"not found\n"
+                head = "HTTP/1.0 404 Not Found\r\nContent-Type: text/plain\r\n"
+            writer.write(f"{head}Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,282 @@
+from __future__ import annotations
+import asyncio, collections, os, sys, threading, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.metrics import LogHistogram
+
+Emit = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Frames of the stack captured for a slow callback, innermost last
+STACK_DEPTH = 30
+
+def _Label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+# Outermost-first frame labels of a frame's stack
+def _Stack(frame, limit: int = 0) -> List[str]:
+    out = []
+    while frame is not None:
+        out.append(_Label(frame.f_code))
+        frame = frame.f_back
+    out.reverse()
+    return out[-limit:] if limit else out
+
+# Name of the task a loop is running right now, if any; read from another thread, so best effort
+def _CurrentTask(loop: asyncio.AbstractEventLoop) -> Optional[str]:
+    try:
+        task = asyncio.tasks._current_tasks.get(loop)
+    except Exception:
+        return None
+    if task is None:
+        return None
+    coro = task.get_coro()
+    return f"{task.get_name()} {getattr(coro, '__qualname__', coro)}"
+
+class LoopMonitor:
+    """
+    Event-loop health. A task sleeps `interval_s` at a time and records how late it
+    wakes up (loop lag) into a histogram. A watchdog thread notices when that task has
+    not run for interval_s + slow_s -- something is blocking the loop -- and captures
+    the loop thread's stack and current task while it is still stuck; once the loop
+    recovers the stall is reported as a `slow_callback`. Every report_s a `loop_health`
+    summary goes out with the lag percentiles and `depth()` (executor queue depths).
+    """
+    def __init__(self, emit: Callable[[str, Dict[str, Any]], None], depth: Callable[[], Dict[str, int]] = dict,
+                 interval_s: float = 0.1, slow_s: float = 0.1, report_s: float = 10.0):
+        self.emit = emit
+        self.depth = depth
+        self.interval_s = interval_s
+        self.slow_s = slow_s
+        self.report_s = report_s
+        self.lag = LogHistogram()
+        self.stalls = 0
+        self.beat = time.monotonic()
+        self.stall: Optional[Dict[str, Any]] = None      # captured by the watchdog, reported by the tick
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread_id = 0
+        self.task: Optional[asyncio.Task] = None
+        self.stop = threading.Event()
+        self.watchdog: Optional[threading.Thread] = None
+
+    def Start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.beat = time.monotonic()
+        self.stop.clear()
+        self.task = asyncio.create_task(self._Tick())
+        self.watchdog = threading.Thread(target=self._Watch, name="loop-watchdog", daemon=True)
+        self.watchdog.start()
+
+    def Stop(self) -> None:
+        self.stop.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _Tick(self) -> None:
+        nextReport = time.monotonic() + self.report_s
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.interval_s)
+            now = time.monotonic()
+            lag = now - t0 - self.interval_s
+            self.lag.Record(max(0.0, lag))
+            self.beat = now
+            stall, self.stall = self.stall, None
+            if stall is not None:
+                self.stalls += 1
+                stall["blocked_ms"] = max(0.0, lag) * 1000.0
+                self.emit("slow_callback", stall)
+            if now >= nextReport:
+                nextReport = now + self.report_s
+                self.emit("loop_health", self.Report())
+
+    def _Watch(self) -> None:
+        limit = self.interval_s + self.slow_s
+        poll = max(0.005, self.slow_s / 4)
+        while not self.stop.wait(poll):
+            beat = self.beat
+            if self.stall is None and time.monotonic() - beat > limit:
+                frame = sys._current_frames().get(self.thread_id)
+                self.stall = {
+                    "task": _CurrentTask(self.loop),
+                    "stack": _Stack(frame, STACK_DEPTH) if frame is not None else [],
+                }
+                del frame
+                # one capture per stall: wait for the loop to move on
+                while not self.stop.is_set() and self.beat == beat:
+                    self.stop.wait(poll)
+
+    # Lag since the last report, then start a new window
+    def Report(self) -> Dict[str, Any]:
+        out = {
+            "interval_s": self.report_s,
+            "lag": self.lag.Summary(),
+            "stalls": self.stalls,
+            "executor": self.depth(),
+        }
+        self.lag.Reset()
+        self.stalls = 0
+        return out
+
+# Sample every thread's stack (but the sampler's own) every interval_s for `seconds`,
+# as collapsed-stack counts: "thread;outer (file:line);...;inner (file:line)" -> samples
+def SampleStacks(seconds: float, interval_s: float = 0.005) -> "collections.Counter[str]":
+    me = threading.get_ident()
+    stacks: "collections.Counter[str]" = collections.Counter()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        for tid, frame in frames.items():
+            if tid != me:
+                stacks[";".join([names.get(tid, str(tid))] + _Stack(frame))] += 1
+        frame = frames = None           # drop frame references before sleeping
+        time.sleep(interval_s)
+    return stacks
+
+# flamegraph.pl / speedscope / inferno collapsed format: one "stack count" per line
+def WriteCollapsed(stacks: "collections.Counter[str]", path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, n in stacks.most_common():
+            f.write(f"{stack} {n}\n")
+
+class Instrumentation:
+    """
+    Bridge-wide profiling switchboard: the loop monitor (on from config, or toggled by
+    an `instrument` control event) and on-demand profiles. Everything it reports is
+    logged and sent as events to the connections that subscribed.
+    """
+    def __init__(self, log, depth: Callable[[], Dict[str, int]] = dict, enabled: bool = False,
+                 allow_control: bool = False, interval_ms: float = 100, slow_ms: float = 100,
+                 report_every_s: float = 10.0, profile_interval_ms: float = 5, profile_max_s: float = 60.0,
+                 profile_dir: str = "data/profiles"):
+        self.log = log
+        self.depth = depth
+        self.enabled = enabled
+        self.allow_control = allow_control
+        self.interval_s = interval_ms / 1000.0
+        self.slow_s = slow_ms / 1000.0
+        self.report_s = report_every_s
+        self.profile_interval_s = profile_interval_ms / 1000.0
+        self.profile_max_s = profile_max_s
+        self.profile_dir = profile_dir
+        self.monitor: Optional[LoopMonitor] = None
+        self.profiling = False
+        self.subscribers: Dict[Any, Emit] = {}
+        self.tasks: set = set()         # event sends and profiles in flight (held so they aren't collected)
+
+    @classmethod
+    def FromConfig(cls, prof_cfg: Dict[str, Any], log, depth: Callable[[], Dict[str, int]] = dict) -> "Instrumentation":
+        return cls(
+            log, depth,
+            enabled=prof_cfg.get("enabled", False),
+            allow_control=prof_cfg.get("allow_control", False),
+            interval_ms=prof_cfg.get("interval_ms", 100),
+            slow_ms=prof_cfg.get("slow_ms", 100),
+            report_every_s=prof_cfg.get("report_every_s", 10.0),
+            profile_interval_ms=prof_cfg.get("profile_interval_ms", 5),
+            profile_max_s=prof_cfg.get("profile_max_s", 60.0),
+            profile_dir=prof_cfg.get("profile_dir", "data/profiles"),
+        )
+
+    def Start(self) -> None:
+        if self.enabled:
+            self.Monitor(True)
+
+    def Close(self) -> None:
+        self.Monitor(False)
+        self.subscribers.clear()
+        for task in list(self.tasks):
+            task.cancel()
+
+    # Run a send or profile in the background, keeping a reference until it finishes
+    def _Spawn(self, coro: Awaitable) -> None:
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._Done)
+
+    def _Done(self, task: asyncio.Future) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.log.debug("instrumentation event not sent", extra={"error": str(task.exception())})
+
+    def Monitor(self, on: bool) -> None:
+        if on and self.monitor is None:
+            self.monitor = LoopMonitor(self.Emit, self.depth, self.interval_s, self.slow_s, self.report_s)
+            self.monitor.Start()
+            self.log.info("loop monitor started", extra={"slow_ms": self.slow_s * 1000.0})
+        elif not on and self.monitor is not None:
+            self.monitor.Stop()
+            self.monitor = None
+            self.log.info("loop monitor stopped")
+
+    def Subscribe(self, key, emit: Emit) -> None:
+        self.subscribers[key] = emit
+
+    def Unsubscribe(self, key) -> None:
+        self.subscribers.pop(key, None)
+
+    # Log, then fan out to subscribers without waiting on any of them (runs on the loop)
+    def Emit(self, kind: str, payload: Dict[str, Any]) -> None:
+        if kind == "slow_callback":
+            self.log.warning("event loop blocked", extra={
+                "blocked_ms": payload["blocked_ms"], "task": payload["task"],
+                "where": payload["stack"][-1] if payload["stack"] else None,
+            })
+        else:
+            self.log.info(kind.replace("_", " "), extra=payload)
+        for emit in list(self.subscribers.values()):
+            self._Spawn(emit(kind, payload))
+
+    # Sample for `seconds` on a thread of its own (the default pool may be what's busy)
+    async def Profile(self, seconds: float) -> Optional[Dict[str, Any]]:
+        if self.profiling:
+            return None
+        self.profiling = True
+        seconds = min(max(seconds, 0.01), self.profile_max_s)
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        path = os.path.join(self.profile_dir, f"profile-{stamp}.collapsed")
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def run():
+            try:
+                stacks = SampleStacks(seconds, self.profile_interval_s)
+                WriteCollapsed(stacks, path)
+                result = {"path": path, "seconds": seconds, "samples": sum(stacks.values()), "stacks": len(stacks)}
+            except Exception as e:
+                loop.call_soon_threadsafe(done.set_exception, e)
+            else:
+                loop.call_soon_threadsafe(done.set_result, result)
+
+        threading.Thread(target=run, name="profiler", daemon=True).start()
+        try:
+            result = await done
+        finally:
+            self.profiling = False
+        self.Emit("profile", result)
+        return result
+
+    # An `instrument` event: {monitor?: bool, subscribe?: bool, profile_s?: number}
+    async def Control(self, key, emit: Emit, payload: Dict[str, Any]) -> None:
+        if "subscribe" in payload:
+            if payload["subscribe"]:
+                self.Subscribe(key, emit)
+            else:
+                self.Unsubscribe(key)
+        if "monitor" in payload:
+            self.Monitor(bool(payload["monitor"]))
+        if payload.get("profile_s"):
+            self._Spawn(self._ProfileFor(key, emit, float(payload["profile_s"])))
+
+    # The requester hears about its profile even when not subscribed
+    async def _ProfileFor(self, key, emit: Emit, seconds: float) -> None:
+        try:
+            result = await self.Profile(seconds)
+        except Exception as e:
+            self.log.warning("profile failed", extra={"error": str(e)})
+            return
+        if result is not None and key not in self.subscribers:
+            await emit("profile", result)
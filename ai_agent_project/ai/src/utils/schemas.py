@@ -0,0 +1,220 @@
+from __future__ import annotations
+import json
+from typing import Any, Callable, Dict, Optional, Union
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
+
+from utils.config import SHARED
+
+SCHEMAS = SHARED / "schemas"
+
+Check = Callable[[Any], bool]
+
+# Keywords the fast-path compiler understands; anything else disables the fast path
+_KNOWN = {
+    "$schema", "title", "description", "$defs", "type", "const", "enum", "required",
+    "properties", "additionalProperties", "items", "minItems", "maxItems",
+    "minimum", "maximum", "$ref", "allOf", "if", "then",
+}
+
+# Exact type checks (jsonschema never treats bool as a number)
+_TYPES: Dict[str, Check] = {
+    "object":  lambda x: type(x) is dict,
+    "array":   lambda x: type(x) is list,
+    "string":  lambda x: type(x) is str,
+    "number":  lambda x: type(x) is float or type(x) is int,
+    "integer": lambda x: type(x) is int,
+    "boolean": lambda x: type(x) is bool,
+    "null":    lambda x: x is None,
+}
+
+class _Unsupported(Exception):
+    pass
+
+def _Resolve(node: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    ref = node.get("$ref")
+    if ref is None:
+        return node
+    if not ref.startswith("#/"):
+        raise _Unsupported(ref)
+    out = root
+    for part in ref[2:].split("/"):
+        out = out[part]
+    return out
+
+def _Both(a: Check, b: Check) -> Check:
+    return lambda x: a(x) and b(x)
+
+def _All(checks) -> Check:
+    if not checks:
+        return lambda x: True
+    out = checks[0]
+    for c in checks[1:]:
+        out = _Both(out, c)
+    return out
+
+# Compile one schema node into a predicate that only returns True for valid instances.
+# A False result is not authoritative; callers fall back to the full validator.
+def _Compile(node: Dict[str, Any], root: Dict[str, Any]) -> Check:
+    node = _Resolve(node, root)
+    unknown = set(node) - _KNOWN
+    if unknown or "if" in node or "then" in node:
+        raise _Unsupported(", ".join(sorted(unknown)) or "if/then")
+
+    checks = []
+
+    if "type" in node:
+        names = node["type"] if isinstance(node["type"], list) else [node["type"]]
+        typeChecks = [_TYPES[n] for n in names]
+        checks.append(typeChecks[0] if len(typeChecks) == 1 else (lambda x, tc=tuple(typeChecks): any(c(x) for c in tc)))
+
+    if "const" in node:
+        const = node["const"]
+        checks.append(lambda x, c=const: type(x) is type(c) and x == c)
+
+    if "enum" in node:
+        values = node["enum"]
+        if not all(type(v) is str for v in values):
+            raise _Unsupported("enum")
+        allowed = frozenset(values)
+        checks.append(lambda x: type(x) is str and x in allowed)
+
+    if "minimum" in node:
+        lo = node["minimum"]
+        checks.append(lambda x: (type(x) is not float and type(x) is not int) or x >= lo)
+    if "maximum" in node:
+        hi = node["maximum"]
+        checks.append(lambda x: (type(x) is not float and type(x) is not int) or x <= hi)
+
+    if "properties" in node or "required" in node or "additionalProperties" in node:
+        checks.append(_CompileObject(node, root))
+
+    if "items" in node or "minItems" in node or "maxItems" in node:
+        checks.append(_CompileArray(node, root))
+
+    if "allOf" in node:
+        checks.append(_CompileAllOf(node["allOf"], root))
+
+    return _All(checks)
+
+def _CompileObject(node: Dict[str, Any], root: Dict[str, Any]) -> Check:
+    props = {k: _Compile(v, root) for k, v in (node.get("properties") or {}).items()}
+    required = frozenset(node.get("required") or ())
+    extra = node.get("additionalProperties", True)
+    if not isinstance(extra, bool):
+        raise _Unsupported("additionalProperties")
+    allowed = frozenset(props) if extra is False else None
+
+    def check(x):
+        if type(x) is not dict:
+            return True
+        keys = x.keys()
+        if not keys >= required:
+            return False
+        if allowed is not None and not keys <= allowed:
+            return False
+        for k, v in x.items():
+            c = props.get(k)
+            if c is not None and not c(v):
+                return False
+        return True
+    return check
+
+def _CompileArray(node: Dict[str, Any], root: Dict[str, Any]) -> Check:
+    items = node.get("items")
+    if items is not None and not isinstance(items, dict):
+        raise _Unsupported("items")
+    item = _Compile(items, root) if items is not None else None
+    lo = node.get("minItems", 0)
+    hi = node.get("maxItems")
+
+    def check(x):
+        if type(x) is not list:
+            return True
+        n = len(x)
+        if n < lo or (hi is not None and n > hi):
+            return False
+        if item is not None:
+            for v in x:
+                if not item(v):
+                    return False
+        return True
+    return check
+
+# allOf of `if {properties: {key: {const}}} then {...}` blocks becomes a dict dispatch on key
+def _CompileAllOf(parts, root: Dict[str, Any]) -> Check:
+    key = None
+    table: Dict[Any, Check] = {}
+    for part in parts:
+        cond = (part.get("if") or {}).get("properties") or {}
+        if set(part) != {"if", "then"} or len(cond) != 1:
+            raise _Unsupported("allOf")
+        k, sub = next(iter(cond.items()))
+        if set(sub) != {"const"} or (key is not None and k != key):
+            raise _Unsupported("allOf")
+        key = k
+        table[sub["const"]] = _Compile(part["then"], root)
+
+    def check(x):
+        if type(x) is not dict:
+            return True
+        c = table.get(x.get(key))
+        return c is None or c(x)
+    return check
+
+def LoadSchema(name: str) -> Dict[str, Any]:
+    return json.loads((SCHEMAS / f"{name}.schema.json").read_text("utf-8"))
+
+# A schema compiled once: a specialised fast-path predicate plus a cached full validator.
+# Given a name instead of a dict, the file is read and compiled on first use (or Warm()).
+class CompiledSchema:
+    def __init__(self, schema: Union[Dict[str, Any], str]):
+        self.name = schema if isinstance(schema, str) else None
+        self.schema: Optional[Dict[str, Any]] = None
+        self.validator = None
+        self.fast: Optional[Check] = None
+        if self.name is None:
+            self._Build(schema)
+
+    def _Build(self, schema: Optional[Dict[str, Any]] = None) -> None:
+        schema = schema if schema is not None else LoadSchema(self.name)
+        Draft7Validator.check_schema(schema)
+        self.schema = schema
+        self.validator = Draft7Validator(schema)
+        try:
+            self.fast = _Compile(schema, schema)
+        except (_Unsupported, KeyError):
+            self.fast = None
+
+    def Warm(self) -> "CompiledSchema":
+        if self.validator is None:
+            self._Build()
+        return self
+
+    # Raise ValidationError (same error jsonschema.validate would raise) if msg is invalid
+    def Validate(self, msg: Any) -> None:
+        fast = self.fast
+        if fast is not None and fast(msg):
+            return
+        if self.validator is None:
+            return self.Warm().Validate(msg)
+        err = best_match(self.validator.iter_errors(msg))
+        if err is not None:
+            raise err
+
+    def IsValid(self, msg: Any) -> bool:
+        fast = self.fast
+        if fast is not None and fast(msg):
+            return True
+        if self.validator is None:
+            return self.Warm().IsValid(msg)
+        return self.validator.is_valid(msg)
+
+# Compiled on first use -- or up front by WarmSchemas() -- and never rebuilt per message
+OBS = CompiledSchema("observation")
+ACT = CompiledSchema("action")
+EVT = CompiledSchema("event")
+
+def WarmSchemas() -> None:
+    for s in (OBS, ACT, EVT):
+        s.Warm()
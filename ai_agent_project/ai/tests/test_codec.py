@@ -0,0 +1,83 @@
+# Round trips for the v1 binary frames (actions.codec)
+#   python -m pytest ai/tests
+from __future__ import annotations
+import json, sys, time, pathlib as _pathlib
+import pytest
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] / "src" # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from actions.codec import (
+    TAG_OBSERVATION_GRID, DecodeActionV1, DecodeMessage, DecodeObservationV1,
+    EncodeActionV1, EncodeMessage, EncodeObservationV1,
+)
+
+def Observation(seq: int = 7, rays=(1.0, 2.5, 4.0), hotbar=None) -> dict:
+    return {
+        "type": "observation", "schema_version": "v0", "timestamp": 1700000000.25, "seq": seq,
+        "payload": {
+            "pose": {"pos": {"x": 1.5, "y": 64.0, "z": -3.25}, "yaw": 90.0, "pitch": -10.0},
+            "rays": list(rays),
+            "hotbar": hotbar if hotbar is not None else ["minecraft:stone", None, "minecraft:dirt"] + [None] * 6,
+        },
+    }
+
+def Action(obs_seq=None) -> dict:
+    msg = {
+        "type": "action", "schema_version": "v0", "timestamp": time.time(), "seq": 3,
+        "payload": {"look": {"dYaw": 12.5, "dPitch": -4.0}, "move": {"forward": 1.0, "strafe": -0.5}, "jump": True},
+    }
+    if obs_seq is not None:
+        msg["obs_seq"] = obs_seq
+    return msg
+
+@pytest.mark.parametrize("rays", [(1.0, 2.0, 3.0), (0.0, 1.0, 2.0, 3.0), (1.0, 2.0, 3.0, 4.0, 5.0)])
+def test_observation_round_trip(rays):
+    msg = Observation(rays=rays)
+    assert DecodeMessage(EncodeObservationV1(msg)) == msg        # every field is exact in f32/f64
+
+def test_observation_hotbar_items():
+    hotbar = ["minecraft:diamond_sword", "x" * 300] + [None] * 7
+    out = DecodeObservationV1(EncodeObservationV1(Observation(hotbar=hotbar)))
+    assert out["payload"]["hotbar"] == ["minecraft:diamond_sword", "x" * 254] + [None] * 7
+
+def test_observation_rejects_bad_frames():
+    frame = EncodeObservationV1(Observation())
+    with pytest.raises(ValueError):
+        DecodeObservationV1(frame + b"\x00")
+    with pytest.raises(ValueError):
+        DecodeObservationV1(frame[:-3])
+    with pytest.raises(ValueError):
+        DecodeObservationV1(frame[:20])
+    with pytest.raises(ValueError):
+        DecodeObservationV1(EncodeObservationV1(Observation(rays=(1.0, 2.0))))
+    with pytest.raises(ValueError):
+        DecodeObservationV1(EncodeObservationV1(Observation(rays=(1.0, -2.0, 3.0))))
+    with pytest.raises(ValueError):
+        DecodeObservationV1(EncodeObservationV1(Observation(seq=-1)))
+    with pytest.raises(ValueError):
+        DecodeObservationV1(EncodeObservationV1(Observation(), TAG_OBSERVATION_GRID))
+
+@pytest.mark.parametrize("obs_seq", [None, 0, 123456789])
+def test_action_round_trip(obs_seq):
+    msg = Action(obs_seq)
+    out = DecodeActionV1(EncodeActionV1(msg))
+    assert out == msg
+    assert ("obs_seq" in out) == (obs_seq is not None)
+
+def test_action_rejects_bad_length():
+    frame = EncodeActionV1(Action(5))
+    with pytest.raises(ValueError):
+        DecodeActionV1(frame[:-1])
+    with pytest.raises(ValueError):
+        DecodeActionV1(frame + b"\x00")
+
+def test_encode_message_by_wire():
+    msg = Action(9)
+    assert json.loads(EncodeMessage(msg, "v0")) == msg
+    assert DecodeMessage(EncodeMessage(msg, "v1")) == msg
+    with pytest.raises(ValueError):
+        DecodeMessage(b"\x00" * 32)
+    with pytest.raises(ValueError):
+        DecodeObservationV1(b"\xb1")
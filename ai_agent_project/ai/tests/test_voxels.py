@@ -0,0 +1,153 @@
+# Round trips for voxel-grid observations (actions.voxels): keyframes, deltas across
+# origin moves, body bound checks and resync after a lost reference
+#   python -m pytest ai/tests
+from __future__ import annotations
+import sys, zlib, pathlib as _pathlib
+import numpy as np
+import pytest
+
+SRC = _pathlib.Path(__file__).resolve().parents[1] / "src" # ai/src
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from actions.codec import TAG_OBSERVATION_GRID, DecodeMessage, EncodeObservationV1
+from actions.voxels import (
+    _GRID, AIR, FLAG_ZLIB, KIND_DELTA, KIND_KEY, ShiftInto, VoxelDecoder, VoxelEncoder, VoxelResync,
+)
+
+EDGE = 8
+
+def Observation(seq: int) -> dict:
+    return {
+        "type": "observation", "schema_version": "v0", "timestamp": 1700000000.0 + seq, "seq": seq,
+        "payload": {
+            "pose": {"pos": {"x": 0.5, "y": 64.0, "z": 0.5}, "yaw": 0.0, "pitch": 0.0},
+            "rays": [1.0, 2.0, 3.0], "hotbar": [None] * 9,
+        },
+    }
+
+# Block ids of a fixed world at the cube whose lowest corner is `origin`
+def World(origin, edge: int = EDGE) -> np.ndarray:
+    x, y, z = np.meshgrid(*(np.arange(edge) + int(o) for o in origin), indexing="ij")
+    ids = ((x * 7 + y * 13 + z * 3) % 11).astype(np.uint16)
+    ids[ids > 6] = AIR                      # mostly air, like the real thing
+    return ids
+
+def Kind(frame: bytes) -> int:
+    return _GRID.unpack_from(frame, len(EncodeObservationV1(Observation(0), TAG_OBSERVATION_GRID)))[1]
+
+# A hand-built grid frame (for bodies the encoder would never produce)
+def GridFrame(seq: int, body: bytes, kind: int = KIND_KEY, flags: int = 0, ref: int = -1, length=None) -> bytes:
+    head = _GRID.pack(EDGE, kind, flags, 0, 0, 0, ref, len(body) if length is None else length)
+    return EncodeObservationV1(Observation(seq), TAG_OBSERVATION_GRID) + head + body
+
+# Encoder and decoder share ShiftInto, so check it against world coordinates directly
+@pytest.mark.parametrize("d", [(0, 0, 0), (1, 0, 0), (0, -2, 3), (-EDGE + 1, 1, 0), (EDGE, 0, 0), (-30, 2, 2)])
+def test_shift_keeps_world_blocks_in_place(d):
+    origin = np.array([5, 60, -9])
+    dst = np.empty((EDGE,) * 3, dtype=np.uint16)
+    ShiftInto(dst, World(origin), d)
+    want = World(origin + d)
+    inside = np.ones((EDGE,) * 3, dtype=bool)
+    for axis, k in enumerate(d):
+        idx = np.arange(EDGE) + k                       # source index of each destination cell
+        ok = (idx >= 0) & (idx < EDGE)
+        inside &= ok.reshape([-1 if a == axis else 1 for a in range(3)])
+    assert np.array_equal(dst[inside], want[inside])
+    assert not dst[~inside].any()                       # scrolled in: AIR
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip_across_origin_moves(compress):
+    enc = VoxelEncoder(EDGE, keyframe_every=50, compress=compress)
+    dec = VoxelDecoder(EDGE, slots=3)
+    origin = np.array([100, 60, -40])
+    # small steps, a move of exactly the edge, and jumps well past it
+    moves = [(0, 0, 0), (1, 0, 0), (0, -1, 2), (-3, 0, 0), (EDGE, 0, 0), (0, 0, -EDGE - 5), (2, 1, 1), (40, -20, 9)]
+    kinds = []
+    for seq, d in enumerate(moves * 3):
+        origin = origin + d
+        grid = World(origin)
+        frame = enc.Encode(Observation(seq), grid, origin)
+        msg = DecodeMessage(frame, dec)
+        assert msg["seq"] == seq and msg["payload"] == Observation(seq)["payload"]
+        assert msg["voxel_origin"] == tuple(int(o) for o in origin)
+        assert np.array_equal(msg["voxels"], grid)
+        kinds.append(Kind(frame))
+    assert KIND_DELTA in kinds and kinds[0] == KIND_KEY
+
+def test_keyframe_every():
+    enc = VoxelEncoder(EDGE, keyframe_every=3)
+    dec = VoxelDecoder(EDGE)
+    origin = np.zeros(3, dtype=np.int64)
+    kinds = []
+    for seq in range(7):
+        frame = enc.Encode(Observation(seq), World(origin), origin)
+        DecodeMessage(frame, dec)
+        kinds.append(Kind(frame))
+    assert kinds == [KIND_KEY, KIND_DELTA, KIND_DELTA, KIND_KEY, KIND_DELTA, KIND_DELTA, KIND_KEY]
+
+def test_delta_after_lost_reference_resyncs():
+    enc = VoxelEncoder(EDGE)
+    origin = np.array([0, 64, 0])
+    key = enc.Encode(Observation(1), World(origin), origin)
+    delta = enc.Encode(Observation(2), World(origin + 1), origin + 1)
+    assert Kind(delta) == KIND_DELTA
+
+    fresh = VoxelDecoder(EDGE)
+    with pytest.raises(VoxelResync):
+        DecodeMessage(delta, fresh)
+    assert fresh.Notify() and not fresh.Notify()          # asks for a keyframe once
+
+    dec = VoxelDecoder(EDGE)
+    DecodeMessage(key, dec)
+    skipped = enc.Encode(Observation(3), World(origin + 2), origin + 2)
+    with pytest.raises(VoxelResync):
+        DecodeMessage(enc.Encode(Observation(4), World(origin + 3), origin + 3), dec)   # ref 3, have 1
+    with pytest.raises(VoxelResync):
+        DecodeMessage(skipped, dec)                         # lost stays lost until a keyframe
+
+    enc.Resync()
+    frame = enc.Encode(Observation(5), World(origin + 4), origin + 4)
+    assert Kind(frame) == KIND_KEY
+    assert np.array_equal(DecodeMessage(frame, dec)["voxels"], World(origin + 4))
+    assert not dec.lost
+
+def test_body_length_must_match_header():
+    body = World((0, 0, 0)).tobytes()
+    dec = VoxelDecoder(EDGE)
+    assert np.array_equal(DecodeMessage(GridFrame(1, body), dec)["voxels"], World((0, 0, 0)))
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(2, body[:-2]), dec)                     # keyframe too short
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(3, body, length=len(body) + 1), dec)    # header says more than is there
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(4, body)[:-1], dec)                     # truncated on the wire
+
+def test_inflated_body_is_bounded():
+    cells = EDGE ** 3
+    dec = VoxelDecoder(EDGE)
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(1, zlib.compress(bytes(2 * cells + 4096)), flags=FLAG_ZLIB), dec)
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(2, zlib.compress(bytes(2 * cells - 2)), flags=FLAG_ZLIB), dec)
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(3, zlib.compress(bytes(2 * cells))[:-4], flags=FLAG_ZLIB), dec)   # no end of stream
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(4, b"not zlib at all", flags=FLAG_ZLIB), dec)
+    grid = DecodeMessage(GridFrame(5, zlib.compress(bytes(2 * cells)), flags=FLAG_ZLIB), dec)["voxels"]
+    assert not grid.any()
+
+def test_delta_values_must_match_mask():
+    dec = VoxelDecoder(EDGE)
+    DecodeMessage(GridFrame(1, World((0, 0, 0)).tobytes()), dec)
+    mask = np.zeros(EDGE ** 3, dtype=bool)
+    mask[:5] = True
+    body = np.packbits(mask).tobytes() + np.arange(4, dtype="<u2").tobytes()    # 5 changed, 4 values
+    with pytest.raises(ValueError):
+        DecodeMessage(GridFrame(2, body, kind=KIND_DELTA, ref=1), dec)
+
+def test_rejects_edge_above_limit():
+    enc = VoxelEncoder(EDGE)
+    origin = np.zeros(3, dtype=np.int64)
+    with pytest.raises(ValueError):
+        DecodeMessage(enc.Encode(Observation(1), World(origin), origin), VoxelDecoder(EDGE - 1))
@@ -27,7 +27,8 @@ import org.lwjgl.glfw.GLFW;
 import net.minecraftforge.client.event.InputEvent;
 import net.minecraftforge.client.event.RegisterKeyMappingsEvent;
 import com.mojang.blaze3d.platform.InputConstants;
-import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ConcurrentSkipListMap;
+import java.util.concurrent.atomic.AtomicInteger;
 
 @Mod(BotMod.MODID)
 public class BotMod {
@@ -38,7 +39,8 @@ public class BotMod {
     public static final Gson GSON = new GsonBuilder().create();
     private ForgeWebSocketClient wsClient;
     private boolean triedConnect = false;
-    public final ConcurrentHashMap<Long, Long> latencyMap = new ConcurrentHashMap<>();
+    // observation seq -> send time (ms), until an action answers it (obs_seq) or a newer observation
+    public final ConcurrentSkipListMap<Long, Long> latencyMap = new ConcurrentSkipListMap<>();
     private static final KeyMapping TOGGLE_KEY =
         new KeyMapping("key.aibot.toggle", InputConstants.Type.KEYSYM, GLFW.GLFW_KEY_P, "key.categories.misc");
     private boolean aiEnabled = true;  // start with AI control ON
@@ -46,6 +48,20 @@ public class BotMod {
     private long lastActionTime = 0;           // timestamp (ms) of last action received
     private static final long ACTION_TIMEOUT_MS = 500; // how long before reusing action
 
+    // --- Credit flow control (hello {"flow": "credit"}; the bridge answers with flow events) ---
+    private static final int GAME_TICKS_PER_S = 20;
+    private static final int DEFAULT_SEND_INTERVAL_TICKS = 10;   // pace until the first flow event
+    private volatile boolean flowActive = false;                 // bridge has granted credits on this connection
+    private final AtomicInteger credits = new AtomicInteger(0);
+    private volatile int sendIntervalTicks = DEFAULT_SEND_INTERVAL_TICKS;
+    private int ticksSinceSend = 0;
+
+    // --- Voxel-grid observations (offered in the bridge's connected event) ---
+    // Opt-in: grids cost edge^3 getBlockState calls per observation on the client tick thread
+    private static final boolean VOXELS_ENABLED = Boolean.getBoolean("ai_agent_bot.voxels");
+    private static final int VOXEL_EDGE = 16;                    // blocks per side of the cube sent around the player
+    private volatile VoxelGrid voxelGrid = null;                  // null: plain JSON observations
+
     public BotMod() {
         MinecraftForge.EVENT_BUS.register(this);
         INSTANCE = this;
@@ -78,12 +94,65 @@ public class BotMod {
 
         // --- Only send observations when AI is enabled ---
         if (aiEnabled && event.phase == TickEvent.Phase.END && mc.player != null && mc.level != null) {
-            if (mc.level.getGameTime() % 10 == 0 && wsClient != null && wsClient.isOpen()) {
+            ticksSinceSend++;
+            if (wsClient != null && wsClient.isOpen() && ticksSinceSend >= sendIntervalTicks && takeCredit()) {
+                ticksSinceSend = 0;
                 sendObservation(mc);
             }
         }
     }
 
+    // Without flow control every send is allowed; with it, each send spends one credit
+    private boolean takeCredit() {
+        if (!flowActive) return true;
+        while (true) {
+            int c = credits.get();
+            if (c <= 0) return false;
+            if (credits.compareAndSet(c, c - 1)) return true;
+        }
+    }
+
+    // New connection: no credit until the bridge grants some
+    public void onConnected() {
+        flowActive = false;
+        credits.set(0);
+        sendIntervalTicks = DEFAULT_SEND_INTERVAL_TICKS;
+        voxelGrid = null;
+        latencyMap.clear();
+    }
+
+    // Send time of the observation an action answers (null if unknown). The bridge only
+    // decides on the newest observation, so anything older will never be answered.
+    public Long takeSendTime(long obsSeq) {
+        Long sent = latencyMap.remove(obsSeq);
+        latencyMap.headMap(obsSeq).clear();
+        return sent;
+    }
+
+    // connected event: send voxel grids if enabled here and the bridge takes them, at most the edge it accepts
+    public void onBridgeConnected(JsonObject payload) {
+        if (!VOXELS_ENABLED || !payload.has("voxels")) return;
+        JsonObject voxels = payload.getAsJsonObject("voxels");
+        int edge = Math.min(VOXEL_EDGE, voxels.get("max_edge").getAsInt());
+        voxelGrid = new VoxelGrid(edge, voxels.get("keyframe_every").getAsInt());
+    }
+
+    // voxel_resync event: the bridge lost the delta chain, next grid goes out as a keyframe
+    public void onVoxelResync() {
+        VoxelGrid grid = voxelGrid;
+        if (grid != null) grid.resync();
+    }
+
+    // flow event: add the granted credits and pace sends at the advertised target rate
+    public void onFlow(JsonObject payload) {
+        flowActive = true;
+        if (payload.has("credits")) credits.addAndGet(payload.get("credits").getAsInt());
+        if (payload.has("target_hz")) {
+            double hz = payload.get("target_hz").getAsDouble();
+            sendIntervalTicks = hz > 0 ? Math.max(1, (int) Math.round(GAME_TICKS_PER_S / hz)) : GAME_TICKS_PER_S;
+        }
+    }
+
     private void sendObservation(Minecraft mc) {
         JsonObject pos = new JsonObject();
         pos.addProperty("x", mc.player.getX());
@@ -109,7 +178,6 @@ public class BotMod {
         payload.add("hotbar", hotbar);
 
         long seq = mc.level.getGameTime();
-        latencyMap.put(seq, System.currentTimeMillis()); // record when this observation was sent
 
         JsonObject observation = new JsonObject();
         observation.addProperty("type", "observation");
@@ -123,8 +191,18 @@ public class BotMod {
 
         if (wsClient != null && wsClient.isOpen()) {
             long sendTime = System.currentTimeMillis();
-            latencyMap.put(mc.level.getGameTime(), sendTime);
-            wsClient.send(jsonMessage);
+            latencyMap.put(seq, sendTime); // record when this observation was sent
+            VoxelGrid grid = voxelGrid;
+            if (grid != null) {
+                // same observation as a binary frame, with the block grid appended
+                String[] slots = new String[9];
+                byte[] frame = grid.encode(mc.level, seq, sendTime / 1000.0,
+                        mc.player.getX(), mc.player.getY(), mc.player.getZ(),
+                        mc.player.getYRot(), mc.player.getXRot(), new float[] {1.0f, 0.8f, 0.7f}, slots);
+                wsClient.send(frame);
+            } else {
+                wsClient.send(jsonMessage);
+            }
         }
     }
 
@@ -20,6 +20,19 @@ public class ForgeWebSocketClient extends WebSocketClient {
     @Override
     public void onOpen(ServerHandshake handshakedata) {
         System.out.println("[WS] Connected to AI bridge");
+        BotMod.getInstance().onConnected();
+
+        // opt into credit flow control so the bridge paces our observations
+        JsonObject hello = new JsonObject();
+        hello.addProperty("role", "game");
+        hello.addProperty("flow", "credit");
+        JsonObject event = new JsonObject();
+        event.addProperty("type", "event");
+        event.addProperty("schema_version", "v0");
+        event.addProperty("timestamp", System.currentTimeMillis() / 1000.0);
+        event.addProperty("kind", "hello");
+        event.add("payload", hello);
+        send(BotMod.GSON.toJson(event));
     }
 
     @Override
@@ -51,10 +64,32 @@ public class ForgeWebSocketClient extends WebSocketClient {
 
     @Override
     public void onMessage(String message) {
+        long receivedAt = System.currentTimeMillis();
         System.out.println("[AI-BOT] Received: " + message);
 
         try {
             JsonObject json = BotMod.GSON.fromJson(message, JsonObject.class);
+
+            // echo heartbeats so the bridge can estimate our clock offset and round trip
+            if (json.has("kind") && "heartbeat".equals(json.get("kind").getAsString()) && json.has("timestamp")) {
+                sendClockEcho(json.get("timestamp").getAsDouble(), receivedAt);
+                return;
+            }
+
+            // flow events only touch counters; no need to wait for the client thread
+            if (json.has("kind") && "flow".equals(json.get("kind").getAsString()) && json.has("payload")) {
+                BotMod.getInstance().onFlow(json.getAsJsonObject("payload"));
+                return;
+            }
+            if (json.has("kind") && "connected".equals(json.get("kind").getAsString()) && json.has("payload")) {
+                BotMod.getInstance().onBridgeConnected(json.getAsJsonObject("payload"));
+                return;
+            }
+            if (json.has("kind") && "voxel_resync".equals(json.get("kind").getAsString())) {
+                BotMod.getInstance().onVoxelResync();
+                return;
+            }
+
             Minecraft mc = Minecraft.getInstance();
 
             mc.execute(() -> {
@@ -65,10 +100,9 @@ public class ForgeWebSocketClient extends WebSocketClient {
                     // Save this as the last known action
                     lastAction = payload.deepCopy();
                     lastActionTime = System.currentTimeMillis();
-                    long seq = json.has("seq") ? json.get("seq").getAsLong() : -1;
-
-                    // --- Compute latency ---
-                    Long sentTime = BotMod.getInstance().latencyMap.remove(seq);
+                    // --- Compute latency: obs_seq is the observation this action answers ---
+                    Long sentTime = json.has("obs_seq")
+                        ? BotMod.getInstance().takeSendTime(json.get("obs_seq").getAsLong()) : null;
                     if (sentTime != null) {
                         long latency = System.currentTimeMillis() - sentTime;
                         System.out.println("[AI-BOT] Round-trip latency: " + latency + " ms");
@@ -94,6 +128,21 @@ public class ForgeWebSocketClient extends WebSocketClient {
         }
     }
 
+    // clock event: t0 = the heartbeat's timestamp, t1/t2 = when we received it / reply (seconds)
+    private void sendClockEcho(double t0, long receivedAt) {
+        JsonObject echo = new JsonObject();
+        echo.addProperty("t0", t0);
+        echo.addProperty("t1", receivedAt / 1000.0);
+        echo.addProperty("t2", System.currentTimeMillis() / 1000.0);
+        JsonObject event = new JsonObject();
+        event.addProperty("type", "event");
+        event.addProperty("schema_version", "v0");
+        event.addProperty("timestamp", System.currentTimeMillis() / 1000.0);
+        event.addProperty("kind", "clock");
+        event.add("payload", echo);
+        send(BotMod.GSON.toJson(event));
+    }
+
     private void handleStructuredAction(JsonObject payload, Minecraft mc) {
         if (payload.has("look")) {
             JsonObject look = payload.getAsJsonObject("look");
@@ -0,0 +1,170 @@
+package com.example.aiagent;
+
+import net.minecraft.core.BlockPos;
+import net.minecraft.world.level.Level;
+import net.minecraft.world.level.block.Block;
+
+import java.io.ByteArrayOutputStream;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.charset.StandardCharsets;
+import java.util.zip.Deflater;
+
+/**
+ * Encoder for voxel-grid observations (ai/src/actions/voxels.py): a v1 observation
+ * frame with tag 3, then an edge^3 cube of block state ids around the player, sent as
+ * a keyframe every keyframeEvery frames and as a delta against the previous frame in
+ * between. One instance per connection; call resync() when the bridge sends
+ * voxel_resync (or on reconnect) so the next frame is a keyframe.
+ */
+public class VoxelGrid {
+    private static final int V1_MAGIC = 0xB1;
+    private static final int TAG_OBSERVATION_GRID = 3;
+    private static final int KIND_KEY = 0;
+    private static final int KIND_DELTA = 1;
+    private static final int FLAG_ZLIB = 0x01;
+    private static final int NO_ITEM = 0xFF;
+    private static final int HOTBAR_SLOTS = 9;
+
+    private final int edge;
+    private final int keyframeEvery;
+    private short[] prev;
+    private short[] cur;
+    private final short[] pred;
+    private final int[] prevOrigin = new int[3];
+    private long prevSeq = -1;
+    private int sinceKey = 0;
+    private volatile boolean haveRef = false;
+    private final Deflater deflater = new Deflater(Deflater.BEST_SPEED);
+    private final BlockPos.MutableBlockPos probe = new BlockPos.MutableBlockPos();
+
+    public VoxelGrid(int edge, int keyframeEvery) {
+        this.edge = edge;
+        this.keyframeEvery = Math.max(1, keyframeEvery);
+        int cells = edge * edge * edge;
+        this.prev = new short[cells];
+        this.cur = new short[cells];
+        this.pred = new short[cells];
+    }
+
+    public int getEdge() { return edge; }
+
+    // Next frame is a keyframe
+    public void resync() { haveRef = false; }
+
+    /** Sample the cube around (x, y, z) from the level and encode one frame. */
+    public byte[] encode(Level level, long seq, double ts, double x, double y, double z,
+                         float yaw, float pitch, float[] rays, String[] hotbar) {
+        int ox = (int) Math.floor(x) - edge / 2;
+        int oy = (int) Math.floor(y) - edge / 2;
+        int oz = (int) Math.floor(z) - edge / 2;
+        int i = 0;
+        for (int gx = 0; gx < edge; gx++) {
+            for (int gy = 0; gy < edge; gy++) {
+                for (int gz = 0; gz < edge; gz++) {
+                    probe.set(ox + gx, oy + gy, oz + gz);
+                    cur[i++] = (short) Math.min(0xFFFF, Block.getId(level.getBlockState(probe)));
+                }
+            }
+        }
+
+        int cells = cur.length;
+        int kind = KIND_KEY;
+        byte[] body = null;
+        if (haveRef && sinceKey < keyframeEvery) {
+            shift(ox - prevOrigin[0], oy - prevOrigin[1], oz - prevOrigin[2]);
+            byte[] mask = new byte[(cells + 7) / 8];
+            int changed = 0;
+            for (int c = 0; c < cells; c++) {
+                if (cur[c] != pred[c]) {
+                    mask[c >> 3] |= (byte) (0x80 >>> (c & 7));     // numpy packbits: big bit order
+                    changed++;
+                }
+            }
+            if (mask.length + 2 * changed < 2 * cells) {
+                ByteBuffer b = ByteBuffer.allocate(mask.length + 2 * changed).order(ByteOrder.LITTLE_ENDIAN);
+                b.put(mask);
+                for (int c = 0; c < cells; c++) {
+                    if (cur[c] != pred[c]) b.putShort(cur[c]);
+                }
+                kind = KIND_DELTA;
+                body = b.array();
+            }
+        }
+        if (body == null) {
+            ByteBuffer b = ByteBuffer.allocate(2 * cells).order(ByteOrder.LITTLE_ENDIAN);
+            for (short v : cur) b.putShort(v);
+            body = b.array();
+        }
+
+        int flags = 0;
+        byte[] packed = deflate(body);
+        if (packed.length < body.length) {
+            body = packed;
+            flags = FLAG_ZLIB;
+        }
+
+        ByteArrayOutputStream out = new ByteArrayOutputStream(128 + body.length);
+        ByteBuffer head = ByteBuffer.allocate(18 + 53).order(ByteOrder.LITTLE_ENDIAN);
+        head.put((byte) V1_MAGIC).put((byte) TAG_OBSERVATION_GRID).putLong(seq).putDouble(ts);
+        head.putDouble(x).putDouble(y).putDouble(z).putFloat(yaw).putFloat(pitch);
+        int n = Math.min(5, rays.length);
+        head.put((byte) n);
+        for (int r = 0; r < 5; r++) head.putFloat(r < n ? rays[r] : 0.0f);
+        out.write(head.array(), 0, head.position());
+        for (int s = 0; s < HOTBAR_SLOTS; s++) {
+            String item = hotbar != null && s < hotbar.length ? hotbar[s] : null;
+            if (item == null) {
+                out.write(NO_ITEM);
+            } else {
+                byte[] raw = item.getBytes(StandardCharsets.UTF_8);
+                int len = Math.min(raw.length, NO_ITEM - 1);
+                out.write(len);
+                out.write(raw, 0, len);
+            }
+        }
+        ByteBuffer grid = ByteBuffer.allocate(27).order(ByteOrder.LITTLE_ENDIAN);
+        grid.put((byte) edge).put((byte) kind).put((byte) flags);
+        grid.putInt(ox).putInt(oy).putInt(oz);
+        grid.putLong(kind == KIND_DELTA ? prevSeq : -1);
+        grid.putInt(body.length);
+        out.write(grid.array(), 0, grid.position());
+        out.write(body, 0, body.length);
+
+        short[] t = prev; prev = cur; cur = t;
+        prevOrigin[0] = ox; prevOrigin[1] = oy; prevOrigin[2] = oz;
+        prevSeq = seq;
+        sinceKey = kind == KIND_DELTA ? sinceKey + 1 : 1;
+        haveRef = true;
+        return out.toByteArray();
+    }
+
+    // pred = prev moved by the origin change (dx, dy, dz); blocks that scrolled in are air (0)
+    private void shift(int dx, int dy, int dz) {
+        int e = edge;
+        for (int gx = 0; gx < e; gx++) {
+            int sx = gx + dx;
+            for (int gy = 0; gy < e; gy++) {
+                int sy = gy + dy;
+                for (int gz = 0; gz < e; gz++) {
+                    int sz = gz + dz;
+                    boolean in = sx >= 0 && sx < e && sy >= 0 && sy < e && sz >= 0 && sz < e;
+                    pred[(gx * e + gy) * e + gz] = in ? prev[(sx * e + sy) * e + sz] : 0;
+                }
+            }
+        }
+    }
+
+    private byte[] deflate(byte[] body) {
+        deflater.reset();
+        deflater.setInput(body);
+        deflater.finish();
+        ByteArrayOutputStream out = new ByteArrayOutputStream(body.length / 4 + 64);
+        byte[] chunk = new byte[8192];
+        while (!deflater.finished()) {
+            int n = deflater.deflate(chunk);
+            out.write(chunk, 0, n);
+        }
+        return out.toByteArray();
+    }
+}